@@ -81,7 +81,7 @@ def main(query):
     )
     text_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
 
-    index_file = Path("data/tmdb_index.pkl")
+    index_file = Path("data/tmdb_index.bin")
     if not index_file.exists():
         index = HNSWIndex(d=512, distance='cos')
 
@@ -101,7 +101,7 @@ def main(query):
 
     D, I = index.search(q, k=5)
 
-    visualize_query(I, query, dataset)
+    visualize_query(I[0].tolist(), query, dataset)
 
 
 if __name__ == "__main__":
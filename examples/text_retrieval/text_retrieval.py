@@ -15,5 +15,5 @@ if __name__ == "__main__":
 
     D, I = index.search(model.encode("positive return"), k=5)
 
-    for i in I:
+    for i in I[0].tolist():
         print(dataset["train"][i]["sentence"])
\ No newline at end of file
@@ -0,0 +1,56 @@
+from tinyhnsw.bench import clustered, run, pareto_frontier, compare
+from tinyhnsw.bench import write_csv, write_json, read_json
+from tinyhnsw.bench.runner import PeakRSS
+
+import csv
+import numpy
+
+
+def test_run(tmp_path):
+    dataset = clustered(500, 8, n_queries=20, n_clusters=4)
+    results = run(dataset, M=[8], ef_search=[8, 64], k=5, n_single=5, log=None)
+
+    assert [r["index"] for r in results] == [
+        "FullNNIndex",
+        "HNSWIndex",
+        "HNSWIndex",
+        "FilterableHNSWIndex",
+        "FilterableHNSWIndex",
+    ]
+    assert results[0]["recall"] == 1.0
+    assert results[2]["recall"] >= results[1]["recall"]
+    assert results[3]["selectivity"] < 0.5
+    for r in results:
+        assert r["qps_single"] > 0 and r["qps_batch"] > 0
+        assert r["build_time"] >= 0 and r["peak_rss_mb"] > 0
+        assert r["index_size_mb"] > 0
+
+    write_json(results, tmp_path / "results.json")
+    assert read_json(tmp_path / "results.json") == results
+
+    write_csv(results, tmp_path / "results.csv")
+    with open(tmp_path / "results.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 5 and "selectivity" in rows[0]
+
+    assert compare(results, results) == []
+    slower = [{**r, "qps_batch": r["qps_batch"] / 2} for r in results]
+    assert len(compare(results, slower)) == 5
+
+
+def test_pareto_frontier():
+    results = [
+        {"recall": 0.9, "qps_batch": 100},
+        {"recall": 0.8, "qps_batch": 50},
+        {"recall": 0.99, "qps_batch": 10},
+        {"recall": 0.5, "qps_batch": 1000},
+    ]
+    frontier = pareto_frontier(results)
+    assert [r["recall"] for r in frontier] == [0.5, 0.9, 0.99]
+
+
+def test_peak_rss():
+    before = PeakRSS.current()
+    with PeakRSS() as rss:
+        X = numpy.ones((2048, 2048))
+    assert rss.peak - before >= X.nbytes * 0.9
@@ -0,0 +1,108 @@
+from tinyhnsw import HNSWIndex
+from tinyhnsw.cache import ResultCache
+from tinyhnsw.filter import FilterableHNSWIndex, PlannerConfig
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import pytest
+
+
+@pytest.mark.parametrize(
+    "policy,evicted", [("lru", [b"b", b"a"]), ("lfu", [b"b", b"d"])]
+)
+def test_eviction(policy, evicted):
+    cache = ResultCache(capacity=3, policy=policy)
+    for key in [b"a", b"b", b"c"]:
+        cache.put(key, key.upper())
+
+    assert cache.get(b"a") == b"A" and cache.get(b"a") == b"A"
+    assert cache.get(b"c") == b"C"
+
+    # lru evicts the least recently used key, lfu the least used one
+    cache.put(b"d", b"D")
+    assert cache.get(evicted[0]) is None
+    cache.put(b"e", b"E")
+    assert cache.get(evicted[1]) is None
+    assert len(cache) == 3
+
+    stats = cache.stats()
+    assert stats["evictions"] == 2
+    assert stats["hits"] == 3 and stats["misses"] == 2
+
+
+def test_generation():
+    cache = ResultCache()
+    generation = cache.generation
+    cache.clear()
+    cache.put(b"key", 1, generation)
+    assert cache.get(b"key") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_index_cache():
+    X = numpy.random.randn(300, 8)
+    index = HNSWIndex(8, distance="l2")
+    index.add(X)
+    index.cache = ResultCache(capacity=100)
+
+    D, I = index.search(X[:20], 5)
+    D_c, I_c, stats = index.search(X[:20], 5, return_stats=True)
+    assert (I == I_c).all() and (D == D_c).all()
+    assert {s.stop for s in stats} == {"cache"}
+    assert index.cache.stats()["hits"] == 20
+
+    # a different k or ef is a different search
+    index.search(X[:20], 3)
+    assert index.cache.stats()["hits"] == 20
+
+    index.add(X[:1] + 1e-3)
+    assert len(index.cache) == 0
+    _, I = index.search(X[:1], 2)
+    assert 300 in I[0].tolist()
+
+    index.remove([0])
+    _, I = index.search(X[:1], 2)
+    assert 0 not in I[0].tolist()
+
+    # near-identical queries share an entry when the cache quantizes them
+    index.cache = ResultCache(resolution=1e-2)
+    index.search(X[:5], 5)
+    index.search(X[:5] + 1e-5, 5)
+    assert index.cache.stats()["hits"] == 5
+
+
+def test_filtered_cache():
+    X = numpy.random.randn(1000, 8)
+    index = FilterableHNSWIndex(
+        8, distance="l2", planner=PlannerConfig(brute_force_max=0)
+    )
+    index.add(X, {"parity": [i % 2 for i in range(1000)]})
+    index.cache = ResultCache()
+
+    even = index.attributes.eq("parity", 0)
+    _, I = index.search(X[:10], 5, valid=even)
+    _, I_odd = index.search(X[:10], 5, valid=~even)
+    assert (I % 2 == 0).all() and (I_odd % 2 == 1).all()
+
+    _, I_c = index.search(X[:10], 5, valid=even)
+    assert (I == I_c).all()
+    assert index.cache.stats()["hits"] == 10
+
+
+def test_concurrent_searches():
+    X = numpy.random.randn(300, 8)
+    index = HNSWIndex(8, distance="l2")
+    index.add(X)
+    _, expected = index.search(X[:50], 5)
+    index.cache = ResultCache(capacity=20, policy="lfu")
+
+    def search(i: int) -> bool:
+        _, I = index.search(X[i % 50], 5)
+        return (I[0] == expected[i % 50]).all()
+
+    with ThreadPoolExecutor(8) as pool:
+        assert all(pool.map(search, range(1000)))
+
+    _, I = index.search(X[:50], 5, n_workers=2, executor="process")
+    assert (I == expected).all()
+    assert len(index.cache) <= 20
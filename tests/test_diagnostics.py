@@ -0,0 +1,87 @@
+from tinyhnsw import HNSWIndex
+from tinyhnsw.diagnostics import diagnose, reachable_from, repair
+
+import numpy
+
+
+def test_diagnose():
+    X = numpy.random.randn(500, 16)
+    index = HNSWIndex(16)
+    index.add(X)
+
+    report = diagnose(index)
+    assert report.healthy
+    assert len(report.layers) == index.L + 1
+    assert report.layers[0].size == 500
+    assert report.layers[0].expected_size == 500
+    assert report.layers[0].out_degree.sum() == 500
+    assert report.layers[0].mean_degree > 1
+    for r in report.layers:
+        assert r.size == len(index.layers[r.layer])
+    assert "layer 0: 500 nodes" in str(report)
+
+    index.remove(numpy.arange(100))
+    report = diagnose(index)
+    assert report.n_deleted == 100
+    assert report.layers[0].size == 400
+    assert report.layers[0].expected_size == 400
+
+
+def test_repair_orphans():
+    X = numpy.random.randn(500, 16)
+    index = HNSWIndex(16)
+    index.add(X)
+
+    # cut every edge into a few nodes of the bottom layer
+    layer = index.layers[0]
+    orphans = [node for node in range(500) if node != index.ep][:5]
+    for node in layer.nodes().tolist():
+        D, W = layer.neighborhood(node)
+        keep = ~numpy.isin(W, orphans)
+        layer.set_neighbors(node, D[keep].tolist(), W[keep].tolist())
+
+    report = diagnose(index)
+    assert not report.healthy
+    assert set(orphans) <= set(report.layers[0].zero_in_degree.tolist())
+    assert set(orphans) <= set(report.layers[0].unreachable.tolist())
+
+    assert repair(index) >= 5
+    assert diagnose(index).healthy
+    assert reachable_from(layer, [index.ep], index.ntotal).all()
+
+    _, I = index.search(X[orphans], 1)
+    assert (I[:, 0] == orphans).all()
+
+
+def test_repair_forces_nearest_edge():
+    X = numpy.random.randn(500, 16)
+    index = HNSWIndex(16, distance="l2")
+    index.add(X)
+
+    # orphans that don't link to each other, so each needs its own repair
+    layer = index.layers[0]
+    orphans = []
+    for node in range(1, 500):
+        W = layer.neighborhood(node)[1].tolist()
+        linked = any(node in layer.neighborhood(o)[1] or o in W for o in orphans)
+        if node != index.ep and not linked:
+            orphans.append(node)
+        if len(orphans) == 5:
+            break
+
+    for node in layer.nodes().tolist():
+        D, W = layer.neighborhood(node)
+        keep = ~numpy.isin(W, orphans)
+        layer.set_neighbors(node, D[keep].tolist(), W[keep].tolist())
+
+    # a selection that prunes every new edge, so each one has to be forced
+    select = layer.f_neighbors
+    layer.f_neighbors = lambda D, W, M: []
+    assert repair(index, max_passes=1) >= 5
+    layer.f_neighbors = select
+
+    others = numpy.setdiff1d(numpy.arange(500), orphans)
+    for node in orphans:
+        sources = [e for e in others.tolist() if node in layer.neighborhood(e)[1]]
+        nearest = others[numpy.argsort(((X[others] - X[node]) ** 2).sum(1))[:3]]
+        assert len(sources) == 1 and sources[0] in nearest
@@ -0,0 +1,53 @@
+from tinyhnsw.distance import ENGINES
+from tinyhnsw.index import cosine_similarity
+
+import numpy
+import pytest
+
+
+def cosine_distance(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
+    return 1.0 - cosine_similarity(X, Y)
+
+
+def inner_product_distance(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
+    return 1.0 - X @ Y.T
+
+
+def l2_distance(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
+    return numpy.linalg.norm(X[:, None] - Y[None], axis=-1)
+
+
+REFERENCE = {
+    "cosine": cosine_distance,
+    "l2": l2_distance,
+    "inner_product": inner_product_distance,
+}
+
+
+@pytest.mark.parametrize("metric", ["cosine", "l2", "inner_product"])
+def test_engine_matches_reference(metric):
+    X = numpy.random.randn(20, 8)
+    Q = numpy.random.randn(5, 8)
+    if metric == "inner_product":
+        X = X / numpy.linalg.norm(X, axis=1, keepdims=True)
+        Q = Q / numpy.linalg.norm(Q, axis=1, keepdims=True)
+
+    engine = ENGINES[metric]()
+    stored = engine.add(X)
+    D = engine.finalize(engine.distances(engine.prepare(Q), stored))
+
+    assert D.dtype == numpy.float32
+    assert numpy.allclose(D, REFERENCE[metric](Q, X), atol=1e-4)
+
+
+def test_l2_cached_norms_by_id():
+    X = numpy.random.randn(20, 8)
+    engine = ENGINES["l2"]()
+    stored = engine.add(X[:10])
+    stored = numpy.append(stored, engine.add(X[10:]), axis=0)
+
+    ids = numpy.array([3, 15, 7])
+    q = engine.prepare(X[:1])
+    D = engine.distances(q, stored[ids], ids)
+
+    assert numpy.allclose(D, l2_distance(X[:1], X[ids]) ** 2, atol=1e-4)
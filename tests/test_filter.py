@@ -0,0 +1,120 @@
+from tinyhnsw.attributes import AttributeIndex
+from tinyhnsw.filter import FilterableHNSWIndex, PlannerConfig
+
+import numpy
+
+
+def test_attribute_index():
+    attributes = AttributeIndex()
+    attributes.add(
+        4, {"color": ["red", "blue", "red", "green"], "price": [5, 50, 500, 50]}
+    )
+    attributes.add(2, {"color": [["red", "blue"], "blue"]})
+
+    assert attributes.eq("color", "red").tolist() == [1, 0, 1, 0, 1, 0]
+    assert attributes.eq("color", "purple").sum() == 0
+    assert attributes.isin("color", ["green", "blue"]).tolist() == [0, 1, 0, 1, 1, 1]
+    assert attributes.range("price", 10, 100).tolist() == [0, 1, 0, 1, 0, 0]
+    assert attributes.range("price", lo=100).tolist() == [0, 0, 1, 0, 0, 0]
+    assert attributes.eq("price", 50).tolist() == [0, 1, 0, 1, 0, 0]
+
+    bitmap = attributes.eq("color", "red") & ~attributes.range("price", hi=10)
+    assert bitmap.tolist() == [0, 0, 1, 0, 1, 0]
+
+    attributes.update(
+        numpy.array([0, 4]), {"color": ["blue", "green"], "price": [7, 8]}
+    )
+    assert attributes.eq("color", "red").tolist() == [0, 0, 1, 0, 0, 0]
+    assert attributes.eq("color", "blue").tolist() == [1, 1, 0, 0, 0, 1]
+    assert attributes.range("price", hi=10).tolist() == [1, 0, 0, 0, 1, 0]
+
+    attributes.update(numpy.array([4]), {"color": [["red", "blue"]]})
+    attributes.compact(numpy.array([False, True, True, True, True, False]))
+    assert attributes.eq("color", "red").tolist() == [0, 1, 0, 1]
+    assert attributes.range("price", 10, 100).tolist() == [1, 0, 1, 0]
+
+
+def test_search_without_filter():
+    X = numpy.random.randn(100, 8)
+    index = FilterableHNSWIndex(8)
+    index.add(X)
+
+    _, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(100)).sum() >= 95
+
+
+def test_filtered_search():
+    X = numpy.random.randn(300, 8)
+    parity = numpy.where(numpy.arange(300) % 2 == 0, "even", "odd")
+
+    index = FilterableHNSWIndex(8, distance="l2")
+    index.add(X, attributes={"parity": parity, "value": numpy.arange(300)})
+
+    even = index.attributes.eq("parity", "even")
+    for valid in [even, numpy.packbits(even), numpy.flatnonzero(even).tolist()]:
+        _, I = index.search(X, 5, valid=valid)
+        assert (I % 2 == 0).all()
+        assert (I[::2, 0] == numpy.arange(0, 300, 2)).sum() >= 140
+
+    valid = index.attributes.eq("parity", "odd") & index.attributes.range(
+        "value", hi=99
+    )
+    _, I = index.search(X[:10], 3, valid=valid)
+    assert ((I % 2 == 1) & (I < 100)).all()
+
+    index.remove(numpy.arange(0, 300, 4))
+    index.compact()
+    assert len(index.attributes) == index.ntotal == 225
+    _, I = index.search(X[2], 5, valid=index.attributes.eq("parity", "even"))
+    assert I[0, 0] == 1
+
+
+def test_upsert_attributes():
+    X = numpy.random.randn(100, 8)
+    index = FilterableHNSWIndex(8, distance="l2")
+    index.add_with_ids(
+        X[:50], numpy.arange(50), attributes={"tag": ["a"] * 50, "value": [1] * 50}
+    )
+
+    # ids 40..49 are updated in place, 50..59 are added
+    ids = numpy.arange(40, 60)
+    index.upsert(X[40:60], ids, attributes={"tag": ["b"] * 20, "value": [2] * 20})
+    assert index.ntotal == len(index.attributes) == 60
+    assert index.attributes.eq("tag", "a").sum() == 40
+    assert index.attributes.range("value", 2, 2).sum() == 20
+
+    _, I = index.search(X[:60], 1, valid=index.attributes.eq("tag", "b"))
+    assert numpy.isin(I, ids).all()
+    assert (I[40:, 0] == ids).sum() >= 18
+
+
+def test_attributes_round_trip(tmp_path):
+    X = numpy.random.randn(50, 8)
+    index = FilterableHNSWIndex(8)
+    index.add(X, attributes={"tag": ["a", "b"] * 25, "value": numpy.arange(50)})
+    index.save(tmp_path / "filter.index")
+
+    loaded = FilterableHNSWIndex.from_file(tmp_path / "filter.index")
+    assert (loaded.attributes.eq("tag", "a") == index.attributes.eq("tag", "a")).all()
+    assert loaded.attributes.range("value", 10, 19).sum() == 10
+
+
+def test_planner():
+    X = numpy.random.randn(500, 8)
+    index = FilterableHNSWIndex(
+        8, distance="l2", planner=PlannerConfig(brute_force_max=20)
+    )
+    index.add(X, attributes={"value": numpy.arange(500)})
+
+    _, _, plan = index.search(X[0], 5, return_plan=True)
+    assert plan["plan"] == "hnsw"
+
+    for hi, expected in [(9, "brute_force"), (99, "filtered"), (399, "post_filter")]:
+        valid = index.attributes.range("value", hi=hi)
+        D, I, plan = index.search(X[: hi + 1], 3, valid=valid, return_plan=True)
+
+        assert plan["plan"] == expected
+        assert plan["n_allowed"] == hi + 1
+        assert ((I >= 0) & (I <= hi)).all()
+        assert (I[:, 0] == numpy.arange(hi + 1)).mean() >= 0.9
+        assert (numpy.diff(D, axis=1) >= 0).all()
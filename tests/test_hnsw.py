@@ -0,0 +1,335 @@
+from tinyhnsw import HNSWIndex
+from tinyhnsw.hnsw import DEFAULT_CONFIG
+from dataclasses import replace
+
+import numpy
+import pytest
+
+
+def test_add():
+    X = numpy.random.randn(50, 16)
+    index = HNSWIndex(16)
+    index.add(X)
+    assert index.ntotal == 50
+    assert len(index.layers[0]) == 50
+
+
+def test_degree_bounded():
+    X = numpy.random.randn(200, 8)
+    index = HNSWIndex(8)
+    index.add(X)
+
+    for layer in index.layers:
+        assert layer.degree[: len(layer)].max() <= layer.M_max
+        for node in layer.nodes().tolist():
+            _, W = layer.neighborhood(node)
+            assert node not in W.tolist()
+            assert all(e in layer for e in W.tolist())
+
+
+def test_self_search():
+    X = numpy.random.randn(100, 16)
+    index = HNSWIndex(16)
+    index.add(X)
+
+    D, I = index.search(X, 1)
+    assert D.shape == (100, 1)
+    assert I.shape == (100, 1)
+    assert (I[:, 0] == numpy.arange(100)).sum() >= 95
+
+
+def test_self_search_heuristic():
+    X = numpy.random.randn(100, 16)
+    index = HNSWIndex(
+        16, distance="l2", config=replace(DEFAULT_CONFIG, neighbors="heuristic")
+    )
+    index.add(X)
+
+    D, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(100)).sum() >= 95
+    assert numpy.allclose(D[:, 0], 0.0, atol=1e-2)
+
+
+def test_search_padding():
+    X = numpy.random.randn(3, 8)
+    index = HNSWIndex(8)
+    index.add(X)
+
+    D, I = index.search(X[0], 5)
+    assert I.shape == (1, 5)
+    assert (I[0, 3:] == -1).all()
+    assert numpy.isinf(D[0, 3:]).all()
+
+
+def test_search_empty():
+    index = HNSWIndex(8)
+    D, I = index.search(numpy.random.randn(2, 8), 3)
+    assert I.shape == (2, 3) and (I == -1).all()
+    assert numpy.isinf(D).all()
+
+
+def test_search_pools():
+    X = numpy.random.randn(50, 8)
+    index = HNSWIndex(8)
+    index.add(X)
+
+    D, I = index.search(X, 3)
+    for executor in ["thread", "process"]:
+        D_p, I_p = index.search(X, 3, n_workers=2, executor=executor)
+        assert numpy.allclose(D, D_p)
+        assert (I == I_p).all()
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_build(executor):
+    X = numpy.random.randn(300, 16)
+    index = HNSWIndex(16)
+    index.add(X, n_workers=2, executor=executor, batch_size=50)
+
+    assert index.ntotal == 300
+    assert len(index.layers[0]) == 300
+    assert index.ix == 300
+
+    _, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(300)).sum() >= 285
+
+
+def test_build():
+    X = numpy.random.randn(300, 16)
+    index = HNSWIndex(16)
+    index.build(X, block_size=64)
+
+    assert index.ntotal == 300
+    assert len(index.layers[0]) == 300
+    assert index.ep in index.layers[index.L]
+
+    for layer in index.layers:
+        for node in layer.nodes().tolist():
+            W = layer.neighborhood(node)[1].tolist()
+            assert len(W) == len(set(W))
+
+    _, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(300)).sum() >= 285
+
+
+def test_remove():
+    X = numpy.random.randn(200, 16)
+    index = HNSWIndex(16)
+    index.add(X)
+
+    removed = numpy.arange(0, 200, 3)
+    index.remove(removed)
+    assert index.n_deleted == len(removed)
+
+    _, I = index.search(X, 5)
+    assert not numpy.isin(I, removed).any()
+
+    index.add(numpy.random.randn(10, 16))
+    _, I = index.search(X, 5)
+    assert not numpy.isin(I, removed).any()
+
+
+def test_repair():
+    X = numpy.random.randn(300, 16)
+    index = HNSWIndex(16)
+    index.add(X)
+
+    removed = numpy.arange(0, 300, 2)
+    index.remove(removed)
+    index.remove([index.ep])
+
+    assert index.repair(max_nodes=50) > 0
+    assert index.repair() == 0
+    assert not index.deleted[index.ep]
+    assert index.ep in index.layers[index.L]
+
+    for layer in index.layers:
+        live = layer.nodes()[~index.deleted[layer.nodes()]]
+        for node in live.tolist():
+            W = layer.neighborhood(node)[1]
+            assert not index.deleted[W].any()
+
+    kept = numpy.setdiff1d(numpy.arange(300), [*removed, index.ep])
+    _, I = index.search(X[kept], 1)
+    assert (I[:, 0] == kept).mean() >= 0.9
+
+
+def test_compact(tmp_path):
+    X = numpy.random.randn(200, 16)
+    index = HNSWIndex(16)
+    index.add(X)
+
+    index.remove(numpy.arange(100))
+    index.save(tmp_path / "deleted.index")
+    loaded = HNSWIndex.from_file(tmp_path / "deleted.index")
+    assert loaded.n_deleted == 100
+    assert len(loaded.pending) == 100
+
+    remap = loaded.compact()
+    assert loaded.ntotal == 100
+    assert (remap[:100] == -1).all()
+    assert (remap[100:] == numpy.arange(100)).all()
+    assert len(loaded.layers[0]) == 100
+
+    _, I = loaded.search(X[100:], 1)
+    assert (I[:, 0] == numpy.arange(100)).sum() >= 90
+
+    loaded.add(numpy.random.randn(10, 16))
+    assert loaded.ntotal == 110
+
+
+def test_remove_everything():
+    X = numpy.random.randn(200, 16)
+    index = HNSWIndex(16)
+    index.add(X)
+
+    index.remove(numpy.arange(200))
+    index.compact()
+    assert index.ntotal == 0 and index.L == 0 and len(index.layers) == 1
+    _, I = index.search(X[:5], 3)
+    assert (I == -1).all()
+
+    index.add(X)
+    _, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(200)).sum() >= 190
+
+    # and without compacting: the tombstones stay, the graph starts over
+    index.remove(numpy.arange(200))
+    index.repair()
+    index.add(X)
+    _, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(200, 400)).sum() >= 190
+
+    # or without repairing either
+    index.remove(numpy.arange(400))
+    index.add(X)
+    _, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(400, 600)).sum() >= 190
+    assert len(index.pending) == 0
+
+    index.repair()
+    _, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(400, 600)).sum() >= 190
+
+
+def test_range_search():
+    X = numpy.random.randn(500, 8)
+    index = HNSWIndex(8, distance="l2")
+    index.add(X)
+    index.remove([1])
+
+    radius = 2.0
+    lims, D, I = index.range_search(X[:20], radius, n_workers=2)
+    assert lims.shape == (21,)
+    assert len(D) == len(I) == lims[-1]
+    assert (D <= radius + 1e-4).all()
+    assert 1 not in I
+
+    found, total = 0, 0
+    for i in range(20):
+        true = numpy.flatnonzero(numpy.linalg.norm(X - X[i], axis=1) <= radius - 1e-3)
+        true = set(true.tolist()) - {1}
+        I_i = I[lims[i] : lims[i + 1]].tolist()
+        assert len(I_i) == len(set(I_i))
+        assert (numpy.diff(D[lims[i] : lims[i + 1]]) >= 0).all()
+        found += len(true & set(I_i))
+        total += len(true)
+
+    assert found >= 0.95 * total
+
+    lims, D, I = index.range_search(X[:5], -radius)
+    assert (lims == 0).all() and len(D) == len(I) == 0
+
+
+def test_visited_table():
+    from tinyhnsw.hnsw import VisitedTable, visited_table
+    from concurrent.futures import ThreadPoolExecutor
+
+    table = VisitedTable(4)
+    table.stamps[:] = 7
+    table.epoch = numpy.iinfo(numpy.int32).max
+    assert table.next_epoch() == 1
+    assert (table.stamps == 0).all()
+
+    assert visited_table(100) is visited_table(10)
+    assert len(visited_table(1000).stamps) >= 1000
+    with ThreadPoolExecutor(1) as pool:
+        assert pool.submit(visited_table, 10).result() is not visited_table(10)
+
+
+def test_tune(tmp_path):
+    X = numpy.random.randn(2000, 16)
+    Q = numpy.random.randn(100, 16)
+    index = HNSWIndex(16, distance="l2")
+    index.add(X)
+    index.remove(numpy.arange(100))
+
+    table = index.tune(Q, target_recall=0.9, k=[1, 10])
+    assert set(table) == {1, 10} and index.ef_table == table
+    assert 10 <= table[10] <= 4096
+    assert index.ef_for(5) == table[10]
+    assert index.ef_for(50) == max(50, index.config.ef_search)
+
+    exact = X[100:]
+    gold = numpy.argsort(((Q[:, None] - exact[None]) ** 2).sum(-1), axis=1)[:, :10]
+    _, I = index.search(Q, 10)
+    assert numpy.isin(I - 100, gold).mean() >= 0.85
+
+    index.save(tmp_path / "tuned.index")
+    assert HNSWIndex.from_file(tmp_path / "tuned.index").ef_table == table
+
+
+def test_tune_side_effects():
+    from tinyhnsw.cache import ResultCache
+    from tinyhnsw.stats import SearchMonitor
+
+    X = numpy.random.randn(500, 8)
+    index = HNSWIndex(8, distance="l2")
+    index.add(X)
+    index.monitor = SearchMonitor()
+    index.cache = ResultCache()
+
+    index.tune(X[:50], target_recall=0.9, k=5, n_workers=2)
+    assert index.monitor.summary()["visited"]["count"] == 0
+    assert len(index.cache) == 0
+
+
+def test_adaptive_search():
+    X = numpy.random.randn(2000, 16)
+    Q = numpy.random.randn(50, 16)
+    config = replace(DEFAULT_CONFIG, ef_search=64)
+    index = HNSWIndex(16, distance="l2", config=config)
+    index.add(X)
+    _, I_fixed, fixed = index.search(Q, 10, return_stats=True)
+    assert {s.stop for s in fixed} == {"converged"}
+
+    index.config = replace(config, adaptive=True, adaptive_patience=4)
+    _, I, stats = index.search(Q, 10, return_stats=True)
+    assert {s.stop for s in stats} <= {"patience", "converged", "exhausted"}
+    assert "patience" in {s.stop for s in stats}
+    assert sum(s.visited for s in stats) < sum(s.visited for s in fixed)
+    assert numpy.isin(I, I_fixed).mean() >= 0.6
+
+    # a query that keeps improving widens its beam
+    index.config = replace(config, ef_search=10, adaptive=True, adaptive_patience=64)
+    _, _, stats = index.search(Q, 10, return_stats=True)
+    assert max(s.ef for s in stats) > 10
+
+    index.config = replace(config, adaptive=True, adaptive_ratio=1.0)
+    _, _, stats = index.search(Q, 10, return_stats=True)
+    assert "ratio" in {s.stop for s in stats}
+
+
+def test_adaptive_ratio_inner_product():
+    X = numpy.random.randn(2000, 16)
+    Q = numpy.random.randn(50, 16)
+    config = replace(DEFAULT_CONFIG, ef_search=64)
+    index = HNSWIndex(16, distance="inner_product", config=config)
+    index.add(X)
+    _, I_fixed = index.search(Q, 10)
+
+    # 1 - q.x is negative for good matches, so the ratio rule doesn't apply
+    index.config = replace(config, adaptive=True, adaptive_ratio=1.5)
+    _, I, stats = index.search(Q, 10, return_stats=True)
+    assert "ratio" not in {s.stop for s in stats}
+    assert numpy.isin(I, I_fixed).mean() >= 0.8
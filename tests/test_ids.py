@@ -0,0 +1,119 @@
+from tinyhnsw import HNSWIndex, FullNNIndex, IVFPQIndex
+from tinyhnsw.ids import IdMap
+from tinyhnsw.index import Index
+
+import numpy
+import pytest
+
+
+def test_id_map():
+    ids = numpy.random.default_rng(0).choice(2**40, 5000, replace=False)
+    idmap = IdMap()
+    idmap.add(ids[:3000])
+    idmap.add(ids[3000:])
+
+    assert len(idmap) == 5000
+    assert (idmap.lookup(ids) == numpy.arange(5000)).all()
+    assert (idmap.lookup([2**41, 2**42]) == -1).all()
+    assert (
+        idmap.external(numpy.array([[0, 4999, -1]])) == [[ids[0], ids[4999], -1]]
+    ).all()
+
+    with pytest.raises(AssertionError):
+        idmap.add(ids[:1])
+
+    idmap.discard(ids[:10])
+    assert not idmap.contains(ids[:10]).any()
+    assert idmap.contains(ids[10:]).all()
+
+    keep = numpy.ones(5000, dtype=bool)
+    keep[:10] = False
+    idmap.compact(keep)
+    assert (idmap.lookup(ids[10:]) == numpy.arange(4990)).all()
+
+
+@pytest.mark.parametrize("klass", [HNSWIndex, FullNNIndex])
+def test_add_with_ids(klass):
+    X = numpy.random.randn(100, 8)
+    ids = numpy.arange(100) * 7 + 1000
+
+    index = klass(8, distance="l2")
+    index.add_with_ids(X, ids)
+
+    _, I = index.search(X, 1)
+    assert (I[:, 0] == ids).sum() >= 95
+
+    with pytest.raises(AssertionError):
+        index.add(X[:1])
+
+
+def test_ivf_upsert():
+    X = numpy.random.randn(500, 16).astype(numpy.float32)
+    ids = numpy.arange(500) + 10_000
+
+    index = IVFPQIndex(16, distance="l2", nlist=8, m=4, nprobe=8)
+    index.add_with_ids(X, ids)
+    assert index.search(X[:1], 1)[1][0, 0] == 10_000
+
+    index.upsert(X[1:2], [10_000])
+    _, I = index.search(X[1:2], 2)
+    assert set(I[0].tolist()) == {10_000, 10_001}
+    assert sum(len(ids) for ids in index.lists) == 500
+
+
+def test_hnsw_upsert(tmp_path):
+    X = numpy.random.randn(300, 16)
+    Y = numpy.random.randn(50, 16)
+    ids = numpy.arange(300) + 5000
+
+    index = HNSWIndex(16, distance="l2")
+    index.add_with_ids(X, ids)
+    index.upsert(numpy.concatenate([Y, X[:5]]), [*ids[:50], 1, 2, 3, 4, 5])
+    assert index.ntotal == 305
+
+    for layer in index.layers:
+        assert layer.degree[: len(layer)].max() <= layer.M_max
+
+    _, I = index.search(Y, 1)
+    assert (I[:, 0] == ids[:50]).sum() >= 45
+
+    _, I = index.search(X[50:], 1)
+    assert (I[:, 0] == ids[50:]).sum() >= 225
+
+    index.remove(ids[:10])
+    _, I = index.search(Y, 1)
+    assert not numpy.isin(I, ids[:10]).any()
+
+    index.compact()
+    index.save(tmp_path / "ids.index")
+    loaded = Index.from_file(tmp_path / "ids.index")
+    _, I = loaded.search(Y[10:], 1)
+    assert (I[:, 0] == ids[10:50]).sum() >= 35
+
+    loaded.add_with_ids(X[:1], ids[:1])
+    assert loaded.search(X[:1], 1)[1][0, 0] in (ids[0], 1)
+
+
+def test_hnsw_upsert_removed_row():
+    X = numpy.random.randn(200, 16)
+    index = HNSWIndex(16, distance="l2")
+    index.add(X)
+
+    index.remove([3, 4])
+    index.repair()
+    v = 3.0 * numpy.random.randn(2, 16)
+    index.upsert(v, [3, 4])
+    assert index.n_deleted == 0 and len(index.pending) == 0
+    assert (index.search(v, 1)[1][:, 0] == [3, 4]).all()
+
+    # revived into a graph that was reset after everything was removed
+    index.remove(numpy.arange(200))
+    index.repair()
+    index.upsert(X[:20], numpy.arange(20))
+    assert index.n_deleted == 180
+    assert (index.search(X[:20], 1)[1][:, 0] == numpy.arange(20)).sum() >= 18
+
+    # and before any repair
+    index.remove(numpy.arange(20))
+    index.upsert(X[:20], numpy.arange(20))
+    assert (index.search(X[:20], 1)[1][:, 0] == numpy.arange(20)).sum() >= 18
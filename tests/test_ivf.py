@@ -0,0 +1,75 @@
+from tinyhnsw import IVFPQIndex, FullNNIndex
+from tinyhnsw.index import Index
+
+import numpy
+import pytest
+
+
+def test_search_shapes():
+    X = numpy.random.randn(500, 16)
+    index = IVFPQIndex(16, nlist=8, m=4, nbits=4)
+    index.add(X)
+    assert index.ntotal == 500
+    assert index.vectors is None
+
+    D, I = index.search(X[:10], 5, nprobe=2)
+    assert D.shape == (10, 5)
+    assert I.shape == (10, 5)
+    assert (I >= 0).all()
+
+
+@pytest.mark.parametrize("distance", ["l2", "cosine"])
+def test_recall(distance):
+    X = numpy.random.rand(2000, 16) ** 3
+    index = IVFPQIndex(16, distance=distance, nlist=16, m=8, nprobe=16)
+    index.add(X)
+
+    exact = FullNNIndex(16, distance=distance)
+    exact.add(X)
+
+    _, I = index.search(X[:100], 10)
+    _, I_e = exact.search(X[:100], 10)
+    recall = numpy.mean([len(set(a) & set(b)) / 10 for a, b in zip(I, I_e)])
+    assert recall >= 0.6
+
+
+def test_round_trip(tmp_path):
+    X = numpy.random.randn(500, 16)
+    index = IVFPQIndex(16, nlist=8, m=4)
+    index.add(X)
+    index.save(tmp_path / "index.bin")
+
+    loaded = Index.from_file(tmp_path / "index.bin")
+    assert isinstance(loaded, IVFPQIndex)
+
+    D, I = index.search(X[:10], 5, nprobe=4)
+    D_l, I_l = loaded.search(X[:10], 5, nprobe=4)
+    assert numpy.allclose(D, D_l)
+    assert (I == I_l).all()
+
+    loaded.add(X[:10])
+    assert loaded.ntotal == 510
+
+
+def test_small_training_set(tmp_path):
+    X = numpy.random.randn(50, 8)
+    index = IVFPQIndex(8, nlist=100, m=2, nbits=4)
+    index.add(X)
+    assert index.nlist == len(index.lists) == len(index.codes) == 50
+
+    index.save(tmp_path / "index.bin")
+    loaded = Index.from_file(tmp_path / "index.bin")
+    assert loaded.nlist == 50
+    assert (loaded.search(X[:5], 3)[1] == index.search(X[:5], 3)[1]).all()
+
+
+def test_inner_product_distances():
+    # unnormalized vectors, so that good matches have negative distances
+    X = 2.0 * numpy.random.randn(500, 16)
+    index = IVFPQIndex(16, distance="inner_product", nlist=4, m=8, nprobe=4)
+    index.add(X)
+
+    D, I = index.search(X[:10], 3)
+    assert (D < 0).all()
+    exact = 1.0 - (X[:10, None] * X[I]).sum(-1)
+    assert numpy.abs(D - exact).mean() < 0.2 * numpy.abs(exact).mean()
@@ -13,24 +13,77 @@ def test_add():
     assert index.ntotal == 20
 
 
-# def test_search_shapes():
-#     X = numpy.random.randn(10, 100)
-#     index = FullNNIndex(100)
-#     index.add(X)
-#     D, I = index.search(X, 5)
+def test_search_shapes():
+    X = numpy.random.randn(10, 100)
+    index = FullNNIndex(100)
+    index.add(X)
+    D, I = index.search(X, 5)
+
+    assert D.shape == (10, 5)
+    assert I.shape == (10, 5)
+
+
+def test_self_search():
+    X = numpy.random.randn(10, 100)
+    index = FullNNIndex(100)
+    index.add(X)
+    D, I = index.search(X, 1)
+
+    assert D.shape == (10, 1)
+    assert I.shape == (10, 1)
+
+    assert numpy.allclose(D[:, 0], numpy.zeros_like(D[:, 0]), atol=1e-5)
+    assert numpy.allclose(I, numpy.expand_dims(numpy.arange(10), axis=1))
 
-#     assert D.shape == (10, 5)
-#     assert I.shape == (10, 5)
 
+def test_search_padding():
+    X = numpy.random.randn(3, 8)
+    index = FullNNIndex(8, distance="l2")
+    index.add(X)
+    D, I = index.search(X[0], 5)
+
+    assert I.shape == (1, 5)
+    assert (I[0, 3:] == -1).all()
+    assert numpy.isinf(D[0, 3:]).all()
+
+
+def test_blocked_search_matches_full():
+    X = numpy.random.randn(1000, 16)
+    Q = numpy.random.randn(37, 16)
+
+    full = FullNNIndex(16, distance="l2", tile_size=len(X))
+    full.add(X)
+    blocked = FullNNIndex(16, distance="l2", tile_size=64, query_block=10)
+    blocked.add(X)
+
+    D, I = full.search(Q, 10)
+    D_b, I_b = blocked.search(Q, 10, n_workers=3)
+
+    assert numpy.allclose(D, D_b)
+    assert (I == I_b).all()
+    assert (numpy.diff(D_b, axis=1) >= 0).all()
+
+
+def test_range_search():
+    X = numpy.random.randn(500, 8).astype(numpy.float32)
+    index = FullNNIndex(8, distance="l2", tile_size=64, query_block=7)
+    index.add(X)
 
-# def test_self_search():
-#     X = numpy.random.randn(10, 100)
-#     index = FullNNIndex(100)
-#     index.add(X)
-#     D, I = index.search(X, 1)
+    radius = 2.5
+    lims, D, I = index.range_search(X[:20], radius)
+    assert lims.shape == (21,)
+    assert len(D) == len(I) == lims[-1]
 
-#     assert D.shape == (10, 1)
-#     assert I.shape == (10, 1)
+    for i in range(20):
+        true = numpy.linalg.norm(X - X[i], axis=1)
+        D_i, I_i = D[lims[i] : lims[i + 1]], I[lims[i] : lims[i + 1]]
+        inside = set(numpy.flatnonzero(true <= radius - 1e-3).tolist())
+        outside = set(numpy.flatnonzero(true > radius + 1e-3).tolist())
+        assert inside <= set(I_i.tolist())
+        assert not outside & set(I_i.tolist())
+        assert numpy.allclose(D_i, true[I_i], atol=1e-2)
+        assert (numpy.diff(D_i) >= 0).all()
+        assert I_i[0] == i
 
-#     assert numpy.allclose(D[:, 0], numpy.ones_like(D[:, 0]))
-#     assert numpy.allclose(I, numpy.expand_dims(numpy.arange(10), axis=1))
+    lims, D, I = index.range_search(X[:5], -radius)
+    assert (lims == 0).all() and len(D) == len(I) == 0
@@ -0,0 +1,72 @@
+from tinyhnsw import HNSWIndex
+from tinyhnsw.hnsw import DEFAULT_CONFIG
+from tinyhnsw.index import Index
+from tinyhnsw.distance import L2Distance
+from tinyhnsw.quantization import ScalarQuantizer, BinaryQuantizer
+from dataclasses import replace
+
+import numpy
+import pytest
+
+
+def test_scalar_round_trip():
+    X = numpy.random.randn(100, 16).astype(numpy.float32)
+    quantizer = ScalarQuantizer(16, L2Distance())
+    quantizer.train(X)
+    quantizer.add(X)
+
+    assert quantizer.codes.view().dtype == numpy.uint8
+    assert numpy.abs(quantizer.decode(quantizer.codes.view()) - X).max() < 0.05
+
+
+def test_binary_hamming():
+    X = numpy.random.randn(10, 20).astype(numpy.float32)
+    quantizer = BinaryQuantizer(20, L2Distance())
+    quantizer.train(X)
+    quantizer.add(X)
+
+    assert quantizer.codes.view().shape == (10, 3)
+    D = quantizer.distances(X[0], list(range(10)))
+    expected = ((X > quantizer.mean) != (X[0] > quantizer.mean)).sum(axis=1)
+    assert numpy.array_equal(D, expected)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_search(tmp_path, quantization):
+    X = numpy.random.randn(200, 16)
+    config = replace(DEFAULT_CONFIG, quantization=quantization, ef_search=64)
+    index = HNSWIndex(16, distance="l2", config=config)
+    index.add(X)
+
+    D, I = index.search(X, 1)
+    assert (I[:, 0] == numpy.arange(200)).sum() >= 180
+    # reranked against the full-precision vectors
+    assert numpy.allclose(D[I[:, 0] == numpy.arange(200), 0], 0.0, atol=1e-2)
+
+    index.save(tmp_path / "index.bin")
+    loaded = Index.from_file(tmp_path / "index.bin")
+    D_l, I_l = loaded.search(X, 1)
+    assert (I == I_l).all()
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_streaming(quantization):
+    X = numpy.random.randn(1500, 16).astype(numpy.float32)
+    config = replace(DEFAULT_CONFIG, quantization=quantization, ef_search=64)
+    gold = numpy.argsort(((X[:100, None] - X[None]) ** 2).sum(-1), axis=1)[:, :10]
+
+    bulk = HNSWIndex(16, distance="l2", config=config)
+    bulk.add(X)
+    _, I_bulk = bulk.search(X[:100], 10)
+
+    # the first batch is a single vector, which alone can't train the codes
+    streamed = HNSWIndex(16, distance="l2", config=config)
+    streamed.add(X[:1])
+    for b in range(1, 1500, 100):
+        streamed.add(X[b : b + 100])
+    _, I = streamed.search(X[:100], 10)
+
+    quantizer = streamed.quantizer
+    assert len(quantizer.codes) == 1500
+    assert numpy.array_equal(quantizer.codes.view()[:1], quantizer.encode(X[:1]))
+    assert numpy.isin(I, gold).mean() >= numpy.isin(I_bulk, gold).mean() - 0.05
@@ -0,0 +1,62 @@
+from tinyhnsw import HNSWIndex, FullNNIndex
+from tinyhnsw.filter import FilterableHNSWIndex
+from tinyhnsw.index import Index
+
+import numpy
+import pickle
+import pytest
+
+
+@pytest.mark.parametrize("klass", [HNSWIndex, FullNNIndex, FilterableHNSWIndex])
+def test_round_trip(tmp_path, klass):
+    X = numpy.random.randn(100, 8)
+    index = klass(8, distance="l2")
+    index.add(X)
+    index.save(tmp_path / "index.bin")
+
+    loaded = Index.from_file(tmp_path / "index.bin")
+    assert type(loaded) is klass
+    assert loaded.ntotal == 100
+    assert isinstance(loaded.storage.data, numpy.memmap)
+
+    D, I = index.search(X[:10], 5)
+    D_l, I_l = loaded.search(X[:10], 5)
+    assert numpy.allclose(D, D_l)
+    assert (I == I_l).all()
+
+
+def test_add_after_load(tmp_path):
+    X = numpy.random.randn(60, 8)
+    index = HNSWIndex(8)
+    index.add(X[:50])
+    index.save(tmp_path / "index.bin")
+
+    loaded = HNSWIndex.from_file(tmp_path / "index.bin")
+    loaded.add(X[50:])
+    assert loaded.ntotal == 60
+
+    _, I = loaded.search(X[50:], 1)
+    assert (I[:, 0] == numpy.arange(50, 60)).sum() >= 9
+
+    reloaded = HNSWIndex.from_file(tmp_path / "index.bin")
+    assert reloaded.ntotal == 50
+
+
+def test_read_only(tmp_path):
+    index = FullNNIndex(8)
+    index.add(numpy.random.randn(10, 8))
+    index.save(tmp_path / "index.bin")
+
+    loaded = FullNNIndex.from_file(tmp_path / "index.bin", mmap_mode="r")
+    with pytest.raises(ValueError):
+        loaded.vectors[0] = 0.0
+
+
+def test_legacy_pickle(tmp_path):
+    index = FullNNIndex(8)
+    index.add(numpy.random.randn(10, 8))
+    with open(tmp_path / "index.pkl", "wb") as f:
+        pickle.dump(index, f)
+
+    with pytest.raises(ValueError, match="older version"):
+        FullNNIndex.from_file(tmp_path / "index.pkl")
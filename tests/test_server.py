@@ -0,0 +1,94 @@
+from tinyhnsw import HNSWIndex
+from tinyhnsw.server import (
+    QueryClient,
+    QueryError,
+    QueryServer,
+    ServerConfig,
+    Overloaded,
+)
+
+import asyncio
+import numpy
+import pytest
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = HNSWIndex(8, distance="l2")
+    index.add(numpy.random.randn(500, 8))
+    return index
+
+
+def test_server(index, tmp_path):
+    Q = numpy.random.randn(50, 8).astype(numpy.float32)
+    D_e, I_e = index.search(Q, 5)
+
+    async def run(**address):
+        config = ServerConfig(max_batch=16, max_wait=0.01, n_workers=2)
+        async with await QueryServer(index, config).start(**address) as server:
+            if "path" in address:
+                client = await QueryClient.connect(path=address["path"])
+            else:
+                client = await QueryClient.connect(port=server.address[1])
+
+            results = await asyncio.gather(*[client.search(q, 5) for q in Q])
+            D, I = await client.search(Q[0], 3)
+            assert (I == I_e[0, :3]).all()
+
+            with pytest.raises(QueryError):
+                await client.search(Q[0, :4], 3)
+            for k in [0, -1, config.max_k + 1]:
+                with pytest.raises(QueryError):
+                    await client.search(Q[0], k)
+
+            await client.close()
+            return results, server.summary()
+
+    for address in [{}, {"path": str(tmp_path / "server.sock")}]:
+        results, summary = asyncio.run(run(**address))
+        assert (numpy.stack([I for _, I in results]) == I_e).all()
+        assert numpy.allclose(numpy.stack([D for D, _ in results]), D_e, atol=1e-4)
+        assert summary["batches"] < 51
+        assert summary["mean_batch"] > 1
+
+
+def test_backpressure_and_timeouts(index):
+    Q = numpy.random.randn(100, 8)
+
+    async def run():
+        config = ServerConfig(max_pending=10, n_workers=1)
+        async with await QueryServer(index, config).start() as server:
+            results = await asyncio.gather(
+                *[server.search(q, 5) for q in Q], return_exceptions=True
+            )
+            with pytest.raises(asyncio.TimeoutError):
+                await server.search(Q[0], 5, timeout=0)
+            return results, server.summary()
+
+    results, summary = asyncio.run(run())
+    rejected = [r for r in results if isinstance(r, Overloaded)]
+    assert len(rejected) == summary["rejected"] == 90
+    assert all(len(r[1]) == 5 for r in results if not isinstance(r, Exception))
+    assert summary["timeouts"] == 1
+
+
+def test_client_after_eof():
+    async def hang_up(reader, writer):
+        await reader.readline()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(hang_up, "127.0.0.1", 0)
+        client = await QueryClient.connect(port=server.sockets[0].getsockname()[1])
+
+        # the request the server hung up on, then the ones after it
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                await asyncio.wait_for(client.search(numpy.zeros(8), 5), 1)
+        assert len(client._waiting) == 0
+
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
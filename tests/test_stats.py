@@ -0,0 +1,80 @@
+from tinyhnsw import HNSWIndex
+from tinyhnsw.filter import FilterableHNSWIndex
+from tinyhnsw.stats import Histogram, SearchMonitor
+
+import numpy
+
+
+def test_return_stats():
+    X = numpy.random.randn(200, 8)
+    index = HNSWIndex(8)
+    index.add(X)
+
+    D, I = index.search(X[:5], 3)
+    D_s, I_s, stats = index.search(X[:5], 3, return_stats=True)
+    assert (I == I_s).all()
+    assert len(stats) == 5
+
+    for record in stats:
+        assert set(record.hops) == set(range(index.L + 1))
+        assert record.visited == record.distances > 0
+        assert record.heap_ops >= sum(record.hops.values())
+        assert 0 < sum(record.layer_time.values()) <= record.time
+
+
+def test_monitor():
+    X = numpy.random.randn(200, 8)
+    index = HNSWIndex(8)
+    index.add(X)
+
+    seen = []
+    index.monitor = SearchMonitor()
+    index.monitor.add_hook(seen.append)
+
+    index.search(X[:10], 3)
+    index.search(X[:10], 3, n_workers=2, executor="process")
+    assert len(seen) == 20
+
+    summary = index.monitor.summary()
+    assert summary["visited"]["count"] == 20
+    assert summary["time_us"]["p99"] >= summary["time_us"]["p50"] > 0
+    assert set(summary["layer_time_us"]) == set(range(index.L + 1))
+    assert sum(summary["stops"].values()) == 20
+
+
+def test_monitor_filtered():
+    X = numpy.random.randn(100, 8)
+    index = FilterableHNSWIndex(8)
+    index.add(X)
+    index.monitor = SearchMonitor()
+
+    index.search(X[:4], 3)
+    index.search(X[:4], 3, valid=numpy.arange(100) < 10)
+    assert index.monitor.summary()["distances"]["count"] == 8
+
+
+def test_return_stats_filtered():
+    X = numpy.random.randn(100, 8)
+    index = FilterableHNSWIndex(8)
+    index.add(X)
+
+    for valid in [None, numpy.arange(100) < 10]:
+        D, I = index.search(X[:4], 3, valid=valid)
+        D_s, I_s, stats = index.search(X[:4], 3, valid=valid, return_stats=True)
+        assert (I == I_s).all()
+        assert len(stats) == 4 and all(record.distances > 0 for record in stats)
+
+    *_, stats, plan = index.search(
+        X[:4], 3, valid=valid, return_stats=True, return_plan=True
+    )
+    assert plan["plan"] == "brute_force" and len(stats) == 4
+
+
+def test_histogram():
+    histogram = Histogram()
+    for value in [0, 1, 3, 100, 1000]:
+        histogram.record(value)
+
+    assert histogram.count == 5
+    assert histogram.percentile(50) == 4
+    assert histogram.percentile(100) == 1024
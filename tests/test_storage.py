@@ -0,0 +1,40 @@
+from tinyhnsw.storage import VectorStorage
+from tinyhnsw import FullNNIndex
+
+import numpy
+
+
+def test_append_grows_geometrically():
+    storage = VectorStorage(4)
+    X = numpy.random.randn(100, 4).astype(numpy.float32)
+
+    capacities = set()
+    for i in range(0, 100, 5):
+        storage.append(X[i : i + 5])
+        capacities.add(storage.capacity)
+
+    assert len(storage) == 100
+    assert len(capacities) <= 8
+    assert numpy.array_equal(storage.view(), X)
+
+
+def test_reserve():
+    storage = VectorStorage(4)
+    storage.reserve(50)
+    data = storage.data
+
+    storage.append(numpy.ones((50, 4)))
+    assert storage.data is data
+    assert storage.view().flags["C_CONTIGUOUS"]
+
+
+def test_index_reserve():
+    index = FullNNIndex(8, distance="l2")
+    index.reserve(30)
+
+    for _ in range(3):
+        index.add(numpy.random.randn(10, 8))
+
+    assert index.ntotal == 30
+    assert index.storage.capacity == 30
+    assert len(index.engine.sq_norms) == 30
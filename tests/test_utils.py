@@ -0,0 +1,49 @@
+from tinyhnsw.utils import evaluate, mmap_vecs, read_vecs, write_vecs
+from tinyhnsw.groundtruth import compute_ground_truth
+from tinyhnsw import FullNNIndex
+
+import numpy
+import pytest
+
+
+@pytest.mark.parametrize(
+    "extension,dtype", [(".fvecs", "float32"), (".ivecs", "int32"), (".bvecs", "uint8")]
+)
+def test_vecs_round_trip(tmp_path, extension, dtype):
+    X = (numpy.random.rand(20, 12) * 100).astype(dtype)
+    path = str(tmp_path / f"x{extension}")
+    write_vecs(path, X)
+
+    Y = mmap_vecs(path)
+    assert isinstance(Y.base, numpy.memmap) or isinstance(Y, numpy.memmap)
+    assert Y.dtype == numpy.dtype(dtype)
+    assert numpy.array_equal(X, Y)
+
+
+def test_read_vecs(tmp_path):
+    X = numpy.random.randn(20, 12).astype(numpy.float32)
+    write_vecs(str(tmp_path / "x.fvecs"), X)
+    assert numpy.array_equal(read_vecs(str(tmp_path / "x.fvecs")), X)
+
+
+def test_ground_truth_matches_full_index():
+    X = numpy.random.randn(1000, 16).astype(numpy.float32)
+    Q = numpy.random.randn(25, 16).astype(numpy.float32)
+
+    D, I = compute_ground_truth(X, Q, 10, chunk_size=300, tile_size=64)
+
+    index = FullNNIndex(16, distance="l2")
+    index.add(X)
+    D_e, I_e = index.search(Q, 10)
+
+    assert (I == I_e).all()
+    assert numpy.allclose(D, D_e, atol=1e-4)
+
+
+def test_evaluate():
+    gold = numpy.array([[0, 1, 2], [3, 4, -1]])
+    predictions = numpy.array([[2, 0, 9], [4, 8, 3]])
+
+    assert evaluate(gold, predictions) == 4 / 5
+    assert evaluate(gold, predictions, k=1) == 0.0
+    assert evaluate(gold[:, 0], predictions[:, 1]) == 0.5
@@ -1,2 +1,3 @@
 from tinyhnsw.hnsw import HNSWIndex, HNSWConfig
-from tinyhnsw.knn import FullNNIndex
\ No newline at end of file
+from tinyhnsw.knn import FullNNIndex
+from tinyhnsw.ivf import IVFPQIndex
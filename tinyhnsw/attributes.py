@@ -0,0 +1,244 @@
+"""
+Per-vector attributes for filtered search. Filters are bitmaps: NumPy bool
+arrays with one entry per stored vector (or the same packed 8 to a byte with
+`numpy.packbits`), which `FilterableHNSWIndex.search` takes as `valid`. They
+are built from an `AttributeIndex` and combined with NumPy's own operators:
+
+    attrs = index.attributes
+    valid = (attrs.eq("color", "red") | attrs.eq("color", "blue")) & ~attrs.range("price", lo=100)
+
+Two kinds of fields are supported, picked from the first column added:
+
+- categorical tags (strings, or lists of them for multi-valued fields) are
+  kept as postings: one sorted array of rows per distinct value;
+- numeric fields are kept as a column plus a lazily sorted copy (the sorted
+  array equivalent of a skip list), so a range predicate is two binary
+  searches and a scatter into the bitmap.
+"""
+
+from __future__ import annotations
+from tinyhnsw.storage import VectorStorage
+from collections import defaultdict
+
+import numpy
+
+_MULTI = (list, tuple, set, frozenset)
+
+
+class AttributeIndex:
+    def __init__(self) -> None:
+        self.size = 0
+        self.tags: dict[str, dict] = {}
+        self.values: dict[str, VectorStorage] = {}
+        self._sorted: dict[str, tuple[numpy.ndarray, numpy.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def fields(self) -> list[str]:
+        return [*self.tags, *self.values]
+
+    def add(self, n: int, attributes: dict[str, list] | None = None) -> None:
+        """
+        Appends the attributes of `n` new rows. `attributes` maps each field to
+        a column of `n` values; fields left out are missing for these rows.
+        """
+        attributes = attributes or {}
+        start = self.size
+
+        for field, column in attributes.items():
+            assert len(column) == n, f"{field} has {len(column)} values, not {n}"
+
+            self._add_field(field, column, start)
+            if field in self.values:
+                self.values[field].append(numpy.asarray(column, dtype=numpy.float64))
+            else:
+                self._add_postings(self.tags[field], column, start)
+
+        self.size += n
+        for field, column in self.values.items():
+            if len(column) < self.size:
+                column.append(numpy.full(self.size - len(column), numpy.nan))
+
+        self._sorted.clear()
+
+    def update(self, rows: numpy.ndarray, attributes: dict[str, list]) -> None:
+        """
+        Replaces the attributes of existing `rows`: `attributes` maps each
+        field to a column of one value per row. Fields left out keep their
+        values.
+        """
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        assert ((rows >= 0) & (rows < self.size)).all(), "unknown rows"
+        n = len(rows)
+
+        for field, column in attributes.items():
+            assert len(column) == n, f"{field} has {len(column)} values, not {n}"
+            self._add_field(field, column, self.size)
+
+            if field in self.values:
+                self.values[field].view()[rows] = numpy.asarray(
+                    column, dtype=numpy.float64
+                )
+                continue
+
+            postings = self.tags[field]
+            for value, posting in list(postings.items()):
+                posting = posting.view()
+                kept = posting[~numpy.isin(posting, rows)]
+                if len(kept) == 0:
+                    del postings[value]
+                elif len(kept) < len(posting):
+                    postings[value] = VectorStorage.from_array(kept)
+
+            for value, new in _group(column, rows).items():
+                old = postings[value].view() if value in postings else new
+                postings[value] = VectorStorage.from_array(numpy.union1d(old, new))
+
+        self._sorted.clear()
+
+    def _add_field(self, field: str, column: list, n: int) -> None:
+        """
+        Creates `field`, of the kind of `column`, as missing for the first `n`
+        rows, unless it already exists.
+        """
+        if field in self.tags or field in self.values:
+            return
+        if _is_numeric(column):
+            self.values[field] = VectorStorage(None, dtype=numpy.float64)
+            self.values[field].append(numpy.full(n, numpy.nan))
+        else:
+            self.tags[field] = {}
+
+    def _add_postings(self, postings: dict, column: list, start: int) -> None:
+        rows = numpy.arange(start, start + len(column))
+        for value, rows in _group(column, rows).items():
+            if value not in postings:
+                postings[value] = VectorStorage(None, dtype=numpy.int64)
+            postings[value].append(rows)
+
+    def _bitmap(self, rows: numpy.ndarray | None = None) -> numpy.ndarray:
+        bitmap = numpy.zeros(self.size, dtype=bool)
+        if rows is not None:
+            bitmap[rows] = True
+        return bitmap
+
+    def eq(self, field: str, value) -> numpy.ndarray:
+        """
+        The rows whose `field` is (or, for multi-valued tags, contains) `value`.
+        """
+        if field in self.values:
+            return self.range(field, value, value)
+
+        postings = self.tags[field].get(value)
+        return self._bitmap(None if postings is None else postings.view())
+
+    def isin(self, field: str, values: list) -> numpy.ndarray:
+        """
+        The rows whose `field` is any of `values`.
+        """
+        bitmap = self._bitmap()
+        for value in values:
+            bitmap |= self.eq(field, value)
+        return bitmap
+
+    def range(
+        self, field: str, lo: float | None = None, hi: float | None = None
+    ) -> numpy.ndarray:
+        """
+        The rows with `lo <= field <= hi` (either bound can be left open).
+        Rows where the field is missing never match.
+        """
+        values, order = self._sorted_values(field)
+        a = 0 if lo is None else numpy.searchsorted(values, lo, side="left")
+        b = numpy.searchsorted(values, numpy.inf if hi is None else hi, side="right")
+        return self._bitmap(order[a:b])
+
+    def _sorted_values(self, field: str) -> tuple[numpy.ndarray, numpy.ndarray]:
+        if field not in self._sorted:
+            column = self.values[field].view()
+            order = numpy.argsort(column, kind="stable")
+            self._sorted[field] = (column[order], order)
+        return self._sorted[field]
+
+    def compact(self, keep: numpy.ndarray) -> None:
+        """
+        Drops the rows not in the boolean mask `keep`, renumbering the rest.
+        """
+        keep = keep[: self.size]
+        remap = numpy.cumsum(keep) - 1
+
+        for postings in self.tags.values():
+            for value, rows in list(postings.items()):
+                rows = rows.view()
+                rows = remap[rows[keep[rows]]]
+                if len(rows) == 0:
+                    del postings[value]
+                else:
+                    postings[value] = VectorStorage.from_array(rows)
+
+        for field, column in self.values.items():
+            self.values[field] = VectorStorage.from_array(column.view()[keep])
+
+        self.size = int(keep.sum())
+        self._sorted.clear()
+
+    def get_state(self) -> tuple[dict, dict[str, numpy.ndarray]]:
+        """
+        Tag postings are written per field as one concatenated array of rows
+        plus the number of rows of each value, in the order listed in `meta`.
+        """
+        meta = {"size": self.size, "tags": {}, "values": list(self.values)}
+        arrays = {}
+
+        for field, postings in self.tags.items():
+            meta["tags"][field] = list(postings)
+            rows = [p.view() for p in postings.values()]
+            arrays[f"tags.{field}.counts"] = numpy.array(
+                [len(r) for r in rows], dtype=numpy.int64
+            )
+            arrays[f"tags.{field}.rows"] = numpy.concatenate(
+                [numpy.empty(0, dtype=numpy.int64), *rows]
+            )
+
+        for field, column in self.values.items():
+            arrays[f"values.{field}"] = column.view()
+
+        return meta, arrays
+
+    def set_state(self, meta: dict, arrays: dict[str, numpy.ndarray]) -> None:
+        self.__init__()
+        self.size = meta["size"]
+
+        for field, keys in meta["tags"].items():
+            rows = arrays[f"tags.{field}.rows"]
+            offsets = numpy.cumsum([0, *arrays[f"tags.{field}.counts"].tolist()])
+            self.tags[field] = {
+                value: VectorStorage.from_array(rows[a:b])
+                for value, a, b in zip(keys, offsets[:-1], offsets[1:])
+            }
+
+        for field in meta["values"]:
+            self.values[field] = VectorStorage.from_array(arrays[f"values.{field}"])
+
+
+def _group(column: list, rows: numpy.ndarray) -> dict:
+    """
+    The sorted `rows` of each distinct value in `column`, whose values are
+    tags or collections of them.
+    """
+    groups = defaultdict(list)
+    for row, value in zip(rows.tolist(), column):
+        for v in value if isinstance(value, _MULTI) else [value]:
+            groups[v.item() if isinstance(v, numpy.generic) else v].append(row)
+    return {
+        value: numpy.unique(numpy.array(rows, dtype=numpy.int64))
+        for value, rows in groups.items()
+    }
+
+
+def _is_numeric(column: list) -> bool:
+    if any(isinstance(value, _MULTI) for value in column):
+        return False
+    return numpy.asarray(column).dtype.kind in "iuf"
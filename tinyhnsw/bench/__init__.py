@@ -0,0 +1,24 @@
+"""
+An ann-benchmarks style benchmark suite, to compare indexes and catch
+performance regressions:
+
+    python -m tinyhnsw.bench --synthetic 10000 --M 8 16 --ef-search 16 32 64 128
+    python -m tinyhnsw.bench --base sift_base.fvecs --queries sift_query.fvecs \\
+        --groundtruth sift_groundtruth.ivecs --output results/ --baseline old.json
+
+Each configuration reports its build time, peak RSS while building, saved
+index size, single-query and batched QPS, and Recall@k. Results are written as
+JSON and CSV, along with a recall/QPS Pareto plot when matplotlib is
+installed.
+"""
+
+from tinyhnsw.bench.datasets import Dataset, load_vecs, clustered
+from tinyhnsw.bench.runner import run, build, measure, hnsw_config
+from tinyhnsw.bench.report import (
+    write_json,
+    read_json,
+    write_csv,
+    pareto_frontier,
+    plot_pareto,
+    compare,
+)
@@ -0,0 +1,67 @@
+from tinyhnsw.bench import clustered, load_vecs, run
+from tinyhnsw.bench.report import compare, plot_pareto, read_json, write_csv, write_json
+from tinyhnsw.bench.runner import INDEXES
+from tinyhnsw.distance import ENGINES
+
+import argparse
+import os
+import sys
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks tinyhnsw indexes")
+    data = parser.add_mutually_exclusive_group(required=True)
+    data.add_argument("--synthetic", type=int, metavar="N", help="N clustered points")
+    data.add_argument("--base", help="base vectors (.fvecs or .bvecs)")
+    parser.add_argument("--queries", help="query vectors, with --base")
+    parser.add_argument("--groundtruth", help="true neighbors (.ivecs), with --base")
+    parser.add_argument("--dim", type=int, default=32, help="with --synthetic")
+    parser.add_argument("--n-queries", type=int, default=200, help="with --synthetic")
+    parser.add_argument("--distance", default="l2", choices=sorted(ENGINES))
+    parser.add_argument("--index", nargs="+", default=list(INDEXES), choices=INDEXES)
+    parser.add_argument("--M", nargs="+", type=int, default=[16])
+    parser.add_argument("--ef-construction", nargs="+", type=int, default=[32])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[16, 32, 64, 128])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--single", type=int, default=100, help="queries timed alone")
+    parser.add_argument("--output", default="bench", help="directory for the results")
+    parser.add_argument("--baseline", help="results.json of an earlier run to compare")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        dataset = clustered(
+            args.synthetic, args.dim, args.n_queries, distance=args.distance
+        )
+    else:
+        assert args.queries, "--base needs --queries"
+        dataset = load_vecs(args.base, args.queries, args.groundtruth, args.distance)
+
+    results = run(
+        dataset,
+        args.index,
+        M=args.M,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+        k=args.k,
+        n_workers=args.workers,
+        n_single=args.single,
+    )
+
+    os.makedirs(args.output, exist_ok=True)
+    write_json(results, os.path.join(args.output, "results.json"))
+    write_csv(results, os.path.join(args.output, "results.csv"))
+    try:
+        plot_pareto(results, os.path.join(args.output, "pareto.png"))
+    except ImportError:
+        print("matplotlib is not installed, skipping the Pareto plot")
+
+    if args.baseline:
+        regressions = compare(read_json(args.baseline), results)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
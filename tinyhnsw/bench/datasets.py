@@ -0,0 +1,106 @@
+"""
+Benchmark datasets: local .fvecs/.bvecs files (e.g. the TEXMEX SIFT/GIST
+sets) or synthetic clustered data, with exact neighbors computed on demand.
+"""
+
+from __future__ import annotations
+from tinyhnsw.groundtruth import compute_ground_truth
+from tinyhnsw.utils import mmap_vecs
+from dataclasses import dataclass
+
+import os
+import numpy
+
+
+@dataclass
+class Dataset:
+    name: str
+    base: numpy.ndarray
+    queries: numpy.ndarray
+    distance: str = "l2"
+    # (n_queries, k_gold) true neighbor ids of the unfiltered queries
+    groundtruth: numpy.ndarray | None = None
+    # attributes for FilterableHNSWIndex, and the (field, value) to filter on
+    attributes: dict[str, list] | None = None
+    filter: tuple[str, object] | None = None
+
+    @property
+    def d(self) -> int:
+        return self.base.shape[1]
+
+    def neighbors(self, k: int, valid: numpy.ndarray | None = None) -> numpy.ndarray:
+        """
+        The exact `k` nearest neighbors of every query among the base vectors
+        allowed by the bitmap `valid` (all of them if it's None). Unfiltered
+        neighbors are computed once and cached as `groundtruth`.
+        """
+        if valid is None:
+            if self.groundtruth is None or self.groundtruth.shape[1] < k:
+                _, self.groundtruth = compute_ground_truth(
+                    self.base, self.queries, k, self.distance
+                )
+            return self.groundtruth[:, :k]
+
+        rows = numpy.flatnonzero(valid)
+        _, I = compute_ground_truth(self.base[rows], self.queries, k, self.distance)
+        return rows[I]
+
+
+def load_vecs(
+    base: str,
+    queries: str,
+    groundtruth: str | None = None,
+    distance: str = "l2",
+    name: str | None = None,
+) -> Dataset:
+    """
+    Memory-maps a dataset from .fvecs/.bvecs files, with its ground truth from
+    an .ivecs file if there is one (see `tinyhnsw.groundtruth`).
+    """
+    return Dataset(
+        name=name or os.path.splitext(os.path.basename(base))[0],
+        base=mmap_vecs(base),
+        queries=numpy.asarray(mmap_vecs(queries), dtype=numpy.float32),
+        distance=distance,
+        groundtruth=(
+            None if groundtruth is None else numpy.asarray(mmap_vecs(groundtruth))
+        ),
+    )
+
+
+def clustered(
+    n: int = 10_000,
+    d: int = 32,
+    n_queries: int = 200,
+    n_clusters: int = 32,
+    spread: float = 0.3,
+    n_categories: int = 4,
+    distance: str = "l2",
+    seed: int = 0,
+) -> Dataset:
+    """
+    A gaussian mixture of `n_clusters` unit-variance centers, each point
+    `spread` away from its center on average per dimension; the queries are
+    drawn from the same mixture. Clustered data is harder for graph indexes
+    than uniform noise, since the clusters are only sparsely linked.
+
+    Every point gets a random "category" out of `n_categories`, and the
+    dataset filters on the first one.
+    """
+    rng = numpy.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, d))
+
+    def sample(m: int) -> numpy.ndarray:
+        labels = rng.integers(n_clusters, size=m)
+        X = centers[labels] + spread * rng.standard_normal((m, d))
+        return X.astype(numpy.float32)
+
+    categories = rng.integers(n_categories, size=n)
+    return Dataset(
+        name=f"clustered-{n}x{d}",
+        base=sample(n),
+        queries=sample(n_queries),
+        distance=distance,
+        attributes={"category": [f"c{c}" for c in categories.tolist()]},
+        filter=("category", "c0"),
+    )
@@ -0,0 +1,106 @@
+"""
+Writing, plotting and comparing benchmark results.
+"""
+
+from __future__ import annotations
+from collections import defaultdict
+
+import csv
+import json
+
+
+def write_json(results: list[dict], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def read_json(path: str) -> list[dict]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_csv(results: list[dict], path: str) -> None:
+    fields = list(dict.fromkeys(key for row in results for key in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def pareto_frontier(
+    results: list[dict], x: str = "recall", y: str = "qps_batch"
+) -> list[dict]:
+    """
+    The results that no other result beats on both `x` and `y` (higher is
+    better for both), sorted by `x`.
+    """
+    frontier = []
+    for row in sorted(results, key=lambda r: (-r[x], -r[y])):
+        if not frontier or row[y] > frontier[-1][y]:
+            frontier.append(row)
+    return frontier[::-1]
+
+
+def plot_pareto(
+    results: list[dict], path: str, x: str = "recall", y: str = "qps_batch"
+) -> None:
+    """
+    Plots the `x`/`y` Pareto frontier of each index type, ann-benchmarks
+    style, to an image at `path`. Needs matplotlib.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    groups = defaultdict(list)
+    for row in results:
+        groups[row["index"]].append(row)
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    for kind, rows in groups.items():
+        frontier = pareto_frontier(rows, x, y)
+        ax.plot([r[x] for r in frontier], [r[y] for r in frontier], "o-", label=kind)
+
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    ax.set_yscale("log")
+    ax.set_title(results[0]["dataset"] if results else "")
+    ax.grid(True, which="both", alpha=0.3)
+    ax.legend()
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def compare(
+    baseline: list[dict],
+    results: list[dict],
+    max_recall_drop: float = 0.01,
+    max_qps_drop: float = 0.2,
+) -> list[str]:
+    """
+    Matches results to a baseline run by dataset, index and parameters, and
+    describes every configuration whose recall dropped by more than
+    `max_recall_drop` (absolute) or whose batch QPS dropped by more than
+    `max_qps_drop` (relative).
+    """
+    keys = ["dataset", "index", "M", "ef_construction", "ef_search", "k"]
+    before = {tuple(row[key] for key in keys): row for row in baseline}
+    regressions = []
+
+    for row in results:
+        old = before.get(tuple(row[key] for key in keys))
+        if old is None:
+            continue
+
+        name = ", ".join(f"{key}={row[key]}" for key in keys if row[key] is not None)
+        if row["recall"] < old["recall"] - max_recall_drop:
+            regressions.append(
+                f"{name}: recall {old['recall']:.3f} -> {row['recall']:.3f}"
+            )
+        if row["qps_batch"] < old["qps_batch"] * (1 - max_qps_drop):
+            regressions.append(
+                f"{name}: QPS {old['qps_batch']:.0f} -> {row['qps_batch']:.0f}"
+            )
+
+    return regressions
@@ -0,0 +1,211 @@
+"""
+Runs the indexes over a parameter sweep and measures each configuration.
+"""
+
+from __future__ import annotations
+from tinyhnsw.bench.datasets import Dataset
+from tinyhnsw.filter import FilterableHNSWIndex
+from tinyhnsw.hnsw import HNSWIndex, HNSWConfig, DEFAULT_CONFIG
+from tinyhnsw.index import Index
+from tinyhnsw.knn import FullNNIndex
+from tinyhnsw.utils import evaluate
+from dataclasses import replace
+from time import perf_counter
+
+import math
+import os
+import sys
+import tempfile
+import threading
+
+INDEXES = {
+    "FullNNIndex": FullNNIndex,
+    "HNSWIndex": HNSWIndex,
+    "FilterableHNSWIndex": FilterableHNSWIndex,
+}
+
+
+class PeakRSS:
+    """
+    Tracks the peak resident set size of the process while in the `with`
+    block, by sampling /proc/self/statm from a background thread. Elsewhere
+    it falls back to the process-wide high-water mark from `getrusage`, which
+    never goes back down between blocks.
+    """
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            import resource
+
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if sys.platform == "darwin" else rss * 1024
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self) -> PeakRSS:
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def hnsw_config(M: int, ef_construction: int) -> HNSWConfig:
+    """
+    The paper's recommended settings for a given `M`: M_max = M, M_max0 = 2M
+    and m_L = 1 / ln(M).
+    """
+    return replace(
+        DEFAULT_CONFIG,
+        M=M,
+        M_max=M,
+        M_max0=2 * M,
+        m_L=1.0 / math.log(M),
+        ef_construction=ef_construction,
+    )
+
+
+def index_size(index: Index) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.index")
+        index.save(path)
+        return os.path.getsize(path)
+
+
+def build(dataset: Dataset, kind: str, config: HNSWConfig | None = None) -> dict:
+    """
+    Builds an index of type `kind` over the dataset and measures it.
+    """
+    klass = INDEXES[kind]
+    kwargs = {} if config is None else {"config": config}
+    index = klass(dataset.d, distance=dataset.distance, **kwargs)
+
+    with PeakRSS() as rss:
+        start = perf_counter()
+        if isinstance(index, FilterableHNSWIndex):
+            index.add(dataset.base, dataset.attributes)
+        else:
+            index.add(dataset.base)
+        build_time = perf_counter() - start
+
+    return {
+        "index": index,
+        "build_time": build_time,
+        "peak_rss_mb": rss.peak / 2**20,
+        "index_size_mb": index_size(index) / 2**20,
+    }
+
+
+def measure(
+    dataset: Dataset,
+    index: Index,
+    k: int,
+    n_workers: int = 1,
+    n_single: int | None = 100,
+) -> dict:
+    """
+    Times the queries one at a time (the first `n_single` of them, or all if
+    it's None) and as one batch on `n_workers` threads, and computes the
+    Recall@k of the batch. Filterable indexes are searched with the dataset's
+    filter.
+    """
+    Q = dataset.queries
+    kwargs, valid, result = {}, None, {}
+
+    if isinstance(index, FilterableHNSWIndex) and dataset.filter is not None:
+        valid = index.attributes.eq(*dataset.filter)
+        kwargs["valid"] = valid
+        result["plan"] = index.plan(valid, k)["plan"]
+        result["selectivity"] = float(valid.mean())
+
+    single = Q[:n_single]
+    start = perf_counter()
+    for q in single:
+        index.search(q, k, **kwargs)
+    result["qps_single"] = len(single) / (perf_counter() - start)
+
+    start = perf_counter()
+    _, I = index.search(Q, k, n_workers=n_workers, **kwargs)
+    result["qps_batch"] = len(Q) / (perf_counter() - start)
+
+    result["recall"] = evaluate(dataset.neighbors(k, valid), I, k)
+    return result
+
+
+def run(
+    dataset: Dataset,
+    indexes: list[str] = list(INDEXES),
+    M: list[int] = [16],
+    ef_construction: list[int] = [32],
+    ef_search: list[int] = [32],
+    k: int = 10,
+    n_workers: int = 1,
+    n_single: int | None = 100,
+    log=print,
+) -> list[dict]:
+    """
+    Benchmarks every index type in `indexes` on `dataset`. Graph indexes are
+    built once per (M, ef_construction) and searched once per ef_search; the
+    exact index once. Returns one flat dict of parameters and measurements
+    per searched configuration.
+    """
+    results = []
+
+    for kind in indexes:
+        if kind == "FullNNIndex":
+            builds = [(None, None, None)]
+        else:
+            builds = [
+                (m, efc, hnsw_config(m, efc)) for m in M for efc in ef_construction
+            ]
+
+        for m, efc, config in builds:
+            built = build(dataset, kind, config)
+            index = built.pop("index")
+
+            for ef in [None] if config is None else ef_search:
+                if config is not None:
+                    index.config = replace(config, ef_search=ef)
+
+                row = {
+                    "dataset": dataset.name,
+                    "index": kind,
+                    "M": m,
+                    "ef_construction": efc,
+                    "ef_search": ef,
+                    "k": k,
+                    "n": len(dataset.base),
+                    **built,
+                    **measure(dataset, index, k, n_workers, n_single),
+                }
+                results.append(row)
+                if log is not None:
+                    log(format_row(row))
+
+    return results
+
+
+def format_row(row: dict) -> str:
+    params = ", ".join(
+        f"{p}={row[p]}" for p in ["M", "ef_construction", "ef_search"] if row[p]
+    )
+    return (
+        f"{row['index']}({params}): recall@{row['k']} {row['recall']:.3f}, "
+        f"{row['qps_single']:.0f} / {row['qps_batch']:.0f} QPS (single / batch), "
+        f"built in {row['build_time']:.1f}s, {row['index_size_mb']:.1f} MB"
+    )
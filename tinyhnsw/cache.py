@@ -0,0 +1,177 @@
+"""
+A bounded cache of search results, for traffic that repeats the same queries:
+
+    index.cache = ResultCache(capacity=100_000, policy="lfu")
+    index.search(queries, k=10)  # cached per query
+    index.cache.stats()          # hits, misses, evictions, invalidations
+
+Entries are keyed by a hash of the query vector, `k`, the filter and the
+search parameters. With `resolution`, queries are snapped to a grid of that
+step before hashing, so near-identical queries (e.g. the same text embedded
+twice) share an entry. The index clears its cache whenever its contents
+change (`add`, `remove`, `upsert`, `repair`, `compact`, ...), and results
+computed while a change was in progress are never stored.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any
+
+import hashlib
+import numpy
+import threading
+
+
+class ResultCache:
+    POLICIES = ["lru", "lfu"]
+
+    def __init__(
+        self,
+        capacity: int = 10_000,
+        policy: str = "lru",
+        resolution: float | None = None,
+    ) -> None:
+        assert policy in self.POLICIES, f"policy must be one of {self.POLICIES}"
+        self.capacity = capacity
+        self.policy = policy
+        self.resolution = resolution
+        self._lock = threading.Lock()
+        self._reset()
+        self.generation = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __getstate__(self) -> dict:
+        # process pool workers get a copy of the index, but never search
+        # through its cache
+        return {
+            "capacity": self.capacity,
+            "policy": self.policy,
+            "resolution": self.resolution,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self, Q: numpy.ndarray, k: int, context: Any = None) -> list[bytes]:
+        """
+        The key of each query of `Q` in a search for `k` neighbors. `context`
+        holds everything else the results depend on (filters, parameters);
+        arrays in it are hashed by content.
+        """
+        prefix = repr((k, _fingerprint(context))).encode("utf-8")
+        if self.resolution is None:
+            Q = numpy.ascontiguousarray(Q, dtype=numpy.float32)
+        else:
+            Q = numpy.round(numpy.asarray(Q) / self.resolution).astype(numpy.int64)
+
+        return [
+            hashlib.blake2b(prefix + q.tobytes(), digest_size=16).digest() for q in Q
+        ]
+
+    def get(self, key: bytes) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if self.policy == "lru":
+                self._entries.move_to_end(key)
+            else:
+                self._bump(key, entry)
+            return entry[0]
+
+    def put(self, key: bytes, value: Any, generation: int | None = None) -> None:
+        """
+        Caches `value`, unless the cache has been cleared since `generation`
+        (read from `self.generation` before computing it).
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._entries[key][0] = value
+                return
+
+            if len(self._entries) >= self.capacity:
+                self._evict()
+                self.evictions += 1
+
+            self._entries[key] = [value, 1]
+            if self.policy == "lfu":
+                self._buckets.setdefault(1, OrderedDict())[key] = None
+                self._min_count = 1
+
+    def _bump(self, key: bytes, entry: list) -> None:
+        """
+        Moves `key` up one use count. LFU keeps a bucket of keys per count, in
+        least recently used order, so bumps and evictions are O(1).
+        """
+        count = entry[1]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if len(bucket) == 0:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+
+        entry[1] = count + 1
+        self._buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def _evict(self) -> None:
+        if self.policy == "lru":
+            self._entries.popitem(last=False)
+            return
+
+        bucket = self._buckets[self._min_count]
+        key, _ = bucket.popitem(last=False)
+        if len(bucket) == 0:
+            del self._buckets[self._min_count]
+        del self._entries[key]
+
+    def _reset(self) -> None:
+        # key -> [value, use count]
+        self._entries: OrderedDict[bytes, list] = OrderedDict()
+        self._buckets: dict[int, OrderedDict[bytes, None]] = {}
+        self._min_count = 0
+
+    def clear(self) -> None:
+        """
+        Drops every entry. Results computed before the clear are no longer
+        accepted by `put`.
+        """
+        with self._lock:
+            self._reset()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / max(lookups, 1),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _fingerprint(value: Any) -> Any:
+    """
+    A representation of `value` whose `repr` identifies it, with arrays
+    replaced by a hash of their contents.
+    """
+    if isinstance(value, numpy.ndarray):
+        data = numpy.ascontiguousarray(value).tobytes()
+        return (value.dtype.str, value.shape, hashlib.blake2b(data).hexdigest())
+    if isinstance(value, dict):
+        return tuple(sorted((k, _fingerprint(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_fingerprint(v) for v in value)
+    return value
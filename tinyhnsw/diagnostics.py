@@ -0,0 +1,217 @@
+"""
+Graph health checks for HNSW indexes, computed directly on the adjacency
+arrays (no networkx):
+
+    python -m tinyhnsw.diagnostics index.bin [--repair output.bin]
+
+For every layer, `diagnose` reports the out- and in-degree distributions, the
+nodes nobody links to any more (pruning in `add_edge` can drop a node's last
+in-edge), the nodes that a search starting from the entry point can't reach,
+and how the layer size compares to what the level distribution (`m_L`)
+predicts. Unreachable nodes are never returned by a search, which shows up as
+silent recall loss; `repair` links them back in.
+"""
+
+from __future__ import annotations
+from tinyhnsw.hnsw import HNSWIndex, HNSWLayer
+from tinyhnsw.index import Index
+from dataclasses import dataclass, field
+
+import argparse
+import math
+import numpy
+
+
+@dataclass
+class LayerReport:
+    layer: int
+    size: int
+    expected_size: float
+    M_max: int
+    out_degree: numpy.ndarray  # histogram: out_degree[d] nodes have degree d
+    in_degree: numpy.ndarray
+    zero_in_degree: numpy.ndarray  # node ids, excluding the entry point
+    unreachable: numpy.ndarray
+
+    @property
+    def mean_degree(self) -> float:
+        degrees = numpy.arange(len(self.out_degree))
+        return float((degrees * self.out_degree).sum() / max(self.size, 1))
+
+    @property
+    def saturated(self) -> int:
+        """
+        The number of nodes whose neighbor list is full.
+        """
+        return int(self.out_degree[self.M_max :].sum())
+
+
+@dataclass
+class GraphReport:
+    ntotal: int
+    n_deleted: int
+    layers: list[LayerReport] = field(default_factory=list)
+
+    @property
+    def healthy(self) -> bool:
+        return all(len(layer.unreachable) == 0 for layer in self.layers)
+
+    def __str__(self) -> str:
+        lines = [f"{self.ntotal} vectors, {self.n_deleted} deleted"]
+        for r in self.layers:
+            lines.append(
+                f"layer {r.layer}: {r.size} nodes (expected {r.expected_size:.0f}), "
+                f"mean degree {r.mean_degree:.1f}/{r.M_max}, "
+                f"{r.saturated} saturated, "
+                f"{len(r.zero_in_degree)} with no in-edges, "
+                f"{len(r.unreachable)} unreachable"
+            )
+        return "\n".join(lines)
+
+
+def live_nodes(index: HNSWIndex, layer: HNSWLayer) -> numpy.ndarray:
+    nodes = layer.nodes()
+    if index.deleted is None:
+        return nodes
+    return nodes[~index.deleted[nodes]]
+
+
+def reachable_from(layer: HNSWLayer, sources: list[int], n: int) -> numpy.ndarray:
+    """
+    A bool mask over node ids of everything reachable from `sources` along
+    the layer's directed edges, by a breadth-first search that expands the
+    whole frontier with one gather per level.
+    """
+    reached = numpy.zeros(n, dtype=bool)
+    frontier = numpy.asarray(sources, dtype=numpy.int64)
+    reached[frontier] = True
+
+    while len(frontier) > 0:
+        W = layer.neighbors[layer.rows[frontier]].ravel()
+        W = numpy.unique(W[W >= 0])
+        frontier = W[~reached[W]]
+        reached[frontier] = True
+
+    return reached
+
+
+def diagnose_layer(index: HNSWIndex, lc: int) -> LayerReport:
+    layer = index.layers[lc]
+    n = index.ntotal
+    nodes = live_nodes(index, layer)
+
+    degree = layer.degree[layer.rows[nodes]]
+    edges = layer.neighbors[layer.rows[nodes]]
+    in_degree = numpy.bincount(edges[edges >= 0], minlength=n)[nodes]
+
+    reached = reachable_from(layer, [index.ep], n)
+    n_live = n - index.n_deleted
+
+    return LayerReport(
+        layer=lc,
+        size=len(nodes),
+        # levels are floor(-ln(U) * m_L), so P(level >= lc) = exp(-lc / m_L)
+        expected_size=n_live * math.exp(-lc / index.config.m_L),
+        M_max=layer.M_max,
+        out_degree=numpy.bincount(degree, minlength=layer.M_max + 1),
+        in_degree=numpy.bincount(in_degree),
+        zero_in_degree=nodes[(in_degree == 0) & (nodes != index.ep)],
+        unreachable=nodes[~reached[nodes]],
+    )
+
+
+def diagnose(index: HNSWIndex) -> GraphReport:
+    report = GraphReport(ntotal=index.ntotal, n_deleted=index.n_deleted)
+    if not index.is_empty:
+        report.layers = [diagnose_layer(index, lc) for lc in range(index.L + 1)]
+    return report
+
+
+def repair(index: HNSWIndex, max_passes: int = 3) -> int:
+    """
+    Links unreachable nodes back into every layer. Each one is searched for
+    from the entry point like a new insertion, and its nearest reachable
+    nodes get an edge to it (forced, if the neighbor selection heuristic
+    would prune them all); nodes with no out-edges get them too. Nodes
+    that become reachable through an earlier repair are skipped. Adding
+    edges can prune others, so the graph is re-checked up to `max_passes`
+    times. Returns the number of nodes repaired.
+    """
+    repaired = 0
+    for _ in range(max_passes):
+        report = diagnose(index)
+        if report.healthy:
+            break
+
+        for r in report.layers:
+            if len(r.unreachable) > 0:
+                repaired += _repair_layer(index, index.layers[r.layer], r.unreachable)
+
+    if repaired > 0:
+        index._invalidate()
+    return repaired
+
+
+def _repair_layer(
+    index: HNSWIndex, layer: HNSWLayer, unreachable: numpy.ndarray
+) -> int:
+    reached = reachable_from(layer, [index.ep], index.ntotal)
+    repaired = 0
+
+    for node in unreachable.tolist():
+        if reached[node]:
+            continue
+
+        q = index.vectors[node]
+        D, W = layer.search(
+            q, index.ep, index.config.ef_construction, skip_deleted=True
+        )
+        candidates = [(d, e) for d, e in zip(D, W) if e != node and reached[e]]
+        if len(candidates) == 0:
+            continue
+
+        neighbors = layer.f_neighbors(*zip(*candidates), index.config.M)
+        linked = False
+        for d, e in neighbors:
+            if node not in layer.neighborhood(e)[1]:
+                layer.add_edge(e, node, d)
+            linked |= node in layer.neighborhood(e)[1]
+
+        if not linked:
+            # the selection heuristic pruned every new edge again: make the
+            # nearest node trade its longest edge for one to `node`
+            d, e = min(candidates)
+            D, W = layer.neighborhood(e)
+            D, W = D.tolist(), W.tolist()
+            if len(W) == layer.M_max:
+                worst = D.index(max(D))
+                del D[worst], W[worst]
+            layer.set_neighbors(e, D + [d], W + [node])
+
+        if layer.degree[layer.rows[node]] == 0:
+            layer.set_neighbors(node, *zip(*neighbors))
+
+        reached |= reachable_from(layer, [node], index.ntotal)
+        repaired += 1
+
+    return repaired
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("index", help="an index file written by `save`")
+    parser.add_argument("--repair", metavar="OUTPUT", help="repair and save to OUTPUT")
+    args = parser.parse_args()
+
+    index = Index.from_file(args.index)
+    assert isinstance(index, HNSWIndex), "diagnostics only apply to HNSW indexes"
+    print(diagnose(index))
+
+    if args.repair:
+        print(f"repaired {repair(index)} nodes")
+        print(diagnose(index))
+        index.save(args.repair)
+
+
+if __name__ == "__main__":
+    main()
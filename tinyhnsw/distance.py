@@ -0,0 +1,168 @@
+"""
+Distance engines. An engine is chosen once, in `Index.__init__`, and owns
+everything metric-specific: how stored vectors and queries are prepared, any
+per-vector caches, and how internal distances map back to true distances.
+
+Internally, every engine works on float32 and is free to use a cheaper
+quantity with the same ordering as the real distance (squared L2, for
+example). Only `finalize` converts back, which indexes do on returned results.
+"""
+
+from __future__ import annotations
+from tinyhnsw.storage import VectorStorage
+
+import math
+import numpy
+
+
+class DistanceEngine:
+    def prepare(self, X: numpy.ndarray) -> numpy.ndarray:
+        """
+        Transforms vectors (stored vectors or queries) into the space the engine
+        computes distances in.
+        """
+        return numpy.asarray(X, dtype=numpy.float32)
+
+    def add(self, X: numpy.ndarray) -> numpy.ndarray:
+        """
+        Prepares vectors that are about to be stored and updates any per-vector
+        caches. Returns the vectors that the index should store.
+        """
+        return self.prepare(X)
+
+    def update(self, rows: numpy.ndarray, X: numpy.ndarray) -> numpy.ndarray:
+        """
+        Like `add`, for vectors that replace the stored vectors at `rows`.
+        """
+        return self.prepare(X)
+
+    def reserve(self, n: int) -> None:
+        """
+        Preallocates per-vector caches for `n` stored vectors.
+        """
+
+    def get_state(self) -> dict[str, numpy.ndarray]:
+        """
+        Per-vector caches to persist alongside the stored vectors.
+        """
+        return {}
+
+    def set_state(self, arrays: dict[str, numpy.ndarray]) -> None:
+        pass
+
+    def compact(self, keep: numpy.ndarray) -> None:
+        """
+        Drops the per-vector caches of the vectors not in the boolean mask `keep`.
+        """
+
+    def distances(
+        self,
+        Q: numpy.ndarray,
+        X: numpy.ndarray,
+        ids: numpy.ndarray | slice | None = None,
+    ) -> numpy.ndarray:
+        """
+        Internal (n_q, n_x) distances between prepared queries `Q` and stored
+        vectors `X`. `X` must be the stored rows `ids` (an index array or a
+        slice), or all stored vectors if `ids` is None, so that cached
+        per-vector quantities line up.
+        """
+        raise NotImplementedError()
+
+    def finalize(self, D: numpy.ndarray) -> numpy.ndarray:
+        """
+        Converts internal distances into true distances.
+        """
+        return D
+
+    def threshold(self, radius: float) -> float:
+        """
+        Converts a true distance into an internal one (the inverse of
+        `finalize`), e.g. for comparing internal distances to a radius.
+        """
+        return radius
+
+
+class InnerProductDistance(DistanceEngine):
+    def distances(
+        self,
+        Q: numpy.ndarray,
+        X: numpy.ndarray,
+        ids: numpy.ndarray | slice | None = None,
+    ) -> numpy.ndarray:
+        return 1.0 - numpy.dot(Q, X.T)
+
+
+class CosineDistance(InnerProductDistance):
+    """
+    Stored vectors are normalized once, when they are added, and queries once
+    per search, so cosine distance reduces to an inner product.
+    """
+
+    def prepare(self, X: numpy.ndarray) -> numpy.ndarray:
+        X = numpy.asarray(X, dtype=numpy.float32)
+        norms = numpy.linalg.norm(X, axis=-1, keepdims=True)
+        return X / numpy.maximum(norms, numpy.finfo(numpy.float32).tiny)
+
+
+class L2Distance(DistanceEngine):
+    """
+    Squared L2 distance, computed as |x|^2 - 2x.y + |y|^2 with the squared norms
+    of the stored vectors cached at add time.
+    """
+
+    def __init__(self) -> None:
+        self.norms = VectorStorage(None)
+
+    @property
+    def sq_norms(self) -> numpy.ndarray:
+        return self.norms.view()
+
+    def reserve(self, n: int) -> None:
+        self.norms.reserve(n)
+
+    def get_state(self) -> dict[str, numpy.ndarray]:
+        return {"sq_norms": self.sq_norms}
+
+    def set_state(self, arrays: dict[str, numpy.ndarray]) -> None:
+        self.norms = VectorStorage.from_array(arrays["sq_norms"])
+
+    def compact(self, keep: numpy.ndarray) -> None:
+        self.norms = VectorStorage.from_array(self.sq_norms[keep])
+
+    def add(self, X: numpy.ndarray) -> numpy.ndarray:
+        X = self.prepare(X)
+        self.norms.append((X * X).sum(axis=1))
+        return X
+
+    def update(self, rows: numpy.ndarray, X: numpy.ndarray) -> numpy.ndarray:
+        X = self.prepare(X)
+        self.norms.data[rows] = (X * X).sum(axis=1)
+        return X
+
+    def distances(
+        self,
+        Q: numpy.ndarray,
+        X: numpy.ndarray,
+        ids: numpy.ndarray | slice | None = None,
+    ) -> numpy.ndarray:
+        sq_norms = self.sq_norms if ids is None else self.sq_norms[ids]
+        D = numpy.dot(Q, X.T)
+        D *= -2.0
+        D += numpy.expand_dims((Q * Q).sum(axis=1), axis=1)
+        D += sq_norms
+        return numpy.maximum(D, 0.0, out=D)
+
+    def finalize(self, D: numpy.ndarray) -> numpy.ndarray:
+        return numpy.sqrt(D)
+
+    def threshold(self, radius: float) -> float:
+        # nothing is within a negative radius (whose square would be positive)
+        return radius * radius if radius >= 0 else -math.inf
+
+
+ENGINES = {
+    "cosine": CosineDistance,
+    "l2": L2Distance,
+    "inner_product": InnerProductDistance,
+}
@@ -1,11 +1,43 @@
 from __future__ import annotations
-from tinyhnsw.hnsw import HNSWIndex, HNSWLayer
-from heapq import heappop, heappush, nlargest, nsmallest
+from tinyhnsw.attributes import AttributeIndex
+from tinyhnsw.hnsw import HNSWIndex, HNSWLayer, HNSWConfig, DEFAULT_CONFIG, search_layer
+from tinyhnsw.index import _as_batch
+from tinyhnsw.knn import _topk
+from tinyhnsw.stats import SearchStats
+from dataclasses import dataclass, asdict
+from time import perf_counter
 
+import math
 import numpy
 import random
 
 
+@dataclass
+class PlannerConfig:
+    """
+    Thresholds for picking a filtered search strategy from the selectivity of
+    the allow-list (the fraction of live vectors it allows):
+
+    - "brute_force": an exact scan of the allowed vectors, when there are at
+      most `brute_force_max` of them or the selectivity is below
+      `brute_force_selectivity`. A traversal would have to visit most of the
+      graph to find enough valid nodes anyway.
+    - "post_filter": an unfiltered traversal with `ef / selectivity`, whose
+      results are then filtered, when the selectivity is at least
+      `post_filter_selectivity`.
+    - "filtered": otherwise, a traversal that only collects valid nodes, with
+      `ef / selectivity` (at most `max_ef`).
+    """
+
+    brute_force_max: int = 2048
+    brute_force_selectivity: float = 0.02
+    post_filter_selectivity: float = 0.5
+    max_ef: int = 4096
+
+
+DEFAULT_PLANNER = PlannerConfig()
+
+
 class FilterableHNSWIndex(HNSWIndex):
     """
     A FilterableHNSWIndex implements the "missing WHERE clause" that Pinecone talks about
@@ -15,62 +47,326 @@ class FilterableHNSWIndex(HNSWIndex):
     If no allow-list is passed, then the behavior defaults to the standard HNSWIndex.
     We can make this change pretty non-invasively through the use of a layer_factory
     function.
+
+    Allow-lists are bitmaps over the stored vectors, usually built from the
+    attributes passed to `add` (see `tinyhnsw.attributes`).
     """
+
+    def __init__(
+        self,
+        d: int,
+        distance: str = "cosine",
+        config: HNSWConfig = DEFAULT_CONFIG,
+        planner: PlannerConfig = DEFAULT_PLANNER,
+    ) -> None:
+        super().__init__(d, distance, config)
+        self.planner = planner
+        self.attributes = AttributeIndex()
+
     def layer_factory(self, lc: int, ep: int | None = None) -> FilterableHNSWLayer:
         ep = ep or self.ep
         return FilterableHNSWLayer(self, lc, ep)
 
+    def add(
+        self,
+        vectors: numpy.ndarray,
+        attributes: dict[str, list] | None = None,
+        **kwargs,
+    ) -> None:
+        """
+        Adds `vectors` as `HNSWIndex.add` does, along with their `attributes`: a
+        dict from field name to a column of one value per vector.
+        """
+        self.attributes.add(len(vectors), attributes)
+        super().add(vectors, **kwargs)
+
+    def upsert(
+        self,
+        vectors: numpy.ndarray,
+        ids: numpy.ndarray,
+        attributes: dict[str, list] | None = None,
+        **kwargs,
+    ) -> None:
+        """
+        Upserts as `Index.upsert` does. The `attributes` of ids already in the
+        index replace theirs (fields left out are kept), and the others are
+        added with their vectors.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.int64).ravel()
+        rows = self._lookup(ids)
+        existing = (rows >= 0).tolist()
+        n = len(ids)
+
+        updated, added = {}, {}
+        for field, column in (attributes or {}).items():
+            assert len(column) == n, f"{field} has {len(column)} values, not {n}"
+            updated[field] = [v for v, e in zip(column, existing) if e]
+            added[field] = [v for v, e in zip(column, existing) if not e]
+
+        super().upsert(vectors, ids, attributes=added, **kwargs)
+        if any(existing):
+            self.attributes.update(rows[rows >= 0], updated)
+
+    def build(
+        self,
+        vectors: numpy.ndarray,
+        attributes: dict[str, list] | None = None,
+        **kwargs,
+    ) -> None:
+        self.attributes.add(len(vectors), attributes)
+        super().build(vectors, **kwargs)
+
+    def compact(self) -> numpy.ndarray:
+        keep = None if self.deleted is None else ~self.deleted[: self.ntotal]
+        remap = super().compact()
+        if keep is not None:
+            self.attributes.compact(keep)
+        return remap
+
+    def get_state(self) -> tuple[dict, dict[str, numpy.ndarray]]:
+        meta, arrays = super().get_state()
+        attributes_meta, attributes_arrays = self.attributes.get_state()
+        meta["attributes"] = attributes_meta
+        meta["planner"] = asdict(self.planner)
+        arrays.update({f"attributes.{k}": v for k, v in attributes_arrays.items()})
+        return meta, arrays
+
+    def set_state(self, meta: dict, arrays: dict[str, numpy.ndarray]) -> None:
+        super().set_state(meta, arrays)
+
+        self.planner = PlannerConfig(**meta["planner"])
+        self.attributes = AttributeIndex()
+        self.attributes.set_state(
+            meta["attributes"],
+            {k[11:]: v for k, v in arrays.items() if k.startswith("attributes.")},
+        )
+
+    def allow_list(
+        self, valid: numpy.ndarray | list[int] | None
+    ) -> numpy.ndarray | None:
+        """
+        Normalizes an allow-list into a bool bitmap over the stored vectors.
+        `valid` can be a bool bitmap, a bitmap packed with `numpy.packbits`
+        (any uint8 array), or a list of ids. Vectors past the end of a bitmap
+        are not allowed.
+        """
+        if valid is None:
+            return None
+
+        valid = numpy.asarray(valid)
+        if valid.dtype == numpy.uint8:
+            valid = numpy.unpackbits(valid, count=min(len(valid) * 8, self.ntotal))
+            valid = valid.view(bool)
+
+        if valid.dtype == bool:
+            if len(valid) >= self.ntotal:
+                return valid[: self.ntotal]
+            bitmap = numpy.zeros(self.ntotal, dtype=bool)
+            bitmap[: len(valid)] = valid
+            return bitmap
+
+        rows = self._rows(valid) if self.idmap is None else self.idmap.lookup(valid)
+        bitmap = numpy.zeros(self.ntotal, dtype=bool)
+        bitmap[rows[(rows >= 0) & (rows < self.ntotal)]] = True
+        return bitmap
+
+    def plan(self, valid: numpy.ndarray | None, k: int) -> dict:
+        """
+        Picks how to run a search for `k` neighbors with the bitmap `valid`
+        (see `PlannerConfig`). Returns the plan as a dict with its name, the
+        filter's selectivity, the number of allowed vectors, and the layer 0
+        `ef` for traversals.
+        """
+        ef = self.ef_for(k)
+        n_live = self.ntotal - self.n_deleted
+
+        if valid is None:
+            return {"plan": "hnsw", "selectivity": 1.0, "n_allowed": n_live, "ef": ef}
+
+        if self.deleted is not None:
+            valid = valid & ~self.deleted[: self.ntotal]
+        n_allowed = int(numpy.count_nonzero(valid))
+        selectivity = n_allowed / max(n_live, 1)
+        planner = self.planner
+
+        if (
+            n_allowed <= planner.brute_force_max
+            or selectivity < planner.brute_force_selectivity
+        ):
+            name, ef = "brute_force", None
+        else:
+            name = (
+                "post_filter"
+                if selectivity >= planner.post_filter_selectivity
+                else "filtered"
+            )
+            ef = min(max(ef, math.ceil(ef / selectivity)), planner.max_ef)
+
+        return {
+            "plan": name,
+            "selectivity": selectivity,
+            "n_allowed": n_allowed,
+            "ef": ef,
+        }
+
     def search(
-        self, q: numpy.ndarray, k: int, valid: list[int] | None = None
+        self,
+        q: numpy.ndarray,
+        k: int,
+        valid: numpy.ndarray | list[int] | None = None,
+        n_workers: int = 1,
+        executor: str = "thread",
+        return_plan: bool = False,
+        return_stats: bool = False,
+    ) -> tuple:
+        """
+        Searches for the `k` nearest neighbors of each query among the vectors
+        allowed by `valid` (see `allow_list`); every vector if it's None. The
+        strategy is chosen by `plan`. With `return_stats`, the `SearchStats`
+        of every query are returned next, and with `return_plan`, the plan
+        last: (D, I[, stats][, plan]).
+        """
+        valid = self.allow_list(valid)
+        plan = self.plan(valid, k)
+
+        if plan["plan"] == "brute_force":
+            start = perf_counter()
+            D, I = self._search_brute_force(q, k, valid)
+            stats = None
+            if return_stats or self.monitor is not None:
+                elapsed = (perf_counter() - start) / max(len(D), 1)
+                n_allowed = plan["n_allowed"]
+                stats = [SearchStats(n_allowed, n_allowed, time=elapsed) for _ in D]
+                self._record_stats(stats)
+            result = (D, I, stats) if return_stats else (D, I)
+        else:
+            result = self._search_batch(
+                q,
+                k,
+                n_workers=n_workers,
+                executor=executor,
+                return_stats=return_stats,
+                valid=valid,
+                ef=plan["ef"],
+                post_filter=plan["plan"] == "post_filter",
+            )
+
+        return (*result, plan) if return_plan else result
+
+    def _search_brute_force(
+        self, q: numpy.ndarray, k: int, valid: numpy.ndarray
     ) -> tuple[numpy.ndarray, numpy.ndarray]:
-        ep = self.ep
-        for lc in range(self.L, 0, -1):
-            ep = self.layers[lc].search(q, ep, 1)[1][0]
+        """
+        Exact search over the allowed vectors, a block of queries at a time.
+        """
+        Q = self.engine.prepare(_as_batch(q))
+        D = numpy.full((len(Q), k), numpy.inf, dtype=numpy.float32)
+        I = numpy.full((len(Q), k), -1, dtype=numpy.int64)
 
-        return self.layers[0].search(q, ep, k, valid=valid)
+        if self.deleted is not None:
+            valid = valid & ~self.deleted[: self.ntotal]
+        rows = numpy.flatnonzero(valid)
+        if len(rows) == 0:
+            return D, I
 
+        X = self.vectors[rows]
+        k_found = min(k, len(rows))
+        block = max(1, 2**22 // len(rows))
 
-class FilterableHNSWLayer(HNSWLayer):
-    """
-    The allow-list works by ensuring that only valid neighbors are added to the
-    candidate neighbor list (W).
-    """
-    def search(
-        self, q: numpy.ndarray, ep: int, ef: int, valid: list[int] | None = None
+        for a in range(0, len(Q), block):
+            D_b = self.engine.distances(Q[a : a + block], X, rows)
+            top = _topk(D_b, k_found)
+            D_top = numpy.take_along_axis(D_b, top, axis=1)
+            order = numpy.argsort(D_top, axis=1, kind="stable")
+
+            D[a : a + block, :k_found] = self.engine.finalize(
+                numpy.take_along_axis(D_top, order, axis=1)
+            )
+            I[a : a + block, :k_found] = rows[numpy.take_along_axis(top, order, axis=1)]
+
+        return D, self._external(I)
+
+    def search_one(
+        self,
+        q: numpy.ndarray,
+        k: int,
+        valid: numpy.ndarray | None = None,
+        ef: int | None = None,
+        post_filter: bool = False,
+        stats: bool = False,
     ) -> tuple[list[float], list[int]]:
-        ep_dist = self.distance_to_node(q, ep)
-        valid_set = set(valid)
+        """
+        Traverses the graph for the `k` nearest allowed neighbors of `q`, with
+        `ef` candidates at layer 0. With `post_filter`, the traversal ignores
+        `valid` and its results are filtered afterwards, falling back to a
+        filtered traversal if fewer than `k` survive. With `stats`, also
+        returns the `SearchStats` of the query.
+        """
+        start = perf_counter()
+        record = SearchStats() if stats else None
+        if self.is_empty:
+            return ([], [], record) if stats else ([], [])
+
+        q = self.engine.prepare(q)
+        quantized = self.quantizer is not None
+        ep = self.ep
+        ef = ef or self.ef_for(k)
+        for lc in range(self.L, 0, -1):
+            W = self.layers[lc].search(q, ep, 1, quantized=quantized, stats=record)
+            ep = W[1][0]
 
-        v = {ep}
-        C = [(ep_dist, ep)]
-        # this addresses the issue of not considering the ep if it's not a valid node:
-        W = [] if (valid and ep not in valid_set) else [(ep_dist, ep)]
+        W = None
+        if post_filter and valid is not None:
+            D, I = self.layers[0].search(
+                q, ep, ef, quantized=quantized, skip_deleted=True, stats=record
+            )
+            W = [(d, e) for d, e in zip(D, I) if valid[e]]
+            if len(W) < k:
+                W = None
 
-        while len(C) > 0:
-            d_c, c = heappop(C)
-            if len(W) > 0:
-                d_f, f = nlargest(1, W, key=lambda x: x[0])[0]
+        if W is None:
+            D, I = self.layers[0].search(
+                q,
+                ep,
+                ef,
+                valid=valid,
+                quantized=quantized,
+                skip_deleted=True,
+                stats=record,
+                k=k,
+            )
+            W = list(zip(D, I))
 
-                if d_c > d_f:
-                    break
+        D, I = self._results(q, W, k, stats=record)
+        if record is None:
+            return D, I
 
-            for e in self.G[c]:
-                if e in v:
-                    continue
+        record.time = perf_counter() - start
+        return D, I, record
 
-                v.add(e)
-                if len(W) > 0:
-                    d_f, f = nlargest(1, W, key=lambda x: x[0])[0]
-                d_e = self.distance_to_node(q, e)
 
-                if len(W) == 0 or d_e < d_f or len(W) < ef:
-                    heappush(C, (d_e, e))
-                    if valid is None or e in valid_set:
-                        heappush(W, (d_e, e))
-                        if len(W) > ef:
-                            W = nsmallest(ef, W, key=lambda x: x[0])
+class FilterableHNSWLayer(HNSWLayer):
+    """
+    The allow-list works by ensuring that only valid neighbors are added to the
+    candidate neighbor list (W). Every node is still traversed, so the search
+    can reach valid nodes through invalid ones.
+    """
 
-        return tuple(zip(*W))
+    def search(
+        self,
+        q: numpy.ndarray,
+        ep: int,
+        ef: int,
+        valid: numpy.ndarray | None = None,
+        quantized: bool = False,
+        skip_deleted: bool = False,
+        stats: SearchStats | None = None,
+        k: int | None = None,
+    ) -> tuple[list[float], list[int]]:
+        """
+        `valid` is a bool bitmap over the stored vectors (None allows all).
+        """
+        return search_layer(self, q, ep, ef, quantized, skip_deleted, valid, stats, k)
 
 
 if __name__ == "__main__":
@@ -81,4 +377,4 @@ if __name__ == "__main__":
     index.add(vectors)
 
     for ix, v in enumerate(vectors):
-        print(ix, index.search(v, 1, valid=[x for x in range(10) if x != ix]))
+        print(ix, index.search(v, 1, valid=numpy.arange(10) != ix))
@@ -0,0 +1,95 @@
+"""
+Exact ground truth for arbitrary .fvecs/.bvecs datasets, in bounded memory:
+
+    python -m tinyhnsw.groundtruth base.fvecs query.fvecs groundtruth.ivecs --k 100
+
+The base file is memory-mapped and converted to float32 one chunk at a time;
+each chunk is searched with the blocked, multi-threaded exact search that
+`FullNNIndex` uses, and a running top-k is kept per query.
+"""
+
+from __future__ import annotations
+from tinyhnsw.distance import ENGINES
+from tinyhnsw.knn import blocked_search, _topk
+from tinyhnsw.utils import mmap_vecs, write_vecs
+from tqdm import tqdm
+
+import argparse
+import numpy
+
+
+def compute_ground_truth(
+    base: numpy.ndarray,
+    queries: numpy.ndarray,
+    k: int,
+    distance: str = "l2",
+    chunk_size: int = 1_000_000,
+    tile_size: int = 16384,
+    query_block: int = 1024,
+    n_workers: int = 1,
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Exact top-k neighbors in `base` (e.g. a memory-mapped file) for every row
+    of `queries`. At most `chunk_size` base vectors are held in memory as
+    float32 at a time. Returns sorted (n, k) arrays of true distances and ids.
+    """
+    query_engine = ENGINES[distance]()
+    Q = query_engine.prepare(queries)
+    k = min(k, len(base))
+
+    D_best = numpy.empty((len(Q), 0), dtype=numpy.float32)
+    I_best = numpy.empty((len(Q), 0), dtype=numpy.int64)
+
+    for a in tqdm(range(0, len(base), chunk_size)):
+        engine = ENGINES[distance]()
+        X = engine.add(base[a : a + chunk_size])
+
+        D_c, I_c = blocked_search(
+            engine,
+            Q,
+            X,
+            k,
+            tile_size=tile_size,
+            query_block=query_block,
+            n_workers=n_workers,
+        )
+
+        D_all = numpy.concatenate([D_best, D_c], axis=1)
+        I_all = numpy.concatenate([I_best, I_c + a], axis=1)
+        top = _topk(D_all, min(k, D_all.shape[1]))
+        D_best = numpy.take_along_axis(D_all, top, axis=1)
+        I_best = numpy.take_along_axis(I_all, top, axis=1)
+
+    order = numpy.argsort(D_best, axis=1, kind="stable")
+    D_best = numpy.take_along_axis(D_best, order, axis=1)
+    I_best = numpy.take_along_axis(I_best, order, axis=1)
+
+    return query_engine.finalize(D_best), I_best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base", help="base vectors (.fvecs or .bvecs)")
+    parser.add_argument("queries", help="query vectors (.fvecs or .bvecs)")
+    parser.add_argument("output", help="where to write the neighbor ids (.ivecs)")
+    parser.add_argument("--k", type=int, default=100)
+    parser.add_argument("--distance", default="l2", choices=sorted(ENGINES))
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser.add_argument("--tile-size", type=int, default=16384)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    _, I = compute_ground_truth(
+        mmap_vecs(args.base),
+        mmap_vecs(args.queries),
+        args.k,
+        distance=args.distance,
+        chunk_size=args.chunk_size,
+        tile_size=args.tile_size,
+        n_workers=args.workers,
+    )
+    write_vecs(args.output, I.astype(numpy.int32))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,30 @@
 from __future__ import annotations
-from tinyhnsw.index import Index
+from tinyhnsw.distance import L2Distance
+from tinyhnsw.index import (
+    Index,
+    _as_batch,
+    _fill_results,
+    _init_worker,
+    _method_worker,
+)
+from tinyhnsw.knn import FullNNIndex
+from tinyhnsw.quantization import QUANTIZERS
+from tinyhnsw.stats import SearchStats
+from tinyhnsw.storage import VectorStorage
 from tinyhnsw.utils import load_sift, evaluate
-from dataclasses import dataclass
-from heapq import nlargest, nsmallest, heappop, heappush, heapify
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, asdict, astuple
+from functools import partial
+from itertools import repeat
+from heapq import nsmallest, heappop, heappush, heapify, heapreplace
+from time import perf_counter
 from tqdm import tqdm
 
 import numpy
 import math
 import random
-import networkx
+import multiprocessing
+import threading
 
 
 random.seed(1337)
@@ -27,6 +43,17 @@ class HNSWConfig:
     extend_candidates: bool = False
     keep_pruned_connections: bool = True
 
+    # "int8" or "binary" codes for query-time traversal; see quantization.py
+    quantization: str | None = None
+    # the quantizer is refit on every batch until the index holds this many
+    quantization_train_size: int = 1024
+
+    # adaptive early termination at layer 0; see search_layer_adaptive
+    adaptive: bool = False
+    adaptive_patience: int = 16
+    adaptive_ratio: float = 0.0
+    adaptive_max_ef: int = 512
+
 
 DEFAULT_CONFIG = HNSWConfig(
     M=16,
@@ -45,13 +72,72 @@ class HNSWIndex(Index):
         super().__init__(d, distance)
 
         self.config = config
-        self.vectors = None
+        self.quantizer = None
+        if config.quantization is not None:
+            self.quantizer = QUANTIZERS[config.quantization](d, self.engine)
 
         self.ep = 0
         self.L = 0
         self.ix = 0
         self.layers = [self.layer_factory(0, self.ep)]
 
+        # tombstones: None until something is removed
+        self.deleted = None
+        self.pending = set()
+
+        # k -> layer 0 ef, filled in by `tune`
+        self.ef_table: dict[int, int] = {}
+
+    def get_state(self) -> tuple[dict, dict[str, numpy.ndarray]]:
+        meta, arrays = super().get_state()
+        meta.update(
+            {
+                "config": asdict(self.config),
+                "ep": self.ep,
+                "L": self.L,
+                "ix": self.ix,
+                "layers": len(self.layers),
+                "ef_table": sorted(self.ef_table.items()),
+            }
+        )
+        for lc, layer in enumerate(self.layers):
+            arrays.update({f"layers.{lc}.{k}": v for k, v in layer.get_state().items()})
+        if self.quantizer is not None:
+            arrays.update(
+                {f"quantizer.{k}": v for k, v in self.quantizer.get_state().items()}
+            )
+        if self.deleted is not None:
+            meta["pending"] = sorted(self.pending)
+            arrays["deleted"] = self.deleted
+        return meta, arrays
+
+    def set_state(self, meta: dict, arrays: dict[str, numpy.ndarray]) -> None:
+        super().set_state(meta, arrays)
+
+        self.config = HNSWConfig(**meta["config"])
+        self.quantizer = None
+        if self.config.quantization is not None:
+            self.quantizer = QUANTIZERS[self.config.quantization](self.d, self.engine)
+            self.quantizer.set_state(
+                {k[10:]: v for k, v in arrays.items() if k.startswith("quantizer.")}
+            )
+
+        self.ep = meta["ep"]
+        self.L = meta["L"]
+        self.ix = meta["ix"]
+        self.deleted = arrays.get("deleted")
+        self.pending = set(meta.get("pending", []))
+        self.ef_table = {k: ef for k, ef in meta.get("ef_table", [])}
+        self.layers = []
+
+        for lc in range(meta["layers"]):
+            prefix = f"layers.{lc}."
+            layer = self.layer_factory(lc, None)
+            layer.set_state(
+                {k[len(prefix) :]: v for k, v in arrays.items() if k.startswith(prefix)}
+            )
+            self.layers.append(layer)
+
     def layer_factory(self, lc: int, ep: int | None = None) -> HNSWLayer:
         ep = ep or self.ep
         return HNSWLayer(self, lc, ep)
@@ -59,11 +145,61 @@ class HNSWIndex(Index):
     def assign_level(self) -> int:
         return math.floor(-math.log(random.random()) * self.config.m_L)
 
-    def add(self, vectors: numpy.ndarray) -> None:
+    def reserve(self, n: int) -> None:
+        super().reserve(n)
+        self.layers[0]._reserve(n, n)
+
+    def add(
+        self,
+        vectors: numpy.ndarray,
+        n_workers: int = 1,
+        executor: str = "process",
+        batch_size: int | None = None,
+    ) -> None:
+        """
+        Adds `vectors` to the index, inserting them into the graph one at a time
+        or, with `n_workers > 1`, in parallel batches (see `_insert_parallel`).
+        """
+        assert executor in ["thread", "process"]
+
+        start = self.ntotal
         super().add(vectors)
+        self._encode(start)
+        self._grow_tombstones()
 
-        for vector in tqdm(vectors):
-            self.insert_into_graph(vector)
+        if self.deleted is not None and self.deleted[:start].all():
+            # nothing live to link to, even if it hasn't been repaired yet
+            self._reset_graph()
+        if len(self.layers[0]) == 0:
+            # everything was removed: start over from the first new node, as a
+            # new index does
+            self.ep = start
+            self.layers[0].add_node(start)
+
+        if n_workers <= 1:
+            for vector in tqdm(self.vectors[start:]):
+                self.insert_into_graph(vector)
+        else:
+            batch_size = batch_size or 64 * n_workers
+            self._insert_parallel(start, n_workers, executor, batch_size)
+
+        self._invalidate()
+
+    def _encode(self, start: int) -> None:
+        """
+        Adds the codes for the vectors from `start` on. While the index held
+        fewer than `config.quantization_train_size` vectors before this batch,
+        the quantizer is instead retrained on all of them and every code is
+        re-encoded, so that streaming ingestion doesn't fix its ranges to the
+        first handful of vectors.
+        """
+        if self.quantizer is None:
+            return
+
+        if start < self.config.quantization_train_size:
+            self.quantizer.fit(self.vectors)
+        else:
+            self.quantizer.add(self.vectors[start:])
 
     def insert_into_graph(self, q: numpy.ndarray):
         l = self.assign_level()
@@ -86,103 +222,822 @@ class HNSWIndex(Index):
 
         self.ix += 1
 
-    def distance(self, q: numpy.ndarray, v: numpy.ndarray) -> numpy.ndarray:
-        if len(q.shape) == 1:
-            q = numpy.expand_dims(q, axis=0)
+    def _insert_parallel(
+        self, start: int, n_workers: int, executor: str, batch_size: int
+    ) -> None:
+        """
+        Batched search-then-link construction. For each batch, the candidate
+        neighbors of every new node are searched for concurrently against the
+        graph as it stood before the batch (the graph is only read, so no locks
+        are needed). The nodes are then linked one by one, in order, exactly as
+        `insert_into_graph` would, with the earlier nodes of the same batch added
+        as exact candidates, since the searches could not see them.
+
+        The search is pure Python, so threads only help on a free-threaded
+        build. The "process" executor forks a pool per batch instead: workers
+        inherit a copy-on-write snapshot of the graph without any pickling.
+        """
+        # the first few nodes go in sequentially, so that batches are searched
+        # against a graph rather than a handful of nodes
+        bootstrap = min(self.ntotal, max(start, batch_size))
+        for vector in self.vectors[start:bootstrap]:
+            self.insert_into_graph(vector)
+
+        if "fork" not in multiprocessing.get_all_start_methods():
+            executor = "thread"
+
+        for b in tqdm(range(bootstrap, self.ntotal, batch_size)):
+            nodes = list(range(b, min(b + batch_size, self.ntotal)))
+            levels = [self.assign_level() for _ in nodes]
+            chunksize = max(1, len(nodes) // (4 * n_workers))
+
+            if executor == "thread":
+                with ThreadPoolExecutor(n_workers) as pool:
+                    candidates = list(pool.map(self._search_candidates, nodes, levels))
+            else:
+                with ProcessPoolExecutor(
+                    n_workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_init_worker,
+                    initargs=(self,),
+                ) as pool:
+                    f = partial(_method_worker, "_search_candidates")
+                    candidates = list(pool.map(f, nodes, levels, chunksize=chunksize))
+
+            self._link_batch(nodes, levels, candidates)
+
+    def _search_candidates(
+        self, node: int, l: int
+    ) -> dict[int, tuple[list[float], list[int]]]:
+        """
+        The read-only half of `insert_into_graph`: the `ef_construction`
+        candidates for `node` in each of its layers that already exist.
+        """
+        q = self.vectors[node]
+        ep = self.ep
+
+        for layer in range(self.L, l, -1):
+            _, W = self.layers[layer].search(q, ep, ef=1)
+            ep = W[0]
+
+        candidates = {}
+        for layer in range(min(self.L, l), -1, -1):
+            D, W = self.layers[layer].search(
+                q, ep, self.config.ef_construction, skip_deleted=True
+            )
+            candidates[layer] = (D, W)
+
+        return candidates
+
+    def _link_batch(
+        self,
+        nodes: list[int],
+        levels: list[int],
+        candidates: list[dict[int, tuple[list[float], list[int]]]],
+    ) -> None:
+        X = self.vectors[nodes]
+        D_batch = self.engine.distances(X, X, nodes).tolist()
+
+        for i, (node, l) in enumerate(zip(nodes, levels)):
+            for layer in range(min(self.L, l), -1, -1):
+                D, W = candidates[i].get(layer, ([], []))
+                earlier = [j for j in range(i) if levels[j] >= layer]
+                D = D + [D_batch[i][j] for j in earlier]
+                W = W + [nodes[j] for j in earlier]
+                self.layers[layer].link(node, D, W)
+
+            if l > self.L:
+                for l_new in range(self.L + 1, l + 1):
+                    self.layers.append(self.layer_factory(l_new, node))
+                self.L = l
+                self.ep = node
+
+            self.ix += 1
+
+    def build(self, vectors: numpy.ndarray, block_size: int = 256) -> None:
+        """
+        Bulk-loads an empty index from the whole dataset at once. Instead of a
+        greedy search per vector, each layer is built from an exact kNN graph
+        over the nodes in that layer, computed with blocked matrix products,
+        and then pruned with the configured neighbor selection function (the
+        same one incremental insertion uses). Levels come from `assign_level`.
+        """
+        assert self.ntotal == 0, "build() only bulk-loads an empty index"
+
+        super().add(vectors)
+        self._encode(0)
+
+        levels = numpy.array([self.assign_level() for _ in range(self.ntotal)])
+        self.L = int(levels.max())
+        self.ep = int(levels.argmax())
+        self.ix = self.ntotal
+        self.layers = []
+
+        for lc in tqdm(range(self.L + 1)):
+            nodes = numpy.flatnonzero(levels >= lc)
+            layer = self.layer_factory(lc, self.ep)
+            layer._reserve(len(nodes), self.ntotal)
+            for node in nodes.tolist():
+                layer.add_node(node)
+
+            k = min(self.config.ef_construction, len(nodes) - 1)
+            if k > 0:
+                self._link_knn_graph(layer, nodes, k, block_size)
+
+            self.layers.append(layer)
+
+        self._invalidate()
+
+    def _link_knn_graph(
+        self, layer: HNSWLayer, nodes: numpy.ndarray, k: int, block_size: int
+    ) -> None:
+        X = self.vectors[nodes]
+        neighbors = []
+
+        for b in range(0, len(nodes), block_size):
+            block = nodes[b : b + block_size]
+            D = self.engine.distances(X[b : b + block_size], X, nodes)
+            D[numpy.arange(len(block)), numpy.arange(b, b + len(block))] = numpy.inf
+
+            I = numpy.argpartition(D, k - 1, axis=1)[:, :k]
+            D = numpy.take_along_axis(D, I, axis=1)
+
+            for node, D_n, I_n in zip(block.tolist(), D.tolist(), I.tolist()):
+                selected = layer.f_neighbors(D_n, nodes[I_n].tolist(), self.config.M)
+                layer.set_neighbors(node, *zip(*selected))
+                neighbors.append((node, selected))
+
+        for node, selected in neighbors:
+            for d, e in selected:
+                # kNN graphs are largely symmetric, don't duplicate those edges
+                if node not in layer.neighborhood(e)[1]:
+                    layer.add_edge(e, node, d)
+
+    @property
+    def is_empty(self) -> bool:
+        """
+        Whether the graph has no node to start a search from. (A new index
+        seeds layer 0 with its first node before that node is added.)
+        """
+        return self.ntotal == 0 or len(self.layers[0]) == 0
+
+    @property
+    def n_deleted(self) -> int:
+        return 0 if self.deleted is None else int(self.deleted[: self.ntotal].sum())
+
+    def remove(self, ids: list[int] | numpy.ndarray) -> None:
+        """
+        Marks `ids` as deleted. Tombstoned nodes are still traversed by searches
+        (so the graph stays navigable) but are never returned. Call `repair` to
+        unlink them from the graph and `compact` to reclaim their storage.
+        """
+        ids = self._rows(ids)
+        assert ((ids >= 0) & (ids < self.ntotal)).all()
+        if self.idmap is not None:
+            self.idmap.discard(self.idmap.ids.view()[ids])
+
+        if self.deleted is None:
+            self.deleted = numpy.zeros(self.ntotal, dtype=bool)
+        self._grow_tombstones()
+
+        self.deleted[ids] = True
+        self.pending.update(ids.tolist())
+        self._invalidate()
+
+    def _grow_tombstones(self) -> None:
+        if self.deleted is not None and len(self.deleted) < self.ntotal:
+            self.deleted = _grow(
+                self.deleted, max(self.ntotal, 2 * len(self.deleted)), False
+            )
+
+    def repair(self, max_nodes: int | None = None) -> int:
+        """
+        Unlinks up to `max_nodes` pending tombstones (all of them by default)
+        from every layer: each live node that pointed at a deleted node is
+        reconnected, choosing among its remaining neighbors and the deleted
+        node's live neighbors. Re-elects the entry point if it was deleted.
+
+        Repairing in small batches bounds the pause, so it can be scheduled in
+        the background between writes (but not concurrently with `add`).
+        Returns the number of tombstones still pending.
+        """
+        if len(self.pending) == 0:
+            return 0
+
+        batch = sorted(self.pending)[:max_nodes]
+
+        for layer in self.layers:
+            layer.repair(numpy.array([n for n in batch if n in layer]))
+
+        self.pending.difference_update(batch)
+        if self.deleted[self.ep]:
+            self._elect_ep()
+
+        self._invalidate()
+        return len(self.pending)
+
+    def _elect_ep(self) -> None:
+        """
+        Picks a live node from the highest layer that still has one, dropping
+        the layers above it. If every node is deleted, the graph is reset to
+        a single empty layer 0, and the next `add` starts it over.
+        """
+        for lc in range(self.L, -1, -1):
+            nodes = self.layers[lc].nodes()
+            live = nodes[~self.deleted[nodes]]
+            if len(live) > 0:
+                self.ep = int(live[0])
+                self.L = lc
+                self.layers = self.layers[: lc + 1]
+                return
+
+        self._reset_graph()
+
+    def _reset_graph(self) -> None:
+        """
+        Drops every node from the graph, leaving a single empty layer 0, once
+        they are all deleted. The tombstones stay (until `compact`), but there
+        is nothing left to unlink them from.
+        """
+        self.ep = 0
+        self.L = 0
+        self.layers = [type(self.layers[0])(self, 0)]
+        self.pending.clear()
+
+    def compact(self) -> numpy.ndarray:
+        """
+        Physically removes deleted vectors and graph nodes (repairing first),
+        renumbering the remaining nodes contiguously. Returns an array that
+        maps every old id to its new id, or -1 for removed ones.
+        """
+        if self.deleted is None:
+            return numpy.arange(self.ntotal)
+
+        self.repair()
+
+        keep = ~self.deleted[: self.ntotal]
+        remap = numpy.full(self.ntotal, -1, dtype=numpy.int64)
+        remap[keep] = numpy.arange(keep.sum())
+
+        self.storage = VectorStorage.from_array(self.storage.view()[keep])
+        self.engine.compact(keep)
+        if self.quantizer is not None:
+            self.quantizer.compact(keep)
+        if self.idmap is not None:
+            self.idmap.compact(keep)
+
+        for layer in self.layers:
+            layer.compact(remap)
+
+        self.ntotal = len(self.storage)
+        self.ix = self.ntotal
+        self.ep = int(remap[self.ep]) if self.ntotal > 0 else 0
+        self.deleted = None
+
+        self._invalidate()
+        return remap
+
+    def _update(self, rows: numpy.ndarray, vectors: numpy.ndarray) -> None:
+        """
+        Overwrites the vectors at `rows` and re-links only those nodes, in each
+        layer they belong to (see `HNSWLayer.relink`). Removed rows (which an
+        index without external ids still addresses by position) are revived.
+        """
+        super()._update(rows, vectors)
+        if self.quantizer is not None:
+            self.quantizer.update(rows, self.vectors[rows])
+
+        if self.deleted is not None:
+            if self.deleted[: self.ntotal].all():
+                self._reset_graph()
+            revived = rows[self.deleted[rows]]
+            self.deleted[revived] = False
+            self.pending.difference_update(revived.tolist())
 
-        if len(v.shape) == 1:
-            v = numpy.expand_dims(v, axis=0)
+        for node in rows.tolist():
+            q = self.vectors[node]
+            if len(self.layers[0]) == 0:
+                # the graph was reset after everything was removed
+                self.ep = node
+                self.layers[0].add_node(node)
+                continue
 
-        return self.f_distance(q, v)
+            top = max(
+                (lc for lc in range(self.L + 1) if node in self.layers[lc]), default=0
+            )
 
-    def search(self, q: numpy.ndarray, k: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+            ep = self.ep
+            for lc in range(self.L, top, -1):
+                ep = self.layers[lc].search(q, ep, 1)[1][0]
+
+            for lc in range(top, -1, -1):
+                if node in self.layers[lc]:
+                    ep = self.layers[lc].relink(q, node, ep)
+                else:
+                    self.layers[lc].insert(q, node, ep)
+
+        self._invalidate()
+
+    def search(
+        self,
+        q: numpy.ndarray,
+        k: int,
+        n_workers: int = 1,
+        executor: str = "thread",
+        return_stats: bool = False,
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        See `Index.search`. With `return_stats`, a list with the `SearchStats`
+        of every query is returned as a third value.
+        """
+        return self._search_batch(
+            q, k, n_workers=n_workers, executor=executor, return_stats=return_stats
+        )
+
+    def search_one(
+        self, q: numpy.ndarray, k: int, ef: int | None = None, stats: bool = False
+    ) -> tuple[list[float], list[int]]:
+        """
+        See `Index.search_one`. `ef` overrides the layer 0 `ef` (see `ef_for`).
+        With `stats`, also returns the `SearchStats` of the query as a third
+        value.
+        """
+        start = perf_counter()
+        record = SearchStats() if stats else None
+        if self.is_empty:
+            return ([], [], record) if stats else ([], [])
+
+        q = self.engine.prepare(q)
+        quantized = self.quantizer is not None
         ep = self.ep
-        ef = max(k, self.config.ef_search)
+        ef = ef or self.ef_for(k)
         for lc in range(self.L, 0, -1):
-            ep = self.layers[lc].search(q, ep, 1)[1][0]
+            W = self.layers[lc].search(q, ep, 1, quantized=quantized, stats=record)
+            ep = W[1][0]
+
+        W = self.layers[0].search(
+            q, ep, ef, quantized=quantized, skip_deleted=True, stats=record, k=k
+        )
+        D, I = self._results(q, list(zip(*W)), k, stats=record)
+
+        if record is None:
+            return D, I
+
+        record.time = perf_counter() - start
+        return D, I, record
+
+    def _cache_token(self, k: int) -> tuple:
+        return self.ef_for(k), astuple(self.config)
+
+    def ef_for(self, k: int) -> int:
+        """
+        The layer 0 `ef` of a search for `k` neighbors: the one `tune` found for
+        the smallest tuned k' >= k, else `config.ef_search`, and at least `k`.
+        """
+        tuned = [t for t in self.ef_table if t >= k]
+        ef = self.ef_table[min(tuned)] if tuned else self.config.ef_search
+        return max(k, ef)
+
+    def tune(
+        self,
+        queries: numpy.ndarray,
+        target_recall: float = 0.95,
+        k: int | list[int] = 10,
+        sample: int | None = 1000,
+        max_ef: int = 4096,
+        n_workers: int = 1,
+    ) -> dict[int, int]:
+        """
+        Finds the smallest `ef` whose Recall@k on `queries` (a random sample of
+        at most `sample` of them) reaches `target_recall`, for each `k`, and
+        stores it in `ef_table` for `search` to use (see `ef_for`). The exact
+        neighbors come from a `FullNNIndex` over the live vectors. Since recall
+        grows with ef, ef is doubled until the target is met and then binary
+        searched; if even `max_ef` misses it, `max_ef` is stored. Returns the
+        table.
+
+        The trial searches pass their `ef` to `search_one` directly, so they
+        bypass the cache and the monitor, and concurrent searches keep using
+        the current table until the new one is swapped in at the end.
+        """
+        queries = _as_batch(queries)
+        if sample is not None and len(queries) > sample:
+            rng = numpy.random.default_rng(0)
+            queries = queries[rng.choice(len(queries), sample, replace=False)]
+
+        rows = numpy.arange(self.ntotal)
+        if self.deleted is not None:
+            rows = rows[~self.deleted[: self.ntotal]]
+
+        ks = sorted({k} if isinstance(k, int) else set(k))
+        exact = FullNNIndex(self.d, self.metric)
+        exact.add(self.vectors[rows])
+        _, I = exact.search(queries, ks[-1])
+        gold = self._external(numpy.where(I >= 0, rows[numpy.maximum(I, 0)], -1))
+
+        table = dict(self.ef_table)
+
+        def recall(k: int, ef: int) -> float:
+            results = self._map_queries("search_one", queries, n_workers, k=k, ef=ef)
+            D = numpy.full((len(queries), k), numpy.inf, dtype=numpy.float32)
+            I = numpy.full((len(queries), k), -1, dtype=numpy.int64)
+            _fill_results(D, I, results)
+            return evaluate(gold[:, :k], self._external(I), k)
+
+        for k in ks:
+            # recall(lo) is known to miss the target, recall(hi) to meet it
+            lo, hi = k - 1, k
+            while hi < max_ef and recall(k, hi) < target_recall:
+                lo, hi = hi, min(2 * hi, max_ef)
+
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if recall(k, mid) >= target_recall:
+                    hi = mid
+                else:
+                    lo = mid
+
+            table[k] = hi
+
+        self.ef_table = table
+        return table
+
+    def range_search(
+        self,
+        q: numpy.ndarray,
+        radius: float,
+        n_workers: int = 1,
+        executor: str = "thread",
+    ) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        return self._range_search_batch(
+            q, radius, n_workers=n_workers, executor=executor
+        )
+
+    def range_search_one(
+        self, q: numpy.ndarray, radius: float
+    ) -> tuple[list[float], list[int]]:
+        """
+        All the (distance, id) pairs within `radius` of a single query that the
+        layer 0 traversal reaches (see `HNSWLayer.range_search`), sorted.
+        """
+        if self.is_empty:
+            return [], []
+
+        q = self.engine.prepare(q)
+        quantized = self.quantizer is not None
+        ep = self.ep
+        for lc in range(self.L, 0, -1):
+            ep = self.layers[lc].search(q, ep, 1, quantized=quantized)[1][0]
+
+        R = self.layers[0].range_search(
+            q, ep, self.engine.threshold(radius), self.config.ef_search
+        )
+        R.sort()
+        D = self.engine.finalize(numpy.array([d for d, _ in R], dtype=numpy.float32))
+        return D.tolist(), [e for _, e in R]
+
+    def _results(
+        self,
+        q: numpy.ndarray,
+        W: list[tuple[float, int]],
+        k: int,
+        stats: SearchStats | None = None,
+    ) -> tuple[list[float], list[int]]:
+        """
+        The `k` best of the layer 0 candidates `W`, as true distances. If the
+        traversal used quantized codes, the candidates are first reranked
+        exactly against the full-precision vectors.
+        """
+        if self.quantizer is not None and len(W) > 0:
+            if stats is not None:
+                stats.distances += len(W)
+            I = [e for _, e in W]
+            D = self.engine.distances(numpy.expand_dims(q, axis=0), self.vectors[I], I)
+            W = list(zip(D[0].tolist(), I))
 
-        W = list(zip(*self.layers[0].search(q, ep, ef)))
         neighbors = nsmallest(k, W, lambda x: x[0])
-        return list(zip(*neighbors))
+        D = self.engine.finalize(numpy.array([d for d, _ in neighbors]))
+        return D.tolist(), [e for _, e in neighbors]
 
 
 class HNSWLayer:
+    """
+    A single layer of the HNSW graph. Rather than a networkx graph, the adjacency
+    is stored as fixed-width arrays: every node in the layer gets a row of `M_max`
+    neighbor ids (padded with -1), a parallel row of float32 edge distances, and
+    a degree counter. `rows` maps a global node id to its row in the layer.
+    """
+
     def __init__(self, index: HNSWIndex, lc: int, ep: int | None = None) -> None:
-        self.G = networkx.Graph()
         self.index = index
         self.config = self.index.config
-
-        if ep is not None:
-            self.G.add_node(ep)
+        self.lc = lc
 
         if lc == 0:
             self.M_max = self.config.M_max0
         else:
             self.M_max = self.config.M_max
 
+        self.size = 0
+        self.ids = numpy.empty(0, dtype=numpy.int32)
+        self.rows = numpy.empty(0, dtype=numpy.int32)
+        self.neighbors = numpy.empty((0, self.M_max), dtype=numpy.int32)
+        self.distances = numpy.empty((0, self.M_max), dtype=numpy.float32)
+        self.degree = numpy.empty(0, dtype=numpy.int32)
+
+        if ep is not None:
+            self.add_node(ep)
+
         if self.config.neighbors == "simple":
             self.f_neighbors = self.select_neighbors
         else:
             self.f_neighbors = self.select_neighbors_heuristic
 
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, node: int) -> bool:
+        return 0 <= node < len(self.rows) and self.rows[node] >= 0
+
+    def nodes(self) -> numpy.ndarray:
+        return self.ids[: self.size]
+
+    def _reserve(self, n_rows: int, n_nodes: int) -> None:
+        """
+        Grow the row and node arrays geometrically, so that inserting nodes one
+        at a time stays amortized O(1).
+        """
+        if n_rows > len(self.ids):
+            capacity = max(n_rows, 2 * len(self.ids), 16)
+            self.ids = _grow(self.ids, capacity, -1)
+            self.degree = _grow(self.degree, capacity, 0)
+            self.neighbors = _grow(self.neighbors, capacity, -1)
+            self.distances = _grow(self.distances, capacity, numpy.inf)
+
+        if n_nodes > len(self.rows):
+            capacity = max(n_nodes, 2 * len(self.rows), 16)
+            self.rows = _grow(self.rows, capacity, -1)
+
+    def add_node(self, node: int) -> None:
+        if node in self:
+            return
+
+        self._reserve(self.size + 1, node + 1)
+        self.ids[self.size] = node
+        self.rows[node] = self.size
+        self.size += 1
+
+    def get_state(self) -> dict[str, numpy.ndarray]:
+        return {
+            "ids": self.ids[: self.size],
+            "rows": self.rows,
+            "neighbors": self.neighbors[: self.size],
+            "distances": self.distances[: self.size],
+            "degree": self.degree[: self.size],
+        }
+
+    def set_state(self, arrays: dict[str, numpy.ndarray]) -> None:
+        self.ids = arrays["ids"]
+        self.rows = arrays["rows"]
+        self.neighbors = arrays["neighbors"]
+        self.distances = arrays["distances"]
+        self.degree = arrays["degree"]
+        self.size = len(self.ids)
+
+    def repair(self, deleted: numpy.ndarray) -> None:
+        """
+        Reconnects the live nodes that have edges into `deleted`, then empties
+        the neighbor lists of the deleted nodes.
+        """
+        if len(deleted) == 0:
+            return
+
+        neighbors = self.neighbors[: self.size]
+        affected = numpy.flatnonzero(numpy.isin(neighbors, deleted).any(axis=1))
+        is_deleted = self.index.deleted
+
+        for node in self.ids[affected].tolist():
+            if is_deleted[node]:
+                continue
+
+            candidates = set()
+            for e in self.neighborhood(node)[1].tolist():
+                if not is_deleted[e]:
+                    candidates.add(e)
+                    continue
+                candidates.update(
+                    n for n in self.neighborhood(e)[1].tolist() if not is_deleted[n]
+                )
+            candidates.discard(node)
+
+            W = list(candidates)
+            if len(W) == 0:
+                self.set_neighbors(node, [], [])
+                continue
+
+            D = self.distance_to_nodes(self.index.vectors[node], W).tolist()
+            self.set_neighbors(node, *zip(*self.f_neighbors(D, W, self.M_max)))
+
+        for node in deleted.tolist():
+            self.set_neighbors(node, [], [])
+
+    def compact(self, remap: numpy.ndarray) -> None:
+        """
+        Drops the nodes that `remap` (old id -> new id, -1 if removed) removes
+        and renumbers the rest.
+        """
+        ids = self.ids[: self.size]
+        keep = remap[ids] >= 0
+
+        neighbors = self.neighbors[: self.size][keep]
+        distances = self.distances[: self.size][keep]
+        degree = self.degree[: self.size][keep]
+        ids = remap[ids[keep]]
+
+        valid = neighbors >= 0
+        neighbors = numpy.where(valid, remap[numpy.maximum(neighbors, 0)], -1)
+        assert (neighbors[valid] >= 0).all(), "compact() needs a repaired graph"
+
+        self.size = len(ids)
+        self.ids = ids.astype(numpy.int32)
+        self.neighbors = neighbors.astype(numpy.int32)
+        self.distances = numpy.array(distances)
+        self.degree = numpy.array(degree)
+        self.rows = numpy.full(max(int(remap.max()) + 1, 1), -1, dtype=numpy.int32)
+        self.rows[self.ids] = numpy.arange(self.size, dtype=numpy.int32)
+
+    def neighborhood(self, node: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Returns the (distances, ids) of the out-edges of `node` as views into the
+        adjacency arrays.
+        """
+        row = self.rows[node]
+        degree = self.degree[row]
+        return self.distances[row, :degree], self.neighbors[row, :degree]
+
+    def set_neighbors(self, node: int, D: list[float], W: list[int]) -> None:
+        row = self.rows[node]
+        degree = len(W)
+        self.neighbors[row, :degree] = W
+        self.neighbors[row, degree:] = -1
+        self.distances[row, :degree] = D
+        self.distances[row, degree:] = numpy.inf
+        self.degree[row] = degree
+
+    def add_edge(self, node: int, e: int, d: float) -> None:
+        """
+        Adds the directed edge `node -> e`, shrinking the neighbor list of `node`
+        back down to `M_max` with the neighbor selection function if it overflows.
+        """
+        row = self.rows[node]
+        degree = self.degree[row]
+
+        if degree < self.M_max:
+            self.neighbors[row, degree] = e
+            self.distances[row, degree] = d
+            self.degree[row] = degree + 1
+            return
+
+        D, W = self.neighborhood(node)
+        D = D.tolist() + [d]
+        W = W.tolist() + [e]
+        new_conn = self.f_neighbors(D, W, self.M_max)
+        self.set_neighbors(node, *zip(*new_conn))
+
     def distance_to_node(self, q: numpy.ndarray, e: int) -> float:
-        v = self.index.vectors[e]
-        d = self.index.distance(q, v)[0]
-        return d
+        return float(self.distance_to_nodes(q, [e])[0])
+
+    def distance_to_nodes(self, q: numpy.ndarray, nodes: list[int]) -> numpy.ndarray:
+        """
+        Internal distances from the prepared query `q` to all of `nodes`, with a
+        single call against the stored vectors rather than one per edge.
+        """
+        q = numpy.expand_dims(q, axis=0)
+        return self.index.engine.distances(q, self.index.vectors[nodes], nodes)[0]
 
     def search(
-        self, q: numpy.ndarray, ep: int, ef: int
+        self,
+        q: numpy.ndarray,
+        ep: int,
+        ef: int,
+        quantized: bool = False,
+        skip_deleted: bool = False,
+        stats: SearchStats | None = None,
+        k: int | None = None,
     ) -> tuple[list[float], list[int]]:
-        ep_dist = self.distance_to_node(q, ep)
+        """
+        Searches the layer for the `ef` nodes nearest to `q`, starting from `ep`.
+        With `quantized`, distances are approximated from the index's codes.
+        With `skip_deleted`, tombstoned nodes are still traversed but are never
+        returned. The work done is recorded in `stats`, if given. If the search
+        is for `k` results and `config.adaptive` is set, it stops as soon as
+        they settle (see `search_layer_adaptive`).
+        """
+        return search_layer(self, q, ep, ef, quantized, skip_deleted, None, stats, k)
+
+    def range_search(
+        self, q: numpy.ndarray, ep: int, radius: float, ef: int
+    ) -> list[tuple[float, int]]:
+        """
+        Collects the nodes within the internal distance `radius` of `q`. The
+        traversal runs like `search` with `ef`, to get close to the query, but
+        also keeps expanding every candidate inside the radius, so it only
+        stops once the whole frontier is beyond both the radius and the `ef`
+        nearest nodes seen. Uses exact distances and skips tombstones.
+        """
+        deleted = self.index.deleted
+        ep_dist = float(self.distance_to_nodes(q, [ep])[0])
+        visited = visited_table(self.index.ntotal)
+        stamps, epoch = visited.stamps, visited.next_epoch()
+        stamps[ep] = epoch
 
-        v = {ep}
         C = [(ep_dist, ep)]
-        W = [(ep_dist, ep)]
+        W = [(-ep_dist, ep)]
+        R = []
+        if ep_dist <= radius and (deleted is None or not deleted[ep]):
+            R.append((ep_dist, ep))
 
         while len(C) > 0:
             d_c, c = heappop(C)
-            d_f, f = nlargest(1, W, key=lambda x: x[0])[0]
-
-            if d_c > d_f:
+            if d_c > radius and d_c > -W[0][0]:
                 break
 
-            for e in self.G[c]:
-                if e in v:
-                    continue
+            row = self.rows[c]
+            neighbors = self.neighbors[row, : self.degree[row]]
+            neighbors = neighbors[stamps[neighbors] != epoch]
+            if len(neighbors) == 0:
+                continue
 
-                v.add(e)
-                d_f, f = nlargest(1, W, key=lambda x: x[0])[0]
-                d_e = self.distance_to_node(q, e)
+            stamps[neighbors] = epoch
+            D_e = self.distance_to_nodes(q, neighbors)
 
-                if d_e < d_f or len(W) < ef:
+            for d_e, e in zip(D_e.tolist(), neighbors.tolist()):
+                if d_e <= radius or len(W) < ef or d_e < -W[0][0]:
                     heappush(C, (d_e, e))
-                    heappush(W, (d_e, e))
-
+                    heappush(W, (-d_e, e))
                     if len(W) > ef:
-                        W = nsmallest(ef, W, key=lambda x: x[0])
+                        heappop(W)
+
+                if d_e <= radius and (deleted is None or not deleted[e]):
+                    R.append((d_e, e))
 
-        return tuple(zip(*W))
+        return R
 
     def insert(self, q: numpy.ndarray, node: int, ep: int) -> None:
-        if node in self.G:
+        if node in self:
             return
 
-        if len(self.G) == 0:
-            self.G.add_node(node)
+        if len(self) == 0:
+            self.add_node(node)
+            return
+
+        D, W = self.search(q, ep, self.config.ef_construction, skip_deleted=True)
+        self.link(node, D, W)
+
+    def relink(self, q: numpy.ndarray, node: int, ep: int) -> int:
+        """
+        Reconnects `node`, whose vector has changed to `q`: its out-edges are
+        re-selected from a fresh search, reverse edges are added to its new
+        neighbors, and the stored distances of the edges pointing at it are
+        refreshed. Returns the nearest node found, as the next layer's entry.
+        """
+        D, W = self.search(q, ep, self.config.ef_construction, skip_deleted=True)
+        candidates = [(d, e) for d, e in zip(D, W) if e != node]
+
+        rows, cols = numpy.nonzero(self.neighbors[: self.size] == node)
+        if len(rows) > 0:
+            self.distances[rows, cols] = self.distance_to_nodes(q, self.ids[rows])
+
+        if len(candidates) == 0:
+            self.set_neighbors(node, [], [])
+            return ep
+
+        neighbors = self.f_neighbors(*zip(*candidates), self.config.M)
+        self.set_neighbors(node, *zip(*neighbors))
+
+        for d, e in neighbors:
+            if node not in self.neighborhood(e)[1]:
+                self.add_edge(e, node, d)
+
+        return min(candidates)[1]
+
+    def link(self, node: int, D: list[float], W: list[int]) -> None:
+        """
+        Adds `node` to the layer, connecting it to the best `M` of the candidates
+        `W` (at distances `D`) and adding the reverse edges.
+        """
+        if node in self:
+            return
+
+        self.add_node(node)
+        if len(W) == 0:
             return
 
-        D, W = self.search(q, ep, self.config.ef_construction)
         neighbors = self.f_neighbors(D, W, self.config.M)
-        self.G.add_edges_from([(e, node, {"distance": float(d)}) for d, e in neighbors])
+        self.set_neighbors(node, *zip(*neighbors))
 
         for d, e in neighbors:
-            if len(self.G[e]) > self.M_max:
-                D, W = list(zip(*[(self.G[e][n]["distance"], n) for n in self.G[e]]))
-                new_conn = self.f_neighbors(D, W, self.M_max)
-                self.G.remove_edges_from([(e, e_n) for e_n in self.G[e]])
-                self.G.add_edges_from(
-                    [(e, e_n, {"distance": d_n}) for d_n, e_n in new_conn]
-                )
+            self.add_edge(e, node, d)
 
     def select_neighbors(
         self, D: list[float], W: list[int], M: int
@@ -208,9 +1063,10 @@ class HNSWLayer:
         while len(h) > 0 and len(R) < M:
             d_e, e = heappop(h)
 
-            if len(R) == 0 or (
-                d_e
-                < min([self.distance_to_node(self.index.vectors[e], n) for _, n in R])
+            if (
+                len(R) == 0
+                or d_e
+                < self.distance_to_nodes(self.index.vectors[e], [n for _, n in R]).min()
             ):
                 R.append((d_e, e))
             else:
@@ -222,6 +1078,289 @@ class HNSWLayer:
         return nsmallest(M, R, key=lambda x: x[0])
 
 
+class VisitedTable:
+    """
+    The visited set of a layer search, as an array of epoch stamps indexed by
+    node id: a node has been visited in the current search if its stamp equals
+    the current epoch. Starting a new search is a single increment instead of
+    allocating (or clearing) a set, and membership checks and updates are
+    vectorized over a whole neighborhood.
+    """
+
+    def __init__(self, n: int = 0) -> None:
+        self.stamps = numpy.zeros(max(n, 16), dtype=numpy.int32)
+        self.epoch = 0
+
+    def reserve(self, n: int) -> None:
+        if n > len(self.stamps):
+            self.stamps = _grow(self.stamps, max(n, 2 * len(self.stamps)), 0)
+
+    def next_epoch(self) -> int:
+        if self.epoch == numpy.iinfo(numpy.int32).max:
+            self.stamps[:] = 0
+            self.epoch = 0
+        self.epoch += 1
+        return self.epoch
+
+
+_VISITED = threading.local()
+
+
+def visited_table(n: int) -> VisitedTable:
+    """
+    The calling thread's visited table, grown to cover `n` nodes. Tables are
+    pooled per thread, so concurrent searches never share one.
+    """
+    table = getattr(_VISITED, "table", None)
+    if table is None:
+        table = _VISITED.table = VisitedTable(n)
+    table.reserve(n)
+    return table
+
+
+def search_layer(
+    layer: HNSWLayer,
+    q: numpy.ndarray,
+    ep: int,
+    ef: int,
+    quantized: bool = False,
+    skip_deleted: bool = False,
+    valid: numpy.ndarray | None = None,
+    stats: SearchStats | None = None,
+    k: int | None = None,
+) -> tuple[list[float], list[int]]:
+    """
+    The beam search shared by `HNSWLayer.search` and the filtered layer. The
+    candidates `C` are a min-heap and the results `W` a max-heap (of negated
+    distances) bounded to `ef`, so the furthest result is always `W[0]` and
+    every push or replacement is O(log ef). Nodes that are tombstoned (with
+    `skip_deleted`) or not in the bitmap `valid` are traversed but never
+    added to `W`. The work done is proportional to the nodes visited, and is
+    added to `stats` if given. Searches for `k` results go to
+    `search_layer_adaptive` when the index config asks for it.
+    """
+    if k is not None and layer.index.config.adaptive:
+        return search_layer_adaptive(
+            layer, q, ep, ef, k, quantized, skip_deleted, valid, stats
+        )
+
+    start = perf_counter() if stats is not None else 0.0
+    hops, n_visited, rejected = 0, 1, 0
+    search = _Beam(layer, q, ep, quantized, skip_deleted, valid)
+    C, W = search.C, search.W
+
+    stop = "exhausted"
+    while len(C) > 0:
+        d_c, c = heappop(C)
+        hops += 1
+        if len(W) > 0 and d_c > -W[0][0]:
+            stop = "converged"
+            break
+
+        nodes, D_e, allowed = search.expand(c)
+        if len(nodes) == 0:
+            continue
+        n_visited += len(nodes)
+
+        if allowed is None:
+            for d_e, e in zip(D_e, nodes):
+                if len(W) < ef:
+                    heappush(C, (d_e, e))
+                    heappush(W, (-d_e, e))
+                elif d_e < -W[0][0]:
+                    heappush(C, (d_e, e))
+                    heapreplace(W, (-d_e, e))
+        else:
+            for d_e, e, ok in zip(D_e, nodes, allowed.tolist()):
+                if len(W) < ef or d_e < -W[0][0]:
+                    heappush(C, (d_e, e))
+                    if not ok:
+                        rejected += 1
+                        continue
+                    if len(W) < ef:
+                        heappush(W, (-d_e, e))
+                    else:
+                        heapreplace(W, (-d_e, e))
+
+    if stats is not None:
+        # every push onto C but the rejected ones also went onto W
+        pushes = len(C) - 1 + hops
+        heap_ops = hops + 2 * pushes - rejected
+        elapsed = perf_counter() - start
+        stats.record_layer(layer.lc, hops, n_visited, heap_ops, elapsed, stop, ef)
+
+    return [-d for d, _ in W], [e for _, e in W]
+
+
+def search_layer_adaptive(
+    layer: HNSWLayer,
+    q: numpy.ndarray,
+    ep: int,
+    ef: int,
+    k: int,
+    quantized: bool = False,
+    skip_deleted: bool = False,
+    valid: numpy.ndarray | None = None,
+    stats: SearchStats | None = None,
+) -> tuple[list[float], list[int]]:
+    """
+    `search_layer` for a query that wants `k` results, with a beam width that
+    adapts to how hard the query is. Besides the `ef` results `W`, it keeps
+    the `k` best in a max-heap `T`, and stops with the first of:
+
+    - "patience": `adaptive_patience` expansions in a row left `T` unchanged,
+      so the top k have settled (only once `T` is full);
+    - "ratio": the nearest candidate is more than `adaptive_ratio` times
+      further (in internal distance) than the k-th best, if that's set. Only
+      for L2, whose distances are never negative: the `1 - q.x` of cosine and
+      inner product can be zero or negative, where a ratio means nothing;
+    - "converged": the usual condition, the nearest candidate is further than
+      all of `W`. If `T` changed within the last `adaptive_patience`
+      expansions, the query is still improving: `ef` is doubled instead (up
+      to `adaptive_max_ef`) and the search goes on;
+    - "exhausted": there are no candidates left.
+
+    Easy queries settle quickly and stop before `W` converges, while hard
+    ones get a wider beam than the configured `ef`.
+    """
+    start = perf_counter() if stats is not None else 0.0
+    config = layer.index.config
+    patience, ratio = config.adaptive_patience, config.adaptive_ratio
+    if not isinstance(layer.index.engine, L2Distance):
+        ratio = 0.0
+    max_ef = max(ef, config.adaptive_max_ef)
+
+    hops, n_visited, heap_ops, stale = 0, 1, 0, 0
+    search = _Beam(layer, q, ep, quantized, skip_deleted, valid)
+    C, W, T = search.C, search.W, list(search.W)
+
+    stop = "exhausted"
+    while len(C) > 0:
+        d_c, c = heappop(C)
+        hops += 1
+        if len(T) >= k:
+            if stale >= patience:
+                stop = "patience"
+                break
+            if ratio > 0 and d_c > ratio * -T[0][0]:
+                stop = "ratio"
+                break
+        if len(W) > 0 and d_c > -W[0][0]:
+            if stale >= patience or ef >= max_ef:
+                stop = "converged"
+                break
+            ef = min(2 * ef, max_ef)
+
+        if len(T) < k or d_c > -T[0][0]:
+            stale += 1
+        nodes, D_e, allowed = search.expand(c)
+        if len(nodes) == 0:
+            continue
+        n_visited += len(nodes)
+
+        allowed = repeat(True) if allowed is None else allowed.tolist()
+        for d_e, e, ok in zip(D_e, nodes, allowed):
+            if len(W) < ef or d_e < -W[0][0]:
+                heappush(C, (d_e, e))
+                heap_ops += 1
+                if not ok:
+                    continue
+
+                if len(W) < ef:
+                    heappush(W, (-d_e, e))
+                else:
+                    heapreplace(W, (-d_e, e))
+
+                if len(T) < k:
+                    heappush(T, (-d_e, e))
+                elif d_e < -T[0][0]:
+                    heapreplace(T, (-d_e, e))
+                else:
+                    heap_ops += 1
+                    continue
+                heap_ops += 2
+                stale = 0
+
+    if stats is not None:
+        heap_ops += hops
+        elapsed = perf_counter() - start
+        stats.record_layer(layer.lc, hops, n_visited, heap_ops, elapsed, stop, ef)
+
+    return [-d for d, _ in W], [e for _, e in W]
+
+
+class _Beam:
+    """
+    The state both beam searches start from: the visited stamps, with `ep`
+    marked, the candidates `C` holding `ep`, and the results `W` holding it
+    too unless it's filtered out.
+    """
+
+    def __init__(
+        self,
+        layer: HNSWLayer,
+        q: numpy.ndarray,
+        ep: int,
+        quantized: bool,
+        skip_deleted: bool,
+        valid: numpy.ndarray | None,
+    ) -> None:
+        index = layer.index
+        self.q, self.valid = q, valid
+        self.rows, self.neighbors = layer.rows, layer.neighbors
+        self.degree = layer.degree
+        self.f_distance = (
+            index.quantizer.distances if quantized else layer.distance_to_nodes
+        )
+        self.deleted = index.deleted if skip_deleted else None
+
+        visited = visited_table(index.ntotal)
+        self.stamps, self.epoch = visited.stamps, visited.next_epoch()
+        self.stamps[ep] = self.epoch
+
+        ep_dist = float(self.f_distance(q, [ep])[0])
+        self.C = [(ep_dist, ep)]
+        self.W = []
+        allowed = self.allowed(numpy.array([ep]))
+        if allowed is None or allowed[0]:
+            self.W.append((-ep_dist, ep))
+
+    def allowed(self, nodes: numpy.ndarray) -> numpy.ndarray | None:
+        """
+        Which of `nodes` can be results: those in `valid` and not tombstoned.
+        None if there is no filter at all.
+        """
+        allowed = None
+        if self.valid is not None:
+            allowed = self.valid[nodes]
+        if self.deleted is not None:
+            alive = ~self.deleted[nodes]
+            allowed = alive if allowed is None else allowed & alive
+        return allowed
+
+    def expand(self, c: int) -> tuple[list[int], list[float], numpy.ndarray | None]:
+        """
+        Marks the unvisited neighbors of `c` as visited, and returns them with
+        their distances to the query and which of them are `allowed`.
+        """
+        stamps, epoch = self.stamps, self.epoch
+        row = self.rows[c]
+        nodes = self.neighbors[row, : self.degree[row]]
+        nodes = nodes[stamps[nodes] != epoch]
+        if len(nodes) == 0:
+            return [], [], None
+
+        stamps[nodes] = epoch
+        D_e = self.f_distance(self.q, nodes).tolist()
+        return nodes.tolist(), D_e, self.allowed(nodes)
+
+
+def _grow(array: numpy.ndarray, capacity: int, fill: float) -> numpy.ndarray:
+    grown = numpy.full((capacity, *array.shape[1:]), fill, dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
 if __name__ == "__main__":
     # config = HNSWConfig(
     #     M=3, M_max=3, M_max0=6, m_L=(1.0 / math.log(3)), ef_construction=32, ef_search=32
@@ -240,9 +1379,6 @@ if __name__ == "__main__":
     index = HNSWIndex(128, distance="l2", config=DEFAULT_CONFIG)
     index.add(data)
 
-    I = []
-    for q in queries:
-        D_q, I_q = index.search(q, k=1)
-        I.append(I_q[0])
+    D, I = index.search(queries, k=1)
 
-    print(f"Recall@1: {evaluate(labels, I)}")
+    print(f"Recall@1: {evaluate(labels, I[:, 0])}")
@@ -0,0 +1,158 @@
+"""
+External ids. Indexes number their vectors by position (the row in the vector
+storage, which is also the graph node), and `IdMap` translates between those
+rows and arbitrary non-negative int64 ids chosen by the caller.
+
+row -> id is a plain int64 array. id -> row is an open-addressing hash table
+held in two int64 arrays (keys and rows) with linear probing, so the whole map
+costs ~40 bytes per vector (vs. ~100+ for a Python dict), lookups and inserts
+are vectorized over batches of ids, and the tables can be saved and
+memory-mapped like any other index array.
+"""
+
+from __future__ import annotations
+from tinyhnsw.storage import VectorStorage
+
+import numpy
+
+
+_EMPTY = -1
+_REMOVED = -2
+
+# 2^64 / golden ratio: multiplicative (Fibonacci) hashing
+_MULTIPLIER = numpy.uint64(0x9E3779B97F4A7C15)
+
+
+class IdMap:
+    def __init__(self, capacity: int = 16) -> None:
+        self.ids = VectorStorage(None, dtype=numpy.int64)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self.bits = max(4, int(capacity - 1).bit_length())
+        self.keys = numpy.zeros(2**self.bits, dtype=numpy.int64)
+        self.rows = numpy.full(2**self.bits, _EMPTY, dtype=numpy.int64)
+        self.used = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.keys)
+
+    def _hash(self, keys: numpy.ndarray) -> numpy.ndarray:
+        h = keys.astype(numpy.uint64) * _MULTIPLIER
+        return (h >> numpy.uint64(64 - self.bits)).astype(numpy.int64)
+
+    def _find(self, keys: numpy.ndarray) -> numpy.ndarray:
+        """
+        The hash table slot holding each of `keys`, or -1 where it is absent.
+        """
+        mask = self.capacity - 1
+        slots = self._hash(keys)
+        found = numpy.full(len(keys), -1, dtype=numpy.int64)
+        todo = numpy.arange(len(keys))
+
+        while len(todo) > 0:
+            s = slots[todo]
+            rows = self.rows[s]
+            hit = (self.keys[s] == keys[todo]) & (rows >= 0)
+            found[todo[hit]] = s[hit]
+
+            todo = todo[~(hit | (rows == _EMPTY))]
+            slots[todo] = (slots[todo] + 1) & mask
+
+        return found
+
+    def _insert(self, keys: numpy.ndarray, rows: numpy.ndarray) -> None:
+        """
+        Inserts unique keys that are not in the table yet. Keys that collide on
+        a free slot in the same probing round are resolved by letting the
+        first one claim it and moving the rest on.
+        """
+        if 2 * (self.used + len(keys)) > self.capacity:
+            live = self.rows >= 0
+            old_keys, old_rows = self.keys[live], self.rows[live]
+            self._allocate(4 * (len(old_keys) + len(keys)))
+            self._insert(old_keys, old_rows)
+
+        mask = self.capacity - 1
+        slots = self._hash(keys)
+        todo = numpy.arange(len(keys))
+
+        while len(todo) > 0:
+            s = slots[todo]
+            free = self.rows[s] < 0
+            _, first = numpy.unique(s[free], return_index=True)
+            winners = todo[free][first]
+            claimed = slots[winners]
+
+            self.used += int((self.rows[claimed] == _EMPTY).sum())
+            self.keys[claimed] = keys[winners]
+            self.rows[claimed] = rows[winners]
+
+            todo = numpy.setdiff1d(todo, winners, assume_unique=True)
+            slots[todo] = (slots[todo] + 1) & mask
+
+    def lookup(self, ids: numpy.ndarray) -> numpy.ndarray:
+        """
+        The rows of `ids`, with -1 for the ids that aren't in the map.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.int64).ravel()
+        found = self._find(ids)
+        return numpy.where(found >= 0, self.rows[numpy.maximum(found, 0)], -1)
+
+    def contains(self, ids: numpy.ndarray) -> numpy.ndarray:
+        return self.lookup(ids) >= 0
+
+    def add(self, ids: numpy.ndarray) -> None:
+        """
+        Assigns `ids` to the next rows.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.int64).ravel()
+        assert (ids >= 0).all(), "external ids must be non-negative"
+        assert len(numpy.unique(ids)) == len(ids), "duplicate ids"
+        assert not self.contains(ids).any(), "ids are already in the index"
+
+        rows = numpy.arange(len(self.ids), len(self.ids) + len(ids))
+        self._insert(ids, rows)
+        self.ids.append(ids)
+
+    def discard(self, ids: numpy.ndarray) -> None:
+        """
+        Forgets `ids` (their rows keep their ids until `compact`), so they can
+        be added again.
+        """
+        found = self._find(numpy.asarray(ids, dtype=numpy.int64).ravel())
+        self.rows[found[found >= 0]] = _REMOVED
+
+    def compact(self, keep: numpy.ndarray) -> None:
+        """
+        Drops the rows not in the boolean mask `keep`, renumbering the rest.
+        """
+        ids = self.ids.view()[keep]
+        live = numpy.zeros(len(self.ids), dtype=bool)
+        live[self.rows[self.rows >= 0]] = True
+        live = live[keep]
+
+        self.ids = VectorStorage.from_array(ids)
+        self._allocate(4 * len(ids))
+        self._insert(ids[live], numpy.flatnonzero(live))
+
+    def external(self, I: numpy.ndarray) -> numpy.ndarray:
+        """
+        Translates an array of rows (padded with -1) into external ids.
+        """
+        ids = self.ids.view()
+        return numpy.where(I >= 0, ids[numpy.maximum(I, 0)], -1)
+
+    def get_state(self) -> dict[str, numpy.ndarray]:
+        return {"ids": self.ids.view(), "keys": self.keys, "rows": self.rows}
+
+    def set_state(self, arrays: dict[str, numpy.ndarray]) -> None:
+        self.ids = VectorStorage.from_array(arrays["ids"])
+        self.keys = arrays["keys"]
+        self.rows = arrays["rows"]
+        self.bits = int(len(self.keys) - 1).bit_length()
+        self.used = int((self.rows != _EMPTY).sum())
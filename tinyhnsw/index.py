@@ -1,72 +1,419 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from tinyhnsw.distance import ENGINES
+from tinyhnsw.ids import IdMap
+from tinyhnsw.serialization import write_index, read_index, is_index_file
+from tinyhnsw.stats import SearchStats
+from tinyhnsw.storage import VectorStorage
+
 import numpy
-import pickle
 
 
 class Index:
+    _registry: dict[str, type[Index]] = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        Index._registry[cls.__name__] = cls
+
     def __init__(self, d: int, distance: str = "cosine") -> None:
         self.ntotal = 0
-        self.vectors = None
+        self.storage = VectorStorage(d)
         self.is_trained = False
         self.d = d
+        # external ids: None while rows are their own ids
+        self.idmap = None
+        # a SearchMonitor, to aggregate the stats of every search
+        self.monitor = None
+        # a ResultCache, for indexes that search through `_search_batch`
+        self.cache = None
 
         assert distance in ["cosine", "l2", "inner_product"]
 
-        if distance == "cosine":
-            self.f_distance = cosine_distance
-        elif distance == "l2":
-            self.f_distance = l2_distance
-        elif distance == "inner_product":
-            self.f_distance = inner_product_distance
+        self.metric = distance
+        self.engine = ENGINES[distance]()
+
+    @property
+    def vectors(self) -> numpy.ndarray | None:
+        if len(self.storage) == 0:
+            return None
+        return self.storage.view()
+
+    def reserve(self, n: int) -> None:
+        """
+        Preallocates room for `n` vectors in total, e.g. ahead of streaming
+        ingestion whose final size is known.
+        """
+        self.storage.reserve(n)
+        self.engine.reserve(n)
 
     def add(self, vectors: numpy.ndarray) -> None:
         assert vectors.shape[1] == self.d
+        self._check_ids(len(vectors))
 
-        if self.vectors is None:
-            self.vectors = vectors
-            self.is_trained = True
-        else:
-            self.vectors = numpy.append(self.vectors, vectors, axis=0)
+        self.storage.append(self.engine.add(vectors))
+        self.is_trained = True
+        self.ntotal = len(self.storage)
+        self._invalidate()
+
+    def add_with_ids(
+        self, vectors: numpy.ndarray, ids: numpy.ndarray, **kwargs
+    ) -> None:
+        """
+        Adds `vectors` under the non-negative int64 `ids`, which `search` then
+        returns instead of positions. Vectors added earlier with `add` keep
+        their positions as ids. `kwargs` are passed on to `add`.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.int64).ravel()
+        assert len(ids) == len(vectors)
+
+        if self.idmap is None:
+            self.idmap = IdMap()
+            self.idmap.add(numpy.arange(self.ntotal))
+
+        self.idmap.add(ids)
+        self.add(vectors, **kwargs)
+
+    def upsert(self, vectors: numpy.ndarray, ids: numpy.ndarray, **kwargs) -> None:
+        """
+        Replaces the vectors of the `ids` that are already in the index, in
+        place, and adds the others as with `add_with_ids`.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.int64).ravel()
+        vectors = numpy.asarray(vectors)
+        assert len(ids) == len(vectors)
+        assert len(numpy.unique(ids)) == len(ids), "duplicate ids"
+
+        rows = self._lookup(ids)
+        existing = rows >= 0
+        if existing.any():
+            self._update(rows[existing], vectors[existing])
+        if not existing.all():
+            self.add_with_ids(vectors[~existing], ids[~existing], **kwargs)
+
+    def _update(self, rows: numpy.ndarray, vectors: numpy.ndarray) -> None:
+        """
+        Overwrites the stored vectors at `rows`. Indexes with derived
+        structures (codes, graphs) extend this to refresh them.
+        """
+        assert vectors.shape[1] == self.d
+        self.storage.data[rows] = self.engine.update(rows, vectors)
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        """
+        Called at the end of every change to the indexed vectors or graph, to
+        drop cached results.
+        """
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _check_ids(self, n: int) -> None:
+        assert (
+            self.idmap is None or len(self.idmap) == self.ntotal + n
+        ), "this index has external ids: use add_with_ids"
+
+    def _rows(self, ids: numpy.ndarray) -> numpy.ndarray:
+        """
+        Translates external ids into rows.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.int64).ravel()
+        if self.idmap is None:
+            return ids
+
+        rows = self.idmap.lookup(ids)
+        assert (rows >= 0).all(), "unknown ids"
+        return rows
 
-        self.ntotal = self.vectors.shape[0]
+    def _lookup(self, ids: numpy.ndarray) -> numpy.ndarray:
+        """
+        Translates external ids into rows, -1 for the ids not in the index.
+        """
+        if self.idmap is None:
+            return numpy.where((ids >= 0) & (ids < self.ntotal), ids, -1)
+        return self.idmap.lookup(ids)
+
+    def _external(self, I: numpy.ndarray) -> numpy.ndarray:
+        """
+        Translates result rows (padded with -1) into external ids.
+        """
+        return I if self.idmap is None else self.idmap.external(I)
 
     def search(
         self, query: numpy.ndarray, k: int
     ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Searches for the `k` nearest neighbors of each row of `query`, an (n, d)
+        matrix (a single (d,) vector is treated as n=1). Returns (n, k) arrays of
+        distances and ids, padded with inf / -1 when fewer than k are found.
+        """
+        raise NotImplementedError()
+
+    def range_search(
+        self, query: numpy.ndarray, radius: float
+    ) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """
+        Finds all the neighbors within distance `radius` of each row of `query`.
+        Returns CSR-style (lims, D, I): the results of query i are
+        D[lims[i] : lims[i + 1]] and I[lims[i] : lims[i + 1]], sorted by
+        distance.
+        """
+        raise NotImplementedError()
+
+    def search_one(self, q: numpy.ndarray, k: int) -> tuple[list[float], list[int]]:
+        """
+        Searches for the neighbors of a single (d,) query, returning at most `k`
+        (distance, id) pairs sorted by distance. Indexes that can't vectorize
+        across queries implement this and use `_search_batch` in `search`.
+        """
         raise NotImplementedError()
 
+    def _search_batch(
+        self,
+        query: numpy.ndarray,
+        k: int,
+        n_workers: int = 1,
+        executor: str = "thread",
+        return_stats: bool = False,
+        **kwargs,
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Runs `search_one` over every query, optionally across a thread or process
+        pool, and packs the results into padded (n, k) arrays. If stats are
+        requested or a monitor is attached, `search_one` is asked for each
+        query's `SearchStats`, which are recorded by the monitor and, with
+        `return_stats`, returned as a third value. Queries go through the
+        result cache, if there is one.
+        """
+        Q = _as_batch(query)
+        D = numpy.full((len(Q), k), numpy.inf, dtype=numpy.float32)
+        I = numpy.full((len(Q), k), -1, dtype=numpy.int64)
+
+        collect = return_stats or self.monitor is not None
+        if collect:
+            kwargs["stats"] = True
+
+        if self.cache is None:
+            results = self._map_queries(
+                "search_one", Q, n_workers, executor, k=k, **kwargs
+            )
+        else:
+            results = self._search_cached(Q, k, n_workers, executor, **kwargs)
+        _fill_results(D, I, results)
+
+        if not collect:
+            return D, self._external(I)
+
+        stats = [result[2] for result in results]
+        self._record_stats(stats)
+        return (D, self._external(I), stats) if return_stats else (D, self._external(I))
+
+    def _search_cached(
+        self,
+        Q: numpy.ndarray,
+        k: int,
+        n_workers: int = 1,
+        executor: str = "thread",
+        **kwargs,
+    ) -> list:
+        """
+        `search_one` over the queries of `Q` that miss the cache, whose results
+        are then cached unless the index changed in the meantime. Cache hits
+        come with an empty `SearchStats` (stopped by "cache") when stats are
+        requested.
+        """
+        cache = self.cache
+        generation = cache.generation
+        context = {name: value for name, value in kwargs.items() if name != "stats"}
+        keys = cache.keys(Q, k, (self._cache_token(k), context))
+
+        results = [cache.get(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if len(misses) > 0:
+            searched = self._map_queries(
+                "search_one", Q[misses], n_workers, executor, k=k, **kwargs
+            )
+            for i, result in zip(misses, searched):
+                results[i] = result
+                cache.put(keys[i], result[:2], generation)
+
+        if kwargs.get("stats"):
+            results = [
+                r if len(r) == 3 else (*r, SearchStats(stop="cache")) for r in results
+            ]
+        return results
+
+    def _cache_token(self, k: int):
+        """
+        The search parameters that results for `k` neighbors depend on, as
+        part of their cache keys.
+        """
+        return None
+
+    def _record_stats(self, stats: list[SearchStats]) -> None:
+        if self.monitor is not None:
+            for record in stats:
+                self.monitor.record(record)
+
+    def _range_search_batch(
+        self,
+        query: numpy.ndarray,
+        radius: float,
+        n_workers: int = 1,
+        executor: str = "thread",
+        **kwargs,
+    ) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """
+        Runs `range_search_one` over every query, like `_search_batch`, and packs
+        the results into CSR-style (lims, D, I) arrays.
+        """
+        Q = _as_batch(query)
+        results = self._map_queries(
+            "range_search_one", Q, n_workers, executor, radius=radius, **kwargs
+        )
+
+        lims = numpy.zeros(len(Q) + 1, dtype=numpy.int64)
+        lims[1:] = numpy.cumsum([len(I_q) for _, I_q in results])
+        D = numpy.array([d for D_q, _ in results for d in D_q], dtype=numpy.float32)
+        I = numpy.array([e for _, I_q in results for e in I_q], dtype=numpy.int64)
+
+        return lims, D, self._external(I)
+
+    def _map_queries(
+        self,
+        method: str,
+        Q: numpy.ndarray,
+        n_workers: int = 1,
+        executor: str = "thread",
+        **kwargs,
+    ) -> list:
+        """
+        Calls the per-query `method` on every row of `Q`, optionally across a
+        thread or process pool, returning the results in order.
+        """
+        assert executor in ["thread", "process"]
+
+        if n_workers <= 1 or len(Q) <= 1:
+            return list(map(partial(getattr(self, method), **kwargs), Q))
+
+        if executor == "thread":
+            with ThreadPoolExecutor(n_workers) as pool:
+                return list(pool.map(partial(getattr(self, method), **kwargs), Q))
+
+        chunksize = max(1, len(Q) // (4 * n_workers))
+        with ProcessPoolExecutor(
+            n_workers, initializer=_init_worker, initargs=(self,)
+        ) as pool:
+            f = partial(_query_worker, method=method, **kwargs)
+            return list(pool.map(f, Q, chunksize=chunksize))
+
     def save(self, file: str) -> None:
-        with open(file, "wb") as f:
-            pickle.dump(self, f)
+        meta, arrays = self.get_state()
+        write_index(file, type(self).__name__, meta, arrays)
 
     @classmethod
-    def from_file(cls, file: str) -> Index:
-        with open(file, "rb") as f:
-            return pickle.load(f)
+    def from_file(cls, file: str, mmap_mode: str | None = "c") -> Index:
+        """
+        Loads an index written by `save`. The vector and graph blocks are
+        memory-mapped (see `read_index` for the modes), so loading is
+        near-instant and pages are only read as searches touch them. Indexes
+        pickled by older versions have a different layout and aren't accepted:
+        rebuild them from their vectors and `save` them again.
+        """
+        if not is_index_file(file):
+            raise ValueError(
+                f"{file} is not a tinyhnsw index file; if it was pickled by an "
+                "older version, rebuild the index from its vectors and save it "
+                "with the current format"
+            )
 
+        kind, meta, arrays = read_index(file, mmap_mode)
+        klass = Index._registry.get(kind, Index if kind == "Index" else None)
+        assert klass is not None and issubclass(klass, cls), kind
 
-def _normalize(X: numpy.ndarray) -> numpy.ndarray:
-    return X / numpy.expand_dims(numpy.linalg.norm(X, axis=1), axis=1)
+        index = klass.__new__(klass)
+        index.set_state(meta, arrays)
+        return index
 
+    def get_state(self) -> tuple[dict, dict[str, numpy.ndarray]]:
+        """
+        Returns the (meta, arrays) that describe this index on disk: `meta` is
+        JSON-serializable scalars, `arrays` are written as raw blocks.
+        Subclasses extend both.
+        """
+        meta = {"d": self.d, "distance": self.metric, "ntotal": self.ntotal}
+        arrays = {"vectors": self.storage.view()}
+        arrays.update({f"engine.{k}": v for k, v in self.engine.get_state().items()})
+        if self.idmap is not None:
+            arrays.update({f"idmap.{k}": v for k, v in self.idmap.get_state().items()})
+        return meta, arrays
 
-def cosine_similarity(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
-    X = _normalize(X)
-    Y = _normalize(Y)
+    def set_state(self, meta: dict, arrays: dict[str, numpy.ndarray]) -> None:
+        Index.__init__(self, meta["d"], meta["distance"])
 
-    return numpy.dot(X, Y.T)
+        self.storage = VectorStorage.from_array(arrays["vectors"])
+        self.engine.set_state(
+            {
+                k[len("engine.") :]: v
+                for k, v in arrays.items()
+                if k.startswith("engine.")
+            }
+        )
+        self.ntotal = len(self.storage)
+        self.is_trained = self.ntotal > 0
 
+        if "idmap.ids" in arrays:
+            self.idmap = IdMap()
+            self.idmap.set_state(
+                {
+                    k[len("idmap.") :]: v
+                    for k, v in arrays.items()
+                    if k.startswith("idmap.")
+                }
+            )
 
-def inner_product_distance(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
-    return 1.0 - numpy.dot(X, Y.T)
 
+_WORKER_INDEX: Index | None = None
 
-def cosine_distance(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
-    X = _normalize(X)
-    Y = _normalize(Y)
 
-    return inner_product_distance(X, Y)
+def _init_worker(index: Index) -> None:
+    """
+    Process pool initializer: each worker unpickles the index once, rather than
+    once per query.
+    """
+    global _WORKER_INDEX
+    _WORKER_INDEX = index
+
 
+def _query_worker(q: numpy.ndarray, method: str, **kwargs):
+    return getattr(_WORKER_INDEX, method)(q, **kwargs)
 
-def l2_distance(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
-    return numpy.linalg.norm(X - Y, axis=1)
+
+def _method_worker(method: str, *args):
+    return getattr(_WORKER_INDEX, method)(*args)
+
+
+def _as_batch(query: numpy.ndarray) -> numpy.ndarray:
+    query = numpy.asarray(query)
+    if len(query.shape) == 1:
+        query = numpy.expand_dims(query, axis=0)
+    return query
+
+
+def _fill_results(D: numpy.ndarray, I: numpy.ndarray, results) -> None:
+    for i, (D_q, I_q, *_) in enumerate(results):
+        D[i, : len(D_q)] = D_q
+        I[i, : len(I_q)] = I_q
+
+
+def _normalize(X: numpy.ndarray) -> numpy.ndarray:
+    return X / numpy.expand_dims(numpy.linalg.norm(X, axis=1), axis=1)
+
+
+def cosine_similarity(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
+    X = _normalize(X)
+    Y = _normalize(Y)
+
+    return numpy.dot(X, Y.T)
@@ -0,0 +1,292 @@
+from __future__ import annotations
+from tinyhnsw.index import Index, _as_batch
+from tinyhnsw.distance import L2Distance
+from tinyhnsw.storage import VectorStorage
+from tinyhnsw.utils import load_sift, evaluate
+
+import numpy
+
+
+class IVFPQIndex(Index):
+    """
+    An inverted file index with product-quantized residuals. A k-means coarse
+    quantizer splits the space into `nlist` cells; every vector is stored in
+    the list of its nearest centroid, as `m` one-byte codes of its residual
+    (vector - centroid), one per sub-space. Only the codes are kept, not the
+    vectors, which is what makes it a fit for collections that don't fit in
+    memory as a graph.
+
+    At query time, the `nprobe` nearest lists are scanned with asymmetric
+    distances: the query stays at full precision and distances to codes are
+    sums of table lookups. The query-dependent tables are computed once per
+    query; the list-dependent terms are precomputed when training.
+    """
+
+    def __init__(
+        self,
+        d: int,
+        distance: str = "l2",
+        nlist: int = 100,
+        m: int = 8,
+        nbits: int = 8,
+        nprobe: int = 1,
+    ) -> None:
+        super().__init__(d, distance)
+
+        assert d % m == 0, "the dimension must be divisible by the number of sub-spaces"
+        assert nbits <= 8
+
+        self.nlist = nlist
+        self.m = m
+        self.nbits = nbits
+        self.nprobe = nprobe
+
+        self.centroids = None
+        self.codebooks = None
+        self.lists = [VectorStorage(None, dtype=numpy.int64) for _ in range(nlist)]
+        self.codes = [VectorStorage(m, dtype=numpy.uint8) for _ in range(nlist)]
+
+    @property
+    def ksub(self) -> int:
+        return 2**self.nbits
+
+    @property
+    def dsub(self) -> int:
+        return self.d // self.m
+
+    def train(self, vectors: numpy.ndarray) -> None:
+        X = self.engine.prepare(vectors)
+
+        if len(X) < self.nlist:
+            self.nlist = len(X)
+            self.lists = self.lists[: self.nlist]
+            self.codes = self.codes[: self.nlist]
+        self.centroids = kmeans(X, self.nlist)
+        R = X - self.centroids[self._assign(X)]
+
+        self.codebooks = numpy.stack(
+            [kmeans(R[:, self._sub(j)], self.ksub) for j in range(self.m)]
+        )
+        self._precompute_tables()
+        self.is_trained = True
+
+    def _sub(self, j: int) -> slice:
+        return slice(j * self.dsub, (j + 1) * self.dsub)
+
+    def _assign(self, X: numpy.ndarray) -> numpy.ndarray:
+        return _l2(X, self.centroids).argmin(axis=1)
+
+    def _precompute_tables(self) -> None:
+        """
+        For L2, |q - c - y|^2 = |q - c|^2 + (|y|^2 + 2c.y) - 2q.y, and the middle
+        term only depends on the list and the codes, so it's tabulated here as
+        an (nlist, m, ksub) array.
+        """
+        if not isinstance(self.engine, L2Distance):
+            self.tables = None
+            return
+
+        sq_norms = (self.codebooks**2).sum(axis=2)
+        C = self.centroids.reshape(len(self.centroids), self.m, 1, self.dsub)
+        self.tables = sq_norms + 2.0 * (C * self.codebooks).sum(axis=3)
+
+    def encode(self, X: numpy.ndarray, lists: numpy.ndarray) -> numpy.ndarray:
+        R = X - self.centroids[lists]
+        codes = numpy.empty((len(X), self.m), dtype=numpy.uint8)
+        for j in range(self.m):
+            codes[:, j] = _l2(R[:, self._sub(j)], self.codebooks[j]).argmin(axis=1)
+        return codes
+
+    def add(self, vectors: numpy.ndarray) -> None:
+        assert vectors.shape[1] == self.d
+
+        self._check_ids(len(vectors))
+
+        if not self.is_trained:
+            self.train(vectors)
+
+        X = self.engine.prepare(vectors)
+        self._append(X, numpy.arange(self.ntotal, self.ntotal + len(X)))
+        self.ntotal += len(X)
+
+    def _append(self, X: numpy.ndarray, ids: numpy.ndarray) -> None:
+        lists = self._assign(X)
+        codes = self.encode(X, lists)
+
+        for c in numpy.unique(lists).tolist():
+            self.lists[c].append(ids[lists == c])
+            self.codes[c].append(codes[lists == c])
+
+    def _update(self, rows: numpy.ndarray, vectors: numpy.ndarray) -> None:
+        """
+        Moves the entries of `rows` out of their lists and re-adds them with the
+        new vectors, which may land in a different list.
+        """
+        stale = numpy.zeros(self.ntotal, dtype=bool)
+        stale[rows] = True
+
+        for c in range(self.nlist):
+            keep = ~stale[self.lists[c].view()]
+            if not keep.all():
+                self.lists[c] = VectorStorage.from_array(self.lists[c].view()[keep])
+                self.codes[c] = VectorStorage.from_array(self.codes[c].view()[keep])
+
+        self._append(self.engine.prepare(vectors), rows)
+
+    def search(
+        self, query: numpy.ndarray, k: int, nprobe: int | None = None
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        Q = self.engine.prepare(_as_batch(query))
+
+        D = numpy.full((len(Q), k), numpy.inf, dtype=numpy.float32)
+        I = numpy.full((len(Q), k), -1, dtype=numpy.int64)
+
+        if not self.is_trained:
+            return D, I
+
+        if self.tables is not None:
+            coarse = _l2(Q, self.centroids)
+        else:
+            coarse = 1.0 - numpy.dot(Q, self.centroids.T)
+        probes = numpy.argsort(coarse, axis=1)[:, :nprobe]
+
+        for i, q in enumerate(Q):
+            # the query-dependent -2q.y (or -q.y) term, once per query
+            Q_sub = q.reshape(self.m, 1, self.dsub)
+            T = (Q_sub * self.codebooks).sum(axis=2)
+            T *= -2.0 if self.tables is not None else -1.0
+
+            D_q, I_q = [], []
+            for c in probes[i].tolist():
+                codes = self.codes[c].view()
+                if len(codes) == 0:
+                    continue
+
+                table = T if self.tables is None else T + self.tables[c]
+                D_q.append(
+                    coarse[i, c] + table[numpy.arange(self.m), codes].sum(axis=1)
+                )
+                I_q.append(self.lists[c].view())
+
+            if len(D_q) == 0:
+                continue
+
+            D_q = numpy.concatenate(D_q)
+            I_q = numpy.concatenate(I_q)
+            top = numpy.argsort(D_q)[:k]
+            D_top = D_q[top]
+            if self.tables is not None:
+                # squared L2 can come out slightly negative from the tables
+                D_top = numpy.maximum(D_top, 0.0)
+            D[i, : len(top)] = self.engine.finalize(D_top)
+            I[i, : len(top)] = I_q[top]
+
+        return D, self._external(I)
+
+    def get_state(self) -> tuple[dict, dict[str, numpy.ndarray]]:
+        meta, arrays = super().get_state()
+        meta.update(
+            {
+                "nlist": self.nlist,
+                "m": self.m,
+                "nbits": self.nbits,
+                "nprobe": self.nprobe,
+                "ntotal": self.ntotal,
+                "is_trained": self.is_trained,
+            }
+        )
+
+        if self.is_trained:
+            sizes = [len(ids) for ids in self.lists]
+            arrays.update(
+                {
+                    "centroids": self.centroids,
+                    "codebooks": self.codebooks,
+                    "list_sizes": numpy.array(sizes, dtype=numpy.int64),
+                    "list_ids": numpy.concatenate([ids.view() for ids in self.lists]),
+                    "list_codes": numpy.concatenate([c.view() for c in self.codes]),
+                }
+            )
+        return meta, arrays
+
+    def set_state(self, meta: dict, arrays: dict[str, numpy.ndarray]) -> None:
+        super().set_state(meta, arrays)
+
+        self.nlist = meta["nlist"]
+        self.m = meta["m"]
+        self.nbits = meta["nbits"]
+        self.nprobe = meta["nprobe"]
+        self.ntotal = meta["ntotal"]
+        self.is_trained = meta["is_trained"]
+        self.centroids = None
+        self.codebooks = None
+        self.lists = [VectorStorage(None, dtype=numpy.int64) for _ in range(self.nlist)]
+        self.codes = [
+            VectorStorage(self.m, dtype=numpy.uint8) for _ in range(self.nlist)
+        ]
+
+        if self.is_trained:
+            self.centroids = arrays["centroids"]
+            self.codebooks = arrays["codebooks"]
+            offsets = numpy.cumsum([0, *arrays["list_sizes"].tolist()])
+            for c, (a, b) in enumerate(zip(offsets[:-1], offsets[1:])):
+                self.lists[c] = VectorStorage.from_array(arrays["list_ids"][a:b])
+                self.codes[c] = VectorStorage.from_array(arrays["list_codes"][a:b])
+            self._precompute_tables()
+
+
+def _l2(X: numpy.ndarray, Y: numpy.ndarray) -> numpy.ndarray:
+    """
+    Squared L2 distances, for k-means and encoding.
+    """
+    D = numpy.dot(X, Y.T)
+    D *= -2.0
+    D += numpy.expand_dims((X * X).sum(axis=1), axis=1)
+    D += (Y * Y).sum(axis=1)
+    return D
+
+
+def kmeans(
+    X: numpy.ndarray, k: int, n_iter: int = 20, max_points_per_centroid: int = 256
+) -> numpy.ndarray:
+    """
+    Plain Lloyd's k-means, trained on a sample of at most
+    `max_points_per_centroid * k` points. Returns (k, d) float32 centroids.
+    """
+    rng = numpy.random.default_rng(1337)
+    X = numpy.asarray(X, dtype=numpy.float32)
+
+    if len(X) > max_points_per_centroid * k:
+        X = X[rng.choice(len(X), max_points_per_centroid * k, replace=False)]
+
+    centroids = X[rng.choice(len(X), min(k, len(X)), replace=False)].copy()
+    if len(centroids) < k:
+        # fewer points than centroids: pad with jittered copies
+        extra = centroids[rng.integers(0, len(centroids), k - len(centroids))]
+        jitter = 1e-3 * rng.standard_normal(extra.shape).astype(numpy.float32)
+        centroids = numpy.concatenate([centroids, extra + jitter])
+
+    for _ in range(n_iter):
+        assignment = _l2(X, centroids).argmin(axis=1)
+        counts = numpy.bincount(assignment, minlength=k)
+        sums = numpy.zeros_like(centroids)
+        numpy.add.at(sums, assignment, X)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # re-seed empty clusters from random points
+        centroids[empty] = X[rng.choice(len(X), empty.sum())]
+
+    return centroids
+
+
+if __name__ == "__main__":
+    data, queries, labels = load_sift()
+
+    index = IVFPQIndex(128, distance="l2", nlist=64, m=16, nprobe=8)
+    index.add(data)
+
+    D, I = index.search(queries, k=1)
+
+    print(f"Recall@1: {evaluate(labels, I[:, 0])}")
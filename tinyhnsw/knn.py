@@ -1,5 +1,7 @@
 from __future__ import annotations
-from tinyhnsw.index import Index
+from tinyhnsw.index import Index, _as_batch
+from tinyhnsw.distance import DistanceEngine
+from concurrent.futures import ThreadPoolExecutor
 from tinyhnsw.utils import load_sift, evaluate
 
 import numpy
@@ -10,34 +12,189 @@ class FullNNIndex(Index):
     A full nearest-neighbors index. It uses cosine similarity as
     the default similarity measure -- we can swap it with inner product
     if we make the assumption that the matrices are pre-normed.
+
+    Search streams the stored vectors in tiles of `tile_size` rows and keeps a
+    running top-k per query, so peak memory is bounded by the tile size
+    rather than the size of the index (see `blocked_search`).
     """
 
-    def __init__(self, d: int, distance: str = "cosine") -> None:
+    def __init__(
+        self,
+        d: int,
+        distance: str = "cosine",
+        tile_size: int = 16384,
+        query_block: int = 1024,
+    ) -> None:
         super().__init__(d, distance)
 
+        self.tile_size = tile_size
+        self.query_block = query_block
+
+    def get_state(self) -> tuple[dict, dict[str, numpy.ndarray]]:
+        meta, arrays = super().get_state()
+        meta.update({"tile_size": self.tile_size, "query_block": self.query_block})
+        return meta, arrays
+
+    def set_state(self, meta: dict, arrays: dict[str, numpy.ndarray]) -> None:
+        super().set_state(meta, arrays)
+
+        self.tile_size = meta["tile_size"]
+        self.query_block = meta["query_block"]
+
     def search(
-        self, query: numpy.ndarray, k: int
+        self, query: numpy.ndarray, k: int, n_workers: int = 1
     ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        query = self.engine.prepare(_as_batch(query))
+
+        D = numpy.full((len(query), k), numpy.inf, dtype=numpy.float32)
+        I = numpy.full((len(query), k), -1, dtype=numpy.int64)
+
+        if not self.is_trained:
+            return D, I
+
+        D_k, I_k = blocked_search(
+            self.engine,
+            query,
+            self.vectors,
+            k,
+            tile_size=self.tile_size,
+            query_block=self.query_block,
+            n_workers=n_workers,
+        )
+        D[:, : D_k.shape[1]] = self.engine.finalize(D_k)
+        I[:, : I_k.shape[1]] = I_k
+
+        return D, self._external(I)
+
+    def range_search(
+        self, query: numpy.ndarray, radius: float, n_workers: int = 1
+    ) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        query = self.engine.prepare(_as_batch(query))
+
         if not self.is_trained:
-            return ([[]], [[]])
+            lims = numpy.zeros(len(query) + 1, dtype=numpy.int64)
+            return lims, numpy.empty(0, numpy.float32), numpy.empty(0, numpy.int64)
+
+        lims, D, I = blocked_range_search(
+            self.engine,
+            query,
+            self.vectors,
+            self.engine.threshold(radius),
+            tile_size=self.tile_size,
+            query_block=self.query_block,
+            n_workers=n_workers,
+        )
+        return lims, self.engine.finalize(D), self._external(I)
+
+
+def blocked_search(
+    engine: DistanceEngine,
+    Q: numpy.ndarray,
+    X: numpy.ndarray,
+    k: int,
+    tile_size: int = 16384,
+    query_block: int = 1024,
+    n_workers: int = 1,
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Exact top-k of the prepared queries `Q` against the stored vectors `X`,
+    in internal distances, sorted. `X` is streamed in tiles of `tile_size` rows
+    (each tile is read once, which suits memory-mapped data), and each tile is
+    compared to `query_block` queries at a time, so no more than
+    `n_workers * query_block * tile_size` distances exist at once. Tiles are
+    spread across `n_workers` threads; NumPy releases the GIL in the matrix
+    products. Returns (n, min(k, len(X))) arrays.
+    """
+    k = min(k, len(X))
+    tiles = range(0, len(X), tile_size)
+
+    def search_tile(a: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        b = min(a + tile_size, len(X))
+        k_tile = min(k, b - a)
+        D = numpy.empty((len(Q), k_tile), dtype=numpy.float32)
+        I = numpy.empty((len(Q), k_tile), dtype=numpy.int64)
 
-        similarity = self.f_distance(self.vectors, query)
-        indices = similarity.argsort(axis=0)[:k].T
-        scores = numpy.array([similarity[indices[i]] for i in range(len(indices))])
+        for q in range(0, len(Q), query_block):
+            D_t = engine.distances(Q[q : q + query_block], X[a:b], slice(a, b))
+            I_t = _topk(D_t, k_tile)
+            D[q : q + query_block] = numpy.take_along_axis(D_t, I_t, axis=1)
+            I[q : q + query_block] = I_t + a
 
-        return scores, indices
+        return D, I
+
+    D_best = numpy.empty((len(Q), 0), dtype=numpy.float32)
+    I_best = numpy.empty((len(Q), 0), dtype=numpy.int64)
+
+    with ThreadPoolExecutor(max(1, n_workers)) as pool:
+        for D_t, I_t in pool.map(search_tile, tiles):
+            D_all = numpy.concatenate([D_best, D_t], axis=1)
+            I_all = numpy.concatenate([I_best, I_t], axis=1)
+            top = _topk(D_all, min(k, D_all.shape[1]))
+            D_best = numpy.take_along_axis(D_all, top, axis=1)
+            I_best = numpy.take_along_axis(I_all, top, axis=1)
+
+    order = numpy.argsort(D_best, axis=1, kind="stable")
+    return (
+        numpy.take_along_axis(D_best, order, axis=1),
+        numpy.take_along_axis(I_best, order, axis=1),
+    )
+
+
+def blocked_range_search(
+    engine: DistanceEngine,
+    Q: numpy.ndarray,
+    X: numpy.ndarray,
+    radius: float,
+    tile_size: int = 16384,
+    query_block: int = 1024,
+    n_workers: int = 1,
+) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    All the stored vectors within the internal distance `radius` of each of
+    the prepared queries `Q`, tiled like `blocked_search`. Returns CSR-style
+    (lims, D, I) arrays, sorted by distance within each query.
+    """
+
+    def search_tile(a: int) -> tuple[numpy.ndarray, ...]:
+        b = min(a + tile_size, len(X))
+        Q_idx, D, I = [], [], []
+
+        for q in range(0, len(Q), query_block):
+            D_t = engine.distances(Q[q : q + query_block], X[a:b], slice(a, b))
+            rows, cols = numpy.nonzero(D_t <= radius)
+            Q_idx.append(rows + q)
+            D.append(D_t[rows, cols])
+            I.append(cols + a)
+
+        return numpy.concatenate(Q_idx), numpy.concatenate(D), numpy.concatenate(I)
+
+    with ThreadPoolExecutor(max(1, n_workers)) as pool:
+        tiles = list(pool.map(search_tile, range(0, len(X), tile_size)))
+
+    Q_idx, D, I = (numpy.concatenate(parts) for parts in zip(*tiles))
+
+    order = numpy.lexsort((D, Q_idx))
+    lims = numpy.zeros(len(Q) + 1, dtype=numpy.int64)
+    lims[1:] = numpy.cumsum(numpy.bincount(Q_idx, minlength=len(Q)))
+
+    return lims, D[order], I[order]
+
+
+def _topk(D: numpy.ndarray, k: int) -> numpy.ndarray:
+    """
+    Column indices of the `k` smallest entries of each row, unordered.
+    """
+    if k >= D.shape[1]:
+        return numpy.broadcast_to(numpy.arange(D.shape[1]), D.shape).copy()
+    return numpy.argpartition(D, k - 1, axis=1)[:, :k]
 
 
 if __name__ == "__main__":
     data, queries, labels = load_sift()
 
-    index = FullNNIndex(128, distance='l2')
+    index = FullNNIndex(128, distance="l2")
     index.add(data)
 
-    I = []
-    for q in queries:
-        q = numpy.expand_dims(q, axis=0)
-        D_q, I_q = index.search(q, k=1)
-        I.append(I_q[0])
+    D, I = index.search(queries, k=1)
 
-    print(f"Recall@1: {evaluate(labels, numpy.array(I).squeeze())}")
+    print(f"Recall@1: {evaluate(labels, I[:, 0])}")
@@ -0,0 +1,150 @@
+"""
+Compressed codes for graph traversal. A quantizer keeps a compact copy of
+every stored vector (int8 scalar codes, or 1-bit binary codes) and computes
+approximate distances against it, so that the hops through the graph only
+touch the codes. The full-precision vectors are kept separately by the index
+(memory-mapped, if the index was loaded from a file) and are only read to
+rerank the final candidates exactly.
+"""
+
+from __future__ import annotations
+from tinyhnsw.distance import DistanceEngine, L2Distance
+from tinyhnsw.storage import VectorStorage
+
+import numpy
+
+
+class Quantizer:
+    def __init__(self, d: int, engine: DistanceEngine) -> None:
+        self.d = d
+        self.engine = engine
+        self.is_trained = False
+
+    def train(self, X: numpy.ndarray) -> None:
+        raise NotImplementedError()
+
+    def add(self, X: numpy.ndarray) -> None:
+        """
+        Encodes `X` (vectors already prepared by the distance engine) and
+        appends the codes.
+        """
+        self.codes.append(self.encode(X))
+
+    def fit(self, X: numpy.ndarray) -> None:
+        """
+        Trains on all of `X` and replaces every code with its encoding.
+        """
+        self.train(X)
+        self.codes = VectorStorage.from_array(self.encode(X))
+
+    def encode(self, X: numpy.ndarray) -> numpy.ndarray:
+        raise NotImplementedError()
+
+    def update(self, rows: numpy.ndarray, X: numpy.ndarray) -> None:
+        """
+        Re-encodes the vectors at `rows`, which `X` replaces.
+        """
+        self.codes.data[rows] = self.encode(X)
+
+    def compact(self, keep: numpy.ndarray) -> None:
+        """
+        Drops the codes of the vectors not in the boolean mask `keep`.
+        """
+        self.codes = VectorStorage.from_array(self.codes.view()[keep])
+
+    def distances(self, q: numpy.ndarray, nodes: list[int]) -> numpy.ndarray:
+        """
+        Approximate distances from the prepared query `q` to `nodes`. They are
+        only meant to order candidates during traversal.
+        """
+        raise NotImplementedError()
+
+    def get_state(self) -> dict[str, numpy.ndarray]:
+        raise NotImplementedError()
+
+    def set_state(self, arrays: dict[str, numpy.ndarray]) -> None:
+        raise NotImplementedError()
+
+
+class ScalarQuantizer(Quantizer):
+    """
+    int8 scalar quantization: every dimension is mapped affinely from the
+    [min, max] range seen in training onto 256 levels. 4x smaller than float32.
+    """
+
+    def __init__(self, d: int, engine: DistanceEngine) -> None:
+        super().__init__(d, engine)
+        self.codes = VectorStorage(d, dtype=numpy.uint8)
+        self.vmin = numpy.zeros(d, dtype=numpy.float32)
+        self.scale = numpy.ones(d, dtype=numpy.float32)
+
+    def train(self, X: numpy.ndarray) -> None:
+        self.vmin = X.min(axis=0).astype(numpy.float32)
+        vmax = X.max(axis=0).astype(numpy.float32)
+        self.scale = numpy.maximum(vmax - self.vmin, 1e-12) / 255.0
+        self.is_trained = True
+
+    def encode(self, X: numpy.ndarray) -> numpy.ndarray:
+        codes = numpy.rint((X - self.vmin) / self.scale)
+        return numpy.clip(codes, 0, 255).astype(numpy.uint8)
+
+    def decode(self, codes: numpy.ndarray) -> numpy.ndarray:
+        return codes.astype(numpy.float32) * self.scale + self.vmin
+
+    def distances(self, q: numpy.ndarray, nodes: list[int]) -> numpy.ndarray:
+        X = self.decode(self.codes.data[nodes])
+
+        if isinstance(self.engine, L2Distance):
+            X -= q
+            return (X * X).sum(axis=1)
+
+        return 1.0 - numpy.dot(X, q)
+
+    def get_state(self) -> dict[str, numpy.ndarray]:
+        return {"codes": self.codes.view(), "vmin": self.vmin, "scale": self.scale}
+
+    def set_state(self, arrays: dict[str, numpy.ndarray]) -> None:
+        self.codes = VectorStorage.from_array(arrays["codes"])
+        self.vmin = numpy.asarray(arrays["vmin"])
+        self.scale = numpy.asarray(arrays["scale"])
+        self.is_trained = True
+
+
+class BinaryQuantizer(Quantizer):
+    """
+    1-bit codes: one sign bit per dimension (after centering on the training
+    mean), packed 8 to a byte, compared by Hamming distance. 32x smaller than
+    float32, and a good proxy for angular distance.
+    """
+
+    _POPCOUNT = numpy.array([bin(i).count("1") for i in range(256)], dtype=numpy.uint8)
+
+    def __init__(self, d: int, engine: DistanceEngine) -> None:
+        super().__init__(d, engine)
+        self.codes = VectorStorage((d + 7) // 8, dtype=numpy.uint8)
+        self.mean = numpy.zeros(d, dtype=numpy.float32)
+
+    def train(self, X: numpy.ndarray) -> None:
+        self.mean = X.mean(axis=0).astype(numpy.float32)
+        self.is_trained = True
+
+    def encode(self, X: numpy.ndarray) -> numpy.ndarray:
+        return numpy.packbits(X > self.mean, axis=-1)
+
+    def distances(self, q: numpy.ndarray, nodes: list[int]) -> numpy.ndarray:
+        x = numpy.bitwise_xor(self.codes.data[nodes], self.encode(q))
+        return self._POPCOUNT[x].sum(axis=1, dtype=numpy.float32)
+
+    def get_state(self) -> dict[str, numpy.ndarray]:
+        return {"codes": self.codes.view(), "mean": self.mean}
+
+    def set_state(self, arrays: dict[str, numpy.ndarray]) -> None:
+        self.codes = VectorStorage.from_array(arrays["codes"])
+        self.mean = numpy.asarray(arrays["mean"])
+        self.is_trained = True
+
+
+QUANTIZERS = {
+    "int8": ScalarQuantizer,
+    "binary": BinaryQuantizer,
+}
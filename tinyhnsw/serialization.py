@@ -0,0 +1,103 @@
+"""
+The on-disk index format. A file is laid out as:
+
+    magic (8 bytes) | version (uint32) | header length (uint64) | header (JSON)
+    | array block | array block | ...
+
+The JSON header records the index type, its scalar configuration, and for each
+array its dtype, shape and byte offset. Array blocks are raw little-endian
+data aligned to 64 bytes, so they can be opened with `numpy.memmap`: loading is
+zero-copy, pages are read lazily, and several processes mapping the same file
+share its pages.
+"""
+
+from __future__ import annotations
+
+import json
+import numpy
+import struct
+
+
+MAGIC = b"TINYHNSW"
+VERSION = 1
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct("<8sIQ")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_index(
+    file: str, kind: str, meta: dict, arrays: dict[str, numpy.ndarray]
+) -> None:
+    arrays = {
+        name: numpy.ascontiguousarray(a, dtype=numpy.dtype(a.dtype).newbyteorder("<"))
+        for name, a in arrays.items()
+    }
+
+    # the header stores absolute offsets, which depend on the header's own
+    # length, so lay the blocks out relative to the start of the data section
+    blocks, offset = {}, 0
+    for name, a in arrays.items():
+        offset = _align(offset)
+        blocks[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+        offset += a.nbytes
+
+    header = {"type": kind, "meta": meta, "arrays": blocks}
+    encoded = json.dumps(header).encode("utf-8")
+    start = _align(_PREAMBLE.size + len(encoded))
+
+    with open(file, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+
+        for name, a in arrays.items():
+            f.seek(start + blocks[name]["offset"])
+            f.write(a.tobytes())
+
+
+def is_index_file(file: str) -> bool:
+    with open(file, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_index(
+    file: str, mmap_mode: str | None = "c"
+) -> tuple[str, dict, dict[str, numpy.ndarray]]:
+    """
+    Reads an index file, returning (type, meta, arrays). With `mmap_mode` set,
+    arrays are memory-mapped: "r" is strictly read-only, "c" (the default) is
+    copy-on-write, so the index can still be modified in memory without
+    touching the file. With `mmap_mode=None` the arrays are read into memory.
+    """
+    with open(file, "rb") as f:
+        magic, version, length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{file} is not a tinyhnsw index file")
+        if version > VERSION:
+            raise ValueError(
+                f"{file} uses format version {version}, but only versions up to "
+                f"{VERSION} are supported"
+            )
+        header = json.loads(f.read(length).decode("utf-8"))
+
+    start = _align(_PREAMBLE.size + length)
+    arrays = {}
+
+    for name, block in header["arrays"].items():
+        dtype = numpy.dtype(block["dtype"])
+        shape = tuple(block["shape"])
+        offset = start + block["offset"]
+
+        if mmap_mode is None or numpy.prod(shape) == 0:
+            count = int(numpy.prod(shape))
+            a = numpy.fromfile(file, dtype=dtype, count=count, offset=offset)
+            arrays[name] = a.reshape(shape)
+        else:
+            arrays[name] = numpy.memmap(
+                file, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape
+            )
+
+    return header["type"], header["meta"], arrays
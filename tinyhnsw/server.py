@@ -0,0 +1,374 @@
+"""
+An asyncio query server. Concurrent requests are collected into micro-batches
+(waiting at most `max_wait` for a batch to fill up), which are searched on a
+thread pool against one shared index:
+
+    python -m tinyhnsw.server index.bin --port 7000
+    python -m tinyhnsw.server index.bin --unix /tmp/tinyhnsw.sock
+
+The protocol is newline-delimited JSON over TCP or a Unix socket. A request
+holds an "id" (echoed back in its response), a "vector", and optionally "k"
+and a "timeout" in seconds; a response holds the results or an "error":
+
+    {"id": 1, "vector": [0.1, 0.2, ...], "k": 10, "timeout": 0.5}
+    {"id": 1, "distances": [...], "ids": [...]}
+    {"id": 2, "error": "overloaded"}
+
+Requests on a connection are pipelined: responses are sent as soon as they're
+ready, so they can come back out of order. Once `max_pending` requests are
+queued, new ones are rejected as "overloaded" rather than queued without
+bound, and requests that can't be answered within their timeout fail with
+"timeout". `QueryClient` speaks the protocol from Python.
+"""
+
+from __future__ import annotations
+from tinyhnsw.index import Index
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import argparse
+import asyncio
+import itertools
+import json
+import numpy
+
+
+class QueryError(Exception):
+    pass
+
+
+class Overloaded(QueryError):
+    pass
+
+
+@dataclass
+class ServerConfig:
+    max_batch: int = 64
+    # how long the first request of a batch waits for others, in seconds
+    max_wait: float = 0.002
+    # threads searching batches; batching stops at this many in flight
+    n_workers: int = 4
+    max_pending: int = 1024
+    # default per-request timeout, in seconds
+    timeout: float = 5.0
+    # largest k a request can ask for (a batch is searched at its largest k)
+    max_k: int = 1024
+
+
+@dataclass
+class _Request:
+    q: numpy.ndarray
+    k: int
+    future: asyncio.Future
+    deadline: float
+
+
+class QueryServer:
+    def __init__(self, index: Index, config: ServerConfig = ServerConfig()) -> None:
+        self.index = index
+        self.config = config
+        self.counters = Counter()
+        self.server = None
+        self._queue = None
+        self._executor = None
+        self._batcher_task = None
+        self._tasks = set()
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0, path: str | None = None
+    ) -> QueryServer:
+        """
+        Starts serving on `host:port` (port 0 picks a free one, see `address`),
+        or on the Unix socket `path` if it's given.
+        """
+        self._queue = asyncio.Queue(self.config.max_pending)
+        self._executor = ThreadPoolExecutor(self.config.n_workers)
+        self._batcher_task = asyncio.create_task(self._batcher())
+
+        if path is not None:
+            self.server = await asyncio.start_unix_server(
+                self._handle, path, limit=2**24
+            )
+        else:
+            self.server = await asyncio.start_server(
+                self._handle, host, port, limit=2**24
+            )
+        return self
+
+    @property
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def serve_forever(self) -> None:
+        await self.server.serve_forever()
+
+    async def close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+        self._batcher_task.cancel()
+        await asyncio.gather(self._batcher_task, *self._tasks, return_exceptions=True)
+        self._executor.shutdown()
+
+    async def __aenter__(self) -> QueryServer:
+        return self if self.server is not None else await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def search(
+        self, q: numpy.ndarray, k: int = 10, timeout: float | None = None
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Queues a single (d,) query for the next batch and waits for its (k,)
+        distances and ids. Raises `QueryError` for a malformed query or a `k`
+        outside [1, `config.max_k`], `Overloaded` if the queue is full, and
+        `asyncio.TimeoutError` if there's no answer within `timeout` seconds
+        (`config.timeout` by default).
+        """
+        q = numpy.asarray(q, dtype=numpy.float32)
+        if q.shape != (self.index.d,):
+            raise QueryError(f"expected a vector of {self.index.d} values")
+        if not 1 <= k <= self.config.max_k:
+            raise QueryError(f"k must be between 1 and {self.config.max_k}")
+
+        loop = asyncio.get_running_loop()
+        timeout = self.config.timeout if timeout is None else timeout
+        request = _Request(q, k, loop.create_future(), loop.time() + timeout)
+        self.counters["requests"] += 1
+
+        try:
+            self._queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise Overloaded("overloaded") from None
+
+        try:
+            return await asyncio.wait_for(request.future, timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise
+
+    async def _batcher(self) -> None:
+        """
+        Takes a batch off the queue: everything that arrives within `max_wait`
+        of its first request, up to `max_batch`. When all the workers are busy,
+        requests keep queuing up while it waits for one, and are added to the
+        batch, so batches grow with the load.
+        """
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.config.n_workers)
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.config.max_wait
+            while len(batch) < self.config.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await slots.acquire()
+            while len(batch) < self.config.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _dispatch(self, batch: list[_Request]) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # requests that timed out while queued have been cancelled by wait_for
+        live = [r for r in batch if not r.future.done() and r.deadline > now]
+        if len(live) == 0:
+            return
+
+        self.counters["batches"] += 1
+        self.counters["batched"] += len(live)
+        k = max(r.k for r in live)
+        Q = numpy.stack([r.q for r in live])
+
+        try:
+            D, I = await loop.run_in_executor(self._executor, self.index.search, Q, k)
+        except Exception as e:
+            for r in live:
+                if not r.future.done():
+                    r.future.set_exception(e)
+            return
+
+        for i, r in enumerate(live):
+            if not r.future.done():
+                r.future.set_result((D[i, : r.k], I[i, : r.k]))
+
+    def summary(self) -> dict:
+        summary = dict(self.counters)
+        summary["mean_batch"] = self.counters["batched"] / max(
+            self.counters["batches"], 1
+        )
+        return summary
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            async for line in reader:
+                task = asyncio.create_task(self._respond(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def _respond(
+        self, line: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock
+    ) -> None:
+        response = {}
+        try:
+            request = json.loads(line)
+            response["id"] = request.get("id")
+            D, I = await self.search(
+                request["vector"], int(request.get("k", 10)), request.get("timeout")
+            )
+            response["distances"] = D.tolist()
+            response["ids"] = I.tolist()
+        except Overloaded:
+            response["error"] = "overloaded"
+        except asyncio.TimeoutError:
+            response["error"] = "timeout"
+        except Exception as e:
+            response["error"] = f"{type(e).__name__}: {e}"
+
+        async with lock:
+            writer.write(json.dumps(response).encode("utf-8") + b"\n")
+            await writer.drain()
+
+
+class QueryClient:
+    """
+    Sends pipelined requests to a `QueryServer` over one connection:
+
+        client = await QueryClient.connect(port=7000)
+        D, I = await client.search(q, k=10)
+    """
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self._ids = itertools.count()
+        self._waiting: dict[int, asyncio.Future] = {}
+        self._reader_task = asyncio.create_task(self._read())
+
+    @classmethod
+    async def connect(
+        cls, host: str = "127.0.0.1", port: int | None = None, path: str | None = None
+    ) -> QueryClient:
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path, limit=2**24)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=2**24)
+        return cls(reader, writer)
+
+    async def _read(self) -> None:
+        try:
+            async for line in self.reader:
+                response = json.loads(line)
+                future = self._waiting.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            # once this task is done, `search` refuses new requests itself
+            waiting, self._waiting = self._waiting, {}
+            for future in waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection closed"))
+
+    async def search(
+        self, q: numpy.ndarray, k: int = 10, timeout: float | None = None
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        See `QueryServer.search`; server-side errors are raised as the same
+        exceptions, or as `QueryError`. Raises `ConnectionError` once the
+        server has closed the connection.
+        """
+        if self._reader_task.done():
+            raise ConnectionError("connection closed")
+
+        request_id = next(self._ids)
+        request = {"id": request_id, "vector": numpy.asarray(q).tolist(), "k": k}
+        if timeout is not None:
+            request["timeout"] = timeout
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        self.writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        await self.writer.drain()
+
+        response = await future
+        if response.get("error") == "overloaded":
+            raise Overloaded("overloaded")
+        if response.get("error") == "timeout":
+            raise asyncio.TimeoutError()
+        if "error" in response:
+            raise QueryError(response["error"])
+
+        D = numpy.array(response["distances"], dtype=numpy.float32)
+        I = numpy.array(response["ids"], dtype=numpy.int64)
+        return D, I
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._reader_task.cancel()
+
+
+async def serve(
+    index: Index,
+    config: ServerConfig,
+    host: str = "127.0.0.1",
+    port: int = 7000,
+    path: str | None = None,
+) -> None:
+    async with await QueryServer(index, config).start(host, port, path) as server:
+        print(f"serving {type(index).__name__} on {path or server.address}")
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serves an index over a socket")
+    parser.add_argument("index", help="an index file written by `save`")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--unix", metavar="PATH", help="serve on a Unix socket")
+    parser.add_argument("--max-batch", type=int, default=ServerConfig.max_batch)
+    parser.add_argument(
+        "--max-wait-ms", type=float, default=ServerConfig.max_wait * 1e3
+    )
+    parser.add_argument("--workers", type=int, default=ServerConfig.n_workers)
+    parser.add_argument("--max-pending", type=int, default=ServerConfig.max_pending)
+    parser.add_argument("--timeout", type=float, default=ServerConfig.timeout)
+    parser.add_argument("--max-k", type=int, default=ServerConfig.max_k)
+    args = parser.parse_args()
+
+    config = ServerConfig(
+        max_batch=args.max_batch,
+        max_wait=args.max_wait_ms / 1e3,
+        n_workers=args.workers,
+        max_pending=args.max_pending,
+        timeout=args.timeout,
+        max_k=args.max_k,
+    )
+    index = Index.from_file(args.index)
+    asyncio.run(serve(index, config, args.host, args.port, args.unix))
+
+
+if __name__ == "__main__":
+    main()
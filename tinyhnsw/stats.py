@@ -0,0 +1,155 @@
+"""
+Search instrumentation. Layer searches always count the work they do in a few
+local integers, which costs next to nothing; the counts are only turned into
+a `SearchStats` record when a search asks for one:
+
+    D, I, stats = index.search(queries, k=10, return_stats=True)
+
+or for every search, when a `SearchMonitor` is attached to the index:
+
+    index.monitor = SearchMonitor()
+    index.monitor.add_hook(lambda stats: print(stats.time))
+    ...
+    index.monitor.summary()
+"""
+
+from __future__ import annotations
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy
+import threading
+
+
+@dataclass
+class SearchStats:
+    """
+    The work done by one query. `hops` (nodes expanded) and `layer_time`
+    (seconds) are keyed by layer; `distances` includes the exact reranking of
+    quantized candidates. `stop` is why the layer 0 search ended and `ef` the
+    beam width it ended with (see `search_layer_adaptive`).
+    """
+
+    distances: int = 0
+    visited: int = 0
+    heap_ops: int = 0
+    hops: dict[int, int] = field(default_factory=dict)
+    layer_time: dict[int, float] = field(default_factory=dict)
+    time: float = 0.0
+    stop: str = ""
+    ef: int = 0
+
+    def record_layer(
+        self,
+        lc: int,
+        hops: int,
+        visited: int,
+        heap_ops: int,
+        elapsed: float,
+        stop: str = "",
+        ef: int = 0,
+    ) -> None:
+        # layers are searched top-down, so layer 0 has the last word
+        self.stop = stop
+        self.ef = ef
+        self.distances += visited
+        self.visited += visited
+        self.heap_ops += heap_ops
+        self.hops[lc] = self.hops.get(lc, 0) + hops
+        self.layer_time[lc] = self.layer_time.get(lc, 0.0) + elapsed
+
+
+class Histogram:
+    """
+    A histogram with power-of-two buckets: bucket `i` counts the values in
+    [2^(i-1), 2^i), and bucket 0 the values below 1. Recording is O(1) and the
+    memory is fixed, at the cost of ~2x resolution on percentiles.
+    """
+
+    def __init__(self, n_buckets: int = 64) -> None:
+        self.counts = numpy.zeros(n_buckets, dtype=numpy.int64)
+        self.total = 0.0
+
+    def record(self, value: float) -> None:
+        bucket = 0 if value < 1 else min(int(value).bit_length(), len(self.counts) - 1)
+        self.counts[bucket] += 1
+        self.total += value
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def percentile(self, p: float) -> float:
+        """
+        The (exclusive) upper bound of the bucket holding the `p`-th percentile.
+        """
+        if self.count == 0:
+            return 0.0
+        bucket = int(
+            numpy.searchsorted(numpy.cumsum(self.counts), p / 100 * self.count)
+        )
+        return float(2**bucket)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / max(self.count, 1),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class SearchMonitor:
+    """
+    Aggregates the `SearchStats` of every search on the index it's attached to
+    (as `index.monitor`) into histograms, and forwards each record to hooks,
+    e.g. to export them to a metrics system. Times are recorded in
+    microseconds. Thread-safe; hooks run on the searching thread.
+    """
+
+    METRICS = ["distances", "visited", "heap_ops", "hops", "time_us"]
+
+    def __init__(self) -> None:
+        self.hooks: list[Callable[[SearchStats], None]] = []
+        self.histograms = {name: Histogram() for name in self.METRICS}
+        self.layer_time_us: dict[int, Histogram] = {}
+        self.stops: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # process pool workers get a copy of the index; records are only kept
+        # by the parent, which receives the stats of every query
+        return {}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()
+
+    def add_hook(self, hook: Callable[[SearchStats], None]) -> None:
+        self.hooks.append(hook)
+
+    def record(self, stats: SearchStats) -> None:
+        with self._lock:
+            self.histograms["distances"].record(stats.distances)
+            self.histograms["visited"].record(stats.visited)
+            self.histograms["heap_ops"].record(stats.heap_ops)
+            self.histograms["hops"].record(sum(stats.hops.values()))
+            self.histograms["time_us"].record(stats.time * 1e6)
+            self.stops[stats.stop] += 1
+            for lc, elapsed in stats.layer_time.items():
+                if lc not in self.layer_time_us:
+                    self.layer_time_us[lc] = Histogram()
+                self.layer_time_us[lc].record(elapsed * 1e6)
+
+        for hook in self.hooks:
+            hook(stats)
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = {name: h.summary() for name, h in self.histograms.items()}
+            summary["layer_time_us"] = {
+                lc: h.summary() for lc, h in sorted(self.layer_time_us.items())
+            }
+            summary["stops"] = dict(self.stops)
+        return summary
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import numpy
+
+
+class VectorStorage:
+    """
+    A growable arena of vectors. Rows live in one contiguous buffer whose
+    capacity doubles when it fills up, so appending in small batches is
+    amortized O(1) per row instead of copying the whole matrix every time.
+
+    `d` is the width of each row; `d=None` stores one scalar per row (e.g. a
+    cached norm).
+    """
+
+    def __init__(self, d: int | None, dtype: numpy.dtype = numpy.float32) -> None:
+        self.d = d
+        self.size = 0
+        self.data = numpy.empty(self._shape(0), dtype=dtype)
+
+    @classmethod
+    def from_array(cls, data: numpy.ndarray) -> VectorStorage:
+        """
+        Wraps an existing array (e.g. a memory-mapped block) without copying it.
+        It is only copied into a new buffer if the storage needs to grow.
+        """
+        storage = cls(data.shape[1] if len(data.shape) > 1 else None, data.dtype)
+        storage.data = data
+        storage.size = len(data)
+        return storage
+
+    def _shape(self, n: int) -> tuple[int, ...]:
+        return (n,) if self.d is None else (n, self.d)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def capacity(self) -> int:
+        return len(self.data)
+
+    def reserve(self, n: int) -> None:
+        """
+        Makes sure the arena can hold at least `n` rows without reallocating.
+        """
+        if n <= self.capacity:
+            return
+
+        data = numpy.empty(self._shape(n), dtype=self.data.dtype)
+        data[: self.size] = self.data[: self.size]
+        self.data = data
+
+    def append(self, X: numpy.ndarray) -> None:
+        n = self.size + len(X)
+        if n > self.capacity:
+            self.reserve(max(n, 2 * self.capacity))
+
+        self.data[self.size : n] = X
+        self.size = n
+
+    def view(self) -> numpy.ndarray:
+        """
+        A contiguous view of the stored rows (no copy).
+        """
+        return self.data[: self.size]
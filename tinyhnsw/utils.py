@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import os
 import numpy
 import shutil
@@ -6,11 +8,16 @@ import urllib.request as request
 
 from contextlib import closing
 
-
 DATA_PATH = os.path.join("data", "siftsmall", "siftsmall_base.fvecs")
 QUERY_PATH = os.path.join("data", "siftsmall", "siftsmall_query.fvecs")
 LABEL_PATH = os.path.join("data", "siftsmall", "siftsmall_groundtruth.ivecs")
 
+_VECS_DTYPES = {
+    ".fvecs": numpy.dtype("float32"),
+    ".ivecs": numpy.dtype("int32"),
+    ".bvecs": numpy.dtype("uint8"),
+}
+
 
 def download_sift() -> None:
     """
@@ -29,10 +36,26 @@ def download_sift() -> None:
     tar.extractall("data")
 
 
+def mmap_vecs(path: str) -> numpy.ndarray:
+    """
+    Memory-maps a .fvecs, .ivecs or .bvecs file as an (n, d) array, without
+    reading or copying it. Every row on disk is an int32 dimension followed by
+    d values (float32, int32 or uint8), so the result is a strided view that
+    skips the dimension column.
+    """
+    dtype = _VECS_DTYPES[os.path.splitext(path)[1]]
+    d = int(numpy.fromfile(path, dtype="int32", count=1)[0])
+
+    # express each row in units of the value dtype, dimension header included
+    header = 4 // dtype.itemsize
+    rows = numpy.memmap(path, dtype=dtype, mode="r")
+    return rows.reshape(-1, header + d)[:, header:]
+
+
 def read_vecs(path: str, ivecs: bool = False) -> numpy.ndarray:
-    a = numpy.fromfile(path, dtype="int32")
-    d = a[0]
-    matrix = a.reshape(-1, d + 1)[:, 1:].copy()
+    matrix = numpy.memmap(path, dtype="int32", mode="r")
+    d = matrix[0]
+    matrix = matrix.reshape(-1, d + 1)[:, 1:]
 
     if not ivecs:
         matrix = matrix.view("float32")
@@ -40,13 +63,48 @@ def read_vecs(path: str, ivecs: bool = False) -> numpy.ndarray:
     return matrix
 
 
-def evaluate(gold: numpy.ndarray, predictions: numpy.ndarray) -> float:
+def write_vecs(path: str, matrix: numpy.ndarray) -> None:
     """
-    Compute Recall@1;
-        - gold: array of shape (k,) -- integers
-        - predictions: array of shape (k,) -- integers
+    Writes an (n, d) matrix in the .fvecs/.ivecs/.bvecs format given by the
+    extension of `path`.
     """
-    return sum(gold==predictions)
+    dtype = _VECS_DTYPES[os.path.splitext(path)[1]]
+    header = 4 // dtype.itemsize
+    n, d = matrix.shape
+
+    rows = numpy.empty((n, header + d), dtype=dtype)
+    rows[:, :header] = numpy.array([d], dtype="int32").view(dtype)
+    rows[:, header:] = matrix
+    rows.tofile(path)
+
+
+def evaluate(
+    gold: numpy.ndarray, predictions: numpy.ndarray, k: int | None = None
+) -> float:
+    """
+    Compute Recall@k, the fraction of the true k nearest neighbors found among
+    the first k predictions, averaged over all queries;
+        - gold: array of shape (n,) or (n, k_gold) -- true neighbor ids, nearest
+          first, padded with -1 when a query has fewer than k_gold
+        - predictions: array of shape (n,) or (n, k') -- integers
+        - k: defaults to k_gold (so Recall@1 for a (n,) gold array)
+    """
+    gold = numpy.asarray(gold)
+    predictions = numpy.asarray(predictions)
+    if gold.ndim == 1:
+        gold = gold[:, None]
+    if predictions.ndim == 1:
+        predictions = predictions[:, None]
+
+    k = k or gold.shape[1]
+    gold, predictions = gold[:, :k], predictions[:, :k]
+
+    found = numpy.zeros(gold.shape, dtype=bool)
+    for j in range(predictions.shape[1]):
+        found |= predictions[:, j : j + 1] == gold
+
+    relevant = gold >= 0
+    return float((found & relevant).sum() / max(relevant.sum(), 1))
 
 
 def load_sift() -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
@@ -60,5 +118,5 @@ def load_sift() -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
     )
 
 
-if __name__ == '__main__':
-    load_sift()
\ No newline at end of file
+if __name__ == "__main__":
+    load_sift()
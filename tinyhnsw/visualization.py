@@ -1,5 +1,5 @@
 from tinyhnsw import HNSWIndex
-from tinyhnsw.hnsw import DEFAULT_CONFIG
+from tinyhnsw.hnsw import DEFAULT_CONFIG, HNSWLayer
 from typing import Optional, Dict, Tuple
 
 import math
@@ -12,6 +12,23 @@ import matplotlib.pyplot as plt
 Layout = Dict[int, Tuple[float, float]]
 
 
+def layer_to_graph(layer: HNSWLayer) -> networkx.Graph:
+    """
+    Builds an (undirected) networkx graph from the array-backed adjacency of an
+    HNSW layer. This is only done on demand, for plotting.
+    """
+    G = networkx.Graph()
+    G.add_nodes_from(layer.nodes().tolist())
+
+    for node in layer.nodes().tolist():
+        D, W = layer.neighborhood(node)
+        G.add_edges_from(
+            [(node, e, {"distance": float(d)}) for d, e in zip(D.tolist(), W.tolist())]
+        )
+
+    return G
+
+
 def visualize_hnsw_index(index: HNSWIndex, layout: Optional[Layout] = None) -> None:
     """
     Use this to visualize the different layers of HNSW graphs. The nodes
@@ -21,7 +38,9 @@ def visualize_hnsw_index(index: HNSWIndex, layout: Optional[Layout] = None) -> N
 
     _, axs = plt.subplots(1, len(index.layers), figsize=(len(index.layers) * 5, 5))
 
-    layout = layout or networkx.spring_layout(index.layers[0].G)
+    graphs = [layer_to_graph(layer) for layer in index.layers]
+
+    layout = layout or networkx.spring_layout(graphs[0])
     node_color = ["r" if index.ep == node else "c" for node, _ in layout.items()]
     # Determine the global min and max coordinates for consistent axes
     all_x_values = [pos[0] for pos in layout.values()]
@@ -29,9 +48,7 @@ def visualize_hnsw_index(index: HNSWIndex, layout: Optional[Layout] = None) -> N
     min_x, max_x = min(all_x_values), max(all_x_values)
     min_y, max_y = min(all_y_values), max(all_y_values)
 
-    for i, layer in enumerate(index.layers):
-        graph = layer.G
-
+    for i, graph in enumerate(graphs):
         graph_layout = {k: v for k, v in layout.items() if k in graph}
         graph_node_color = [node_color[k] for k, _ in graph_layout.items()]
         networkx.draw(